@@ -0,0 +1,242 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import aiosqlite
+
+# 잔액/보유량 변화 한 건: (유저ID, 현금 변화, 종목 또는 None, 주식 수 변화, 매수 체결가 또는 None)
+# 매수 체결가가 있으면 holdings.average_price처럼 평단가를 가중평균으로 갱신
+AccountChange = Tuple[int, float, Optional[str], int, Optional[float]]
+
+
+class Account:
+    """
+    유저 한 명의 계좌 상태 (메모리)
+    - cash / positions: DB에 반영된(또는 곧 내려쓸) 현금과 보유 주식 수
+    - reserved_cash / reserved_shares: 주문이 처리되는 동안(저널 fsync, DB 반영 전) 잡아둔 몫
+    - average_prices: 종목별 평단가 (DB holdings.average_price와 같은 규칙, 매수할 때만 바뀜)
+    - level: 기능 잠금 확인용 레벨 (경험치 지급 시 같이 갱신)
+    """
+    __slots__ = ("cash", "reserved_cash", "positions", "average_prices", "reserved_shares", "level")
+
+    def __init__(self, cash: float = 0, level: int = 1):
+        self.cash = cash
+        self.level = level
+        self.reserved_cash = 0.0
+        self.positions: Dict[str, int] = {}
+        self.average_prices: Dict[str, float] = {}
+        self.reserved_shares: Dict[str, int] = {}
+
+    @property
+    def available_cash(self) -> float:
+        return self.cash - self.reserved_cash
+
+    def available_shares(self, ticker: str) -> int:
+        return self.positions.get(ticker, 0) - self.reserved_shares.get(ticker, 0)
+
+    def add_shares(self, ticker: str, quantity: int, price: Optional[float] = None):
+        """보유 수량 변경 (price를 주면 매수: 평단가를 가중평균으로 갱신)"""
+        held = self.positions.get(ticker, 0)
+        if price is not None and quantity > 0:
+            average = self.average_prices.get(ticker, 0)
+            self.average_prices[ticker] = (held * average + quantity * price) / (held + quantity)
+        self.positions[ticker] = held + quantity
+
+
+class AccountStore:
+    """
+    유저 계좌 저장소 (주문 전 잔액/보유량 확인을 메모리에서)
+    - 서버 시작 시 users/holdings를 한 번에 올려두고, 확인과 차감을 await 없이 한 번에 하므로
+      동시에 들어온 주문끼리 같은 돈을 두 번 쓸 수 없습니다.
+    - 주문 경로(저널 반영)는 DB에 바로 쓰고, 커밋한 뒤 같은 변화를 apply()로 메모리에 반영합니다.
+    - /buy, /sell, /reward처럼 저널을 거치지 않는 변경은 메모리에 먼저 반영하고,
+      DB에는 flush_interval초마다 몰아서 내려씁니다. (write-behind, 현금/수량은 증감분으로 내려써서 주문 경로와 섞여도 안전)
+    """
+
+    def __init__(self, flush_interval: float = 1.0):
+        self.flush_interval = flush_interval
+        self._accounts: Dict[int, Account] = {}
+        # 아직 DB에 안 내려간 변경
+        self._cash_deltas: Dict[int, float] = {}
+        self._holding_ops: List[Tuple[int, str, int, Optional[float]]] = []   # (유저, 종목, 수량 변화, 매수가)
+        self._ledger_rows: List[Tuple[int, str, float, float, str]] = []
+        self.flushes = 0
+        self.rows_written = 0
+
+    async def load(self, db: aiosqlite.Connection):
+        """DB의 잔액/보유량을 메모리로 올립니다. (시작할 때 한 번)"""
+        async with db.execute("SELECT id, balance, level FROM users") as cursor:
+            for user_id, balance, level in await cursor.fetchall():
+                self._accounts[user_id] = Account(balance or 0, level or 1)
+        async with db.execute("""
+            SELECT user_id, company_name, quantity, average_price FROM holdings WHERE quantity != 0
+        """) as cursor:
+            for user_id, ticker, quantity, average_price in await cursor.fetchall():
+                account = self._accounts.get(user_id)
+                if account is not None:
+                    account.positions[ticker] = quantity
+                    if average_price is not None:
+                        account.average_prices[ticker] = average_price
+
+    async def ensure(self, db: aiosqlite.Connection, user_id: int) -> Optional[Account]:
+        """메모리에 없는 유저(서버 밖에서 만든 유저)는 DB에서 읽어옵니다."""
+        account = self._accounts.get(user_id)
+        if account is not None:
+            return account
+        async with db.execute("SELECT balance, level FROM users WHERE id = ?", (user_id,)) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        async with db.execute("""
+            SELECT company_name, quantity, average_price FROM holdings WHERE user_id = ?
+        """, (user_id,)) as cursor:
+            holdings = await cursor.fetchall()
+        # 읽는 동안 다른 요청이 먼저 올려뒀으면 그쪽을 씀
+        account = self._accounts.get(user_id)
+        if account is None:
+            account = Account(row[0] or 0, row[1] or 1)
+            account.positions = {ticker: quantity for ticker, quantity, _ in holdings}
+            account.average_prices = {ticker: average for ticker, _, average in holdings if average is not None}
+            self._accounts[user_id] = account
+        return account
+
+    def add_user(self, user_id: int, cash: float):
+        self._accounts.setdefault(user_id, Account(cash))
+
+    def get(self, user_id: int) -> Optional[Account]:
+        return self._accounts.get(user_id)
+
+    def level_of(self, user_id: int) -> int:
+        """레벨 (메모리에 없는 유저는 1)"""
+        account = self._accounts.get(user_id)
+        return account.level if account is not None else 1
+
+    def set_level(self, user_id: int, level: int):
+        account = self._accounts.get(user_id)
+        if account is not None:
+            account.level = level
+
+    # ---------- 주문 전 확인 (메모리, await 없음) ----------
+    def reserve_cash(self, user_id: int, amount: float) -> bool:
+        account = self._accounts.get(user_id)
+        if account is None or account.available_cash < amount:
+            return False
+        account.reserved_cash += amount
+        return True
+
+    def reserve_shares(self, user_id: int, ticker: str, quantity: int) -> bool:
+        account = self._accounts.get(user_id)
+        if account is None or account.available_shares(ticker) < quantity:
+            return False
+        account.reserved_shares[ticker] = account.reserved_shares.get(ticker, 0) + quantity
+        return True
+
+    def release_cash(self, user_id: int, amount: float):
+        account = self._accounts.get(user_id)
+        if account is not None:
+            account.reserved_cash -= amount
+
+    def release_shares(self, user_id: int, ticker: str, quantity: int):
+        account = self._accounts.get(user_id)
+        if account is not None:
+            left = account.reserved_shares.get(ticker, 0) - quantity
+            if left:
+                account.reserved_shares[ticker] = left
+            else:
+                account.reserved_shares.pop(ticker, None)
+
+    def apply(self, changes: Iterable[AccountChange]):
+        """DB에 커밋된 변화를 메모리에 반영합니다. (projection 함수들이 모아준 changes)"""
+        for user_id, cash_delta, ticker, quantity_delta, price in changes:
+            account = self._accounts.get(user_id)
+            if account is None:
+                continue
+            account.cash += cash_delta
+            if ticker is not None and quantity_delta:
+                account.add_shares(ticker, quantity_delta, price)
+
+    # ---------- 즉시 체결 (메모리 반영 + write-behind) ----------
+    def buy(self, user_id: int, ticker: str, quantity: int, price: float, description: str) -> Optional[float]:
+        """현금이 충분하면 바로 사고 새 잔액을, 아니면 None을 돌려줍니다."""
+        cost = price * quantity
+        account = self._accounts.get(user_id)
+        if account is None or account.available_cash < cost:
+            return None
+        account.cash -= cost
+        account.add_shares(ticker, quantity, price)
+        self._cash_deltas[user_id] = self._cash_deltas.get(user_id, 0) - cost
+        self._holding_ops.append((user_id, ticker, quantity, price))
+        self._ledger_rows.append((user_id, "BUY", -cost, account.cash, description))
+        return account.cash
+
+    def sell(self, user_id: int, ticker: str, quantity: int, price: float, description: str) -> Optional[float]:
+        """주식이 충분하면 바로 팔고 새 잔액을, 아니면 None을 돌려줍니다."""
+        income = price * quantity
+        account = self._accounts.get(user_id)
+        if account is None or account.available_shares(ticker) < quantity:
+            return None
+        account.cash += income
+        account.positions[ticker] -= quantity
+        self._cash_deltas[user_id] = self._cash_deltas.get(user_id, 0) + income
+        self._holding_ops.append((user_id, ticker, -quantity, None))
+        self._ledger_rows.append((user_id, "SELL", income, account.cash, description))
+        return account.cash
+
+    def credit(self, user_id: int, amount: float, transaction_type: str, description: str) -> Optional[float]:
+        """현금 지급 (보상 등). 없는 유저면 None"""
+        account = self._accounts.get(user_id)
+        if account is None:
+            return None
+        account.cash += amount
+        self._cash_deltas[user_id] = self._cash_deltas.get(user_id, 0) + amount
+        self._ledger_rows.append((user_id, transaction_type, amount, account.cash, description))
+        return account.cash
+
+    # ---------- 내려쓰기 ----------
+    @property
+    def pending_count(self) -> int:
+        return len(self._cash_deltas) + len(self._holding_ops) + len(self._ledger_rows)
+
+    async def flush(self, db: aiosqlite.Connection) -> int:
+        """쌓인 변경을 한 트랜잭션으로 DB에 씁니다. 쓴 행 수를 돌려줍니다."""
+        if not self.pending_count:
+            return 0
+        # 기다리는 동안 들어온 변경은 다음 flush로 가도록 먼저 떼어냄
+        cash, holdings, ledger = self._cash_deltas, self._holding_ops, self._ledger_rows
+        self._cash_deltas, self._holding_ops, self._ledger_rows = {}, [], []
+        try:
+            await db.executemany("UPDATE users SET balance = balance + ? WHERE id = ?",
+                                 [(delta, user_id) for user_id, delta in cash.items()])
+            # 매수는 평단가를 가중평균으로, 매도는 수량만 줄임 (순서대로 적용)
+            await db.executemany("""
+                INSERT INTO holdings (user_id, company_name, quantity, average_price)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, company_name) DO UPDATE SET
+                    average_price = CASE WHEN excluded.quantity > 0
+                        THEN (quantity * COALESCE(average_price, 0) + excluded.quantity * excluded.average_price)
+                             / (quantity + excluded.quantity)
+                        ELSE average_price END,
+                    quantity = quantity + excluded.quantity
+            """, holdings)
+            await db.executemany("""
+                INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description)
+                VALUES (?, ?, ?, ?, ?)
+            """, ledger)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            # 실패한 변경은 새로 들어온 것보다 앞에 다시 붙여서 다음 flush에서 재시도
+            for user_id, delta in cash.items():
+                self._cash_deltas[user_id] = self._cash_deltas.get(user_id, 0) + delta
+            self._holding_ops[:0] = holdings
+            self._ledger_rows[:0] = ledger
+            raise
+        written = len(cash) + len(holdings) + len(ledger)
+        self.flushes += 1
+        self.rows_written += written
+        return written
+
+    def stats(self) -> Dict:
+        return {
+            "users": len(self._accounts),
+            "pending": self.pending_count,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
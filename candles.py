@@ -0,0 +1,175 @@
+import time
+from array import array
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# 봉 단위 (초)와 단위별로 들고 있을 봉 개수
+RESOLUTIONS = {"1s": 1, "1m": 60, "5m": 300, "1h": 3600}
+CAPACITY = {"1s": 3600, "1m": 1440, "5m": 2016, "1h": 720}   # 1시간 / 1일 / 1주 / 30일
+MAX_CANDLES = 1000     # /api/candles 한 번에 돌려줄 최대 봉 수
+
+
+@lru_cache(maxsize=4096)
+def _label(ts: int) -> str:
+    """차트 x축 표시용 시각 (같은 초는 한 번만 포맷)"""
+    return time.strftime("%H:%M:%S", time.localtime(ts))
+
+
+class CandleSeries:
+    """
+    한 종목의 한 단위 봉 (고정 크기 링 버퍼)
+    - 봉 번호 b = 시각 // 단위초, 저장 위치 = b % capacity
+    - 거래가 없던 구간은 직전 종가로 평평한 봉(거래량 0)을 채워서 봉 번호가 항상 연속입니다.
+      그래서 구간 조회는 찾기 없이 번호 계산만으로 끝납니다.
+    """
+
+    def __init__(self, seconds: int, capacity: int):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.open = array("d", [0.0]) * capacity
+        self.high = array("d", [0.0]) * capacity
+        self.low = array("d", [0.0]) * capacity
+        self.close = array("d", [0.0]) * capacity
+        self.volume = array("d", [0.0]) * capacity
+        self.notional = array("d", [0.0]) * capacity   # 가격 x 수량 합계 (VWAP 계산용)
+        self.last = -1      # 가장 최근 봉 번호
+        self.count = 0
+
+    @property
+    def first(self) -> int:
+        return self.last - self.count + 1
+
+    def _start(self, b: int, price: float):
+        i = b % self.capacity
+        self.open[i] = self.high[i] = self.low[i] = self.close[i] = price
+        self.volume[i] = self.notional[i] = 0.0
+
+    def _advance(self, b: int, price: Optional[float] = None):
+        """b번 봉까지 이어 붙임 (빈 구간은 직전 종가로 채우고, b번 봉은 price 또는 직전 종가로 시작)"""
+        if self.count == 0:
+            self._start(b, price)
+            self.last, self.count = b, 1
+            return
+        prev_close = self.close[self.last % self.capacity]
+        # 링 크기보다 오래 비었으면 남길 만큼만 채움
+        for gap in range(max(self.last + 1, b - self.capacity + 1), b):
+            self._start(gap, prev_close)
+        self._start(b, prev_close if price is None else price)
+        self.count = min(self.count + (b - self.last), self.capacity)
+        self.last = b
+
+    def add(self, ts: float, price: float, quantity: float):
+        """체결 한 건 반영"""
+        b = int(ts // self.seconds)
+        if self.count == 0 or b > self.last:
+            self._advance(b, price)
+        elif b < self.first:
+            return          # 링에서 이미 밀려난 구간
+        i = b % self.capacity
+        if self.volume[i] == 0:
+            # 채워 넣은 평평한 봉에 첫 체결: 이 가격으로 새로 시작
+            self._start(b, price)
+        if price > self.high[i]:
+            self.high[i] = price
+        if price < self.low[i]:
+            self.low[i] = price
+        if b == self.last:
+            self.close[i] = price
+        self.volume[i] += quantity
+        self.notional[i] += price * quantity
+
+    def roll(self, ts: float, price: Optional[float] = None):
+        """거래가 없어도 현재 봉까지 이어 붙임 (아직 봉이 없으면 price로 시작)"""
+        b = int(ts // self.seconds)
+        if self.count == 0:
+            if price is not None:
+                self._advance(b, price)
+        elif b > self.last:
+            self._advance(b)
+
+    def _row(self, b: int) -> Dict:
+        i = b % self.capacity
+        volume = self.volume[i]
+        return {
+            "time": b * self.seconds,
+            "open": self.open[i],
+            "high": self.high[i],
+            "low": self.low[i],
+            "close": self.close[i],
+            "volume": volume,
+            "vwap": round(self.notional[i] / volume, 2) if volume else self.close[i],
+        }
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None,
+              limit: int = MAX_CANDLES) -> List[Dict]:
+        """시작~끝 시각(초, 양끝 포함)에 걸친 봉, 오래된 것부터. limit보다 많으면 최근 limit개"""
+        if self.count == 0:
+            return []
+        lo = self.first if start is None else max(self.first, int(start // self.seconds))
+        hi = self.last if end is None else min(self.last, int(end // self.seconds))
+        lo = max(lo, hi - limit + 1)
+        return [self._row(b) for b in range(lo, hi + 1)]
+
+    def closes(self, n: int) -> List[Dict]:
+        """최근 n개 봉의 종가 (차트용 {"time": "HH:MM:SS", "price"})"""
+        if self.count == 0:
+            return []
+        cap = self.capacity
+        return [{"time": _label(b * self.seconds), "price": self.close[b % cap]}
+                for b in range(max(self.first, self.last - n + 1), self.last + 1)]
+
+
+class CandleAggregator:
+    """
+    종목별 다중 단위 OHLCV 봉 (1초/1분/5분/1시간, 거래량 + VWAP)
+    - 엔진 체결 구독자로 붙여서 거래가 날 때마다 모든 단위 봉을 바로 갱신합니다.
+      (체결 이벤트는 매수/매도 주문마다 하나씩 오므로 매수 쪽만 세어 거래 1건 = 1번)
+    - 틱 루프는 roll()로 거래가 없던 초에도 봉을 이어 붙입니다.
+    """
+
+    def __init__(self, resolutions: Dict[str, int] = RESOLUTIONS, capacity: Dict[str, int] = CAPACITY):
+        self.resolutions = resolutions
+        self.capacity = capacity
+        self._series: Dict[str, Dict[str, CandleSeries]] = {}
+        self.trades = 0
+
+    def _of(self, ticker: str) -> Dict[str, CandleSeries]:
+        series = self._series.get(ticker)
+        if series is None:
+            series = {name: CandleSeries(seconds, self.capacity[name])
+                      for name, seconds in self.resolutions.items()}
+            self._series[ticker] = series
+        return series
+
+    def on_fill(self, fill):
+        """엔진 체결 구독 콜백"""
+        if fill.side == "BUY":
+            self.add_trade(fill.ticker, time.time(), fill.price, fill.quantity)
+
+    def add_trade(self, ticker: str, ts: float, price: float, quantity: float):
+        for series in self._of(ticker).values():
+            series.add(ts, price, quantity)
+        self.trades += 1
+
+    def load(self, ticker: str, timestamps, prices, quantities):
+        """저장해 둔 틱(시각ns 순)으로 봉을 다시 만듦 (재시작 시)"""
+        for ts_ns, price, quantity in zip(timestamps, prices, quantities):
+            self.add_trade(ticker, ts_ns / 1e9, float(price), float(quantity))
+
+    def roll(self, ticker: str, ts: float, price: float):
+        for series in self._of(ticker).values():
+            series.roll(ts, price)
+
+    def series(self, ticker: str, resolution: str) -> Optional[CandleSeries]:
+        series = self._series.get(ticker)
+        return series.get(resolution) if series else None
+
+    def candles(self, ticker: str, resolution: str, start: Optional[float] = None,
+                end: Optional[float] = None, limit: int = MAX_CANDLES) -> List[Dict]:
+        series = self.series(ticker, resolution)
+        return series.range(start, end, limit) if series else []
+
+    def history(self, ticker: str, n: int = 30) -> List[Dict]:
+        """최근 n초 종가 (시세 화면 차트용)"""
+        series = self.series(ticker, "1s")
+        return series.closes(n) if series else []
@@ -1,113 +1,171 @@
 # database.py
-import aiosqlite
+import os
+import time
 import asyncio
+import aiosqlite
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from fastapi import HTTPException
+from migrations import migrate
 
 DB_NAME = "stock_game.db"
 
-async def get_db_connection():
-    """FastAPI 라우터에서 쓸 DB 연결 생성기"""
-    conn = await aiosqlite.connect(DB_NAME, timeout=30.0)
+# 연결마다 한 번만 설정하는 PRAGMA (journal_mode=WAL은 DB 파일에 남지만 나머지는 연결 단위)
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL;",    # 읽기와 쓰기가 서로 막지 않게
+    "PRAGMA synchronous=NORMAL;",  # WAL에서는 NORMAL이어도 커밋이 깨지지 않음
+    "PRAGMA busy_timeout=30000;",  # 잠금이 풀릴 때까지 최대 30초 대기
+    "PRAGMA temp_store=MEMORY;",
+]
+
+
+async def connect(path: str = DB_NAME) -> aiosqlite.Connection:
+    """PRAGMA 설정까지 끝난 새 연결 (풀, 시뮬레이션 루프 공용)"""
+    conn = await aiosqlite.connect(path, timeout=30.0)
     conn.row_factory = aiosqlite.Row
+    for pragma in CONNECTION_PRAGMAS:
+        await conn.execute(pragma)
     return conn
 
+
+class PoolTimeout(Exception):
+    """timeout초 안에 빈 연결을 못 받음 (HTTP 503)"""
+
+
+class ConnectionPool:
+    """
+    aiosqlite 연결 풀 (크기 고정)
+    - 요청마다 연결(=백그라운드 스레드)을 새로 만들지 않고, 미리 만들어 둔 연결을 빌려주고 돌려받습니다.
+    - 빈 연결이 없으면 반납될 때까지 기다리고, 그 대기 시간을 기록합니다. (stats()로 조회)
+    - timeout초를 넘게 기다리면 PoolTimeout을 던집니다. (영원히 매달리지 않게)
+    """
+
+    def __init__(self, path: str = DB_NAME, size: int = 8, timeout: Optional[float] = 5.0):
+        if size <= 0:
+            raise ValueError("size는 1 이상이어야 합니다.")
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self._conns = []
+
+        # 대기 시간 통계 (최근 1000건으로 백분위 계산)
+        self.acquired = 0
+        self.waited = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self._wait_ms = deque(maxlen=1000)
+        self._max_wait_ms = 0.0
+
+    async def open(self):
+        for _ in range(self.size):
+            conn = await connect(self.path)
+            self._conns.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def acquire(self) -> aiosqlite.Connection:
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            self.waiting += 1
+            try:
+                conn = await asyncio.wait_for(self._idle.get(), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise PoolTimeout(f"DB 연결을 {self.timeout}초 안에 받지 못했습니다. (풀 크기 {self.size})")
+            finally:
+                self.waiting -= 1
+            self.waited += 1
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.acquired += 1
+        self._wait_ms.append(wait_ms)
+        if wait_ms > self._max_wait_ms:
+            self._max_wait_ms = wait_ms
+        return conn
+
+    async def release(self, conn: aiosqlite.Connection):
+        # 커밋/롤백 없이 끝난 요청의 트랜잭션이 다음 사용자에게 넘어가지 않게 정리
+        if conn.in_transaction:
+            await conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    def stats(self) -> Dict:
+        waits = sorted(self._wait_ms)
+        def pct(q):
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else 0.0
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "in_use": self.size - self._idle.qsize(),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "waited": self.waited,   # 빈 연결이 없어서 기다려야 했던 횟수
+            "timeouts": self.timeouts,
+            "wait_ms": {"p50": pct(0.50), "p99": pct(0.99), "max": round(self._max_wait_ms, 3)},
+        }
+
+    async def close(self):
+        for conn in self._conns:
+            await conn.close()
+        self._conns.clear()
+
+
+# 앱 전체가 쓰는 풀 (lifespan에서 open_pool/close_pool)
+pool: Optional[ConnectionPool] = None
+
+
+async def open_pool(size: Optional[int] = None) -> ConnectionPool:
+    global pool
+    pool = ConnectionPool(DB_NAME, size or int(os.getenv("DB_POOL_SIZE", "8")),
+                          float(os.getenv("DB_POOL_TIMEOUT", "5")))
+    await pool.open()
+    print(f"✅ DB 연결 풀 준비 완료 (연결 {pool.size}개)")
+    return pool
+
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+
+def db_connection():
+    """라우터 밖(서비스 함수 등)에서 풀 연결을 빌려 쓸 때: async with db_connection() as db:"""
+    return pool.connection()
+
+
+async def get_db_connection() -> AsyncIterator[aiosqlite.Connection]:
+    """FastAPI 라우터에서 쓸 DB 연결 (풀에서 빌려오고, 요청이 끝나면 반납)"""
+    try:
+        conn = await pool.acquire()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
 async def init_db():
     """서버 시작할 때 테이블 싹 다 만드는 함수"""
     async with aiosqlite.connect(DB_NAME, timeout=30.0) as db:
         
         # WAL 모드 활성화 (동시성 문제 해결의 열쇠!)
         await db.execute("PRAGMA journal_mode=WAL;") 
-        
-        # 1. 유저 테이블 (Users)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            password TEXT,
-            balance INTEGER DEFAULT 1000000,
-            level INTEGER DEFAULT 1
-        )
-        """)
-
-        # 2. 보유 주식 테이블 (Holdings)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS holdings (
-            user_id INTEGER,
-            company_name TEXT,
-            quantity INTEGER,
-            average_price REAL,
-            PRIMARY KEY (user_id, company_name)
-        )
-        """)
-
-        # 3. 거래 내역 테이블 (Transactions)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            transaction_type TEXT,
-            amount INTEGER,
-            balance_after INTEGER,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        # 4. 주식 종목 테이블 (Stocks)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS stocks (
-            symbol TEXT PRIMARY KEY,
-            company_name TEXT,
-            current_price INTEGER,
-            description TEXT
-        )
-        """)
-
-        # 5. 뉴스 테이블 (News)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS news (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            content TEXT,
-            impact_level INTEGER, 
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        # 6. 퀘스트 목록 (Quests)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS quests (
-            quest_id TEXT PRIMARY KEY,
-            title TEXT,
-            description TEXT,
-            reward_exp INTEGER
-        )
-        """)
-
-        # 7. 유저 퀘스트 완료 기록 (UserQuests)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS user_quests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            quest_name TEXT,
-            status TEXT DEFAULT 'COMPLETED',
-            reward_amount INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        # 8. 주문 내역 테이블 (Orders)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            company_name TEXT,
-            order_type TEXT,      -- BUY / SELL
-            price INTEGER,        -- 희망 가격
-            quantity INTEGER,     -- 수량
-            status TEXT DEFAULT 'PENDING', -- PENDING / FILLED / CANCELLED
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
+
+        # 1~8. 테이블/인덱스는 마이그레이션이 관리 (migrations.py)
+        version = await migrate(db)
+        print(f"📐 DB 스키마 버전: v{version}")
 
         # 9. 초기 데이터 (없으면 삼성전자/SK하이닉스 추가)
         cursor = await db.execute("SELECT count(*) FROM stocks")
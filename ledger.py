@@ -0,0 +1,229 @@
+import os
+import gzip
+import json
+import asyncio
+from typing import Dict, List, Optional
+import aiosqlite
+
+# 거래 원장(transactions) 정리
+# - 체크포인트: 유저별로 "이 거래(last_txn_id)까지의 거래 금액 누계와 건수"를 주기적으로 남깁니다.
+#   누계는 transactions 행만 더한 값입니다. 지정가/시장가 주문의 대금 차감·정산·환불은 거래 원장에 행을 남기지 않고
+#   users.balance만 바꾸므로, 누계는 실제 잔액과 다를 수 있습니다. (실제 잔액은 계좌 저장소/users.balance)
+#   내역 조회는 처음부터 더하지 않고 가장 가까운 체크포인트에서 출발합니다.
+# - 보관(archive): 오래되고 체크포인트로 덮인 행은 gzip 세그먼트 파일로 옮기고 테이블에서 지웁니다.
+#   유저마다 지워지는 행은 항상 가장 오래된 쪽부터이므로, 테이블에는 유저별로 최근 구간만 남습니다.
+# - 세그먼트마다 들어있는 유저(와 그 유저의 첫/마지막 거래 id)를 ledger_segment_users에 적어 두고,
+#   내역 조회는 그 유저가 들어있는 세그먼트만 엽니다.
+
+LEDGER_ARCHIVE_DIR = os.getenv("LEDGER_ARCHIVE_DIR", "ledger_archive")
+CHECKPOINT_MIN_ROWS = 100       # 마지막 체크포인트 이후 이만큼 쌓인 유저만 새 체크포인트
+ARCHIVE_AFTER_DAYS = 30         # 이보다 오래된 거래는 보관 대상
+SEGMENT_ROWS = 10_000           # 세그먼트 파일 하나에 담을 행 수
+ARCHIVE_MAX_ROWS = 100_000      # 한 번 정리할 때 보관할 최대 행 수 (남은 건 다음 차례에)
+
+
+async def checkpoint_balances(db: aiosqlite.Connection, min_rows: int = CHECKPOINT_MIN_ROWS,
+                              cold_days: int = ARCHIVE_AFTER_DAYS) -> int:
+    """
+    새 거래가 min_rows건 이상 쌓였거나 보관 대상(cold_days보다 오래된) 거래가 있는 유저마다 체크포인트를 하나 추가합니다.
+    (이전 체크포인트 + 그 뒤 거래 합계, 유저 전체를 한 문장으로 처리) 추가한 개수를 돌려줍니다.
+    """
+    cursor = await db.execute("""
+        INSERT INTO ledger_checkpoints (user_id, last_txn_id, ledger_balance, txn_count)
+        SELECT t.user_id, MAX(t.id), COALESCE(c.ledger_balance, 0) + SUM(t.amount), COALESCE(c.txn_count, 0) + COUNT(*)
+        FROM transactions t
+        LEFT JOIN ledger_checkpoints c ON c.user_id = t.user_id
+            AND c.last_txn_id = (SELECT MAX(last_txn_id) FROM ledger_checkpoints WHERE user_id = t.user_id)
+        WHERE t.user_id IS NOT NULL AND t.id > COALESCE(c.last_txn_id, 0)
+        GROUP BY t.user_id
+        HAVING COUNT(*) >= ? OR MIN(t.created_at) < datetime('now', ?)
+    """, (min_rows, f"-{cold_days} days"))
+    return cursor.rowcount
+
+
+async def balance_after(db: aiosqlite.Connection, user_id: int, txn_id: int) -> float:
+    """
+    txn_id번 거래 직후의 거래 금액 누계 (txn_id는 아직 테이블에 있는 거래)
+    - 위쪽(txn_id 이후) 체크포인트가 있으면 거기서 그 사이 거래를 빼고
+    - 없으면 마지막 체크포인트에서 그 뒤 거래를 더합니다.
+    어느 쪽이든 더하는 구간은 보관되지 않은 최근 행뿐입니다.
+    """
+    async with db.execute("""
+        SELECT last_txn_id, ledger_balance FROM ledger_checkpoints
+        WHERE user_id = ? AND last_txn_id >= ? ORDER BY last_txn_id LIMIT 1
+    """, (user_id, txn_id)) as cursor:
+        above = await cursor.fetchone()
+    if above:
+        async with db.execute("""
+            SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE user_id = ? AND id > ? AND id <= ?
+        """, (user_id, txn_id, above['last_txn_id'])) as cursor:
+            return above['ledger_balance'] - (await cursor.fetchone())[0]
+
+    async with db.execute("""
+        SELECT last_txn_id, ledger_balance FROM ledger_checkpoints
+        WHERE user_id = ? ORDER BY last_txn_id DESC LIMIT 1
+    """, (user_id,)) as cursor:
+        below = await cursor.fetchone()
+    start_id, start_balance = (below['last_txn_id'], below['ledger_balance']) if below else (0, 0)
+    async with db.execute("""
+        SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE user_id = ? AND id > ? AND id <= ?
+    """, (user_id, start_id, txn_id)) as cursor:
+        return start_balance + (await cursor.fetchone())[0]
+
+
+def _write_segment(path: str, rows: List[Dict]):
+    """세그먼트 파일을 임시 파일에 다 쓰고 fsync한 뒤 이름을 바꿈 (중간에 죽어도 반쪽 파일이 남지 않음)"""
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_segment(path: str) -> List[Dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _segment_users(path: str, rows: List[Dict]) -> List[tuple]:
+    """세그먼트 유저 색인 행: (user_id, 첫 거래 id, 마지막 거래 id, 세그먼트 이름, 행 수)"""
+    spans = {}
+    for row in rows:
+        span = spans.get(row['user_id'])
+        if span is None:
+            spans[row['user_id']] = [row['id'], row['id'], 1]
+        else:
+            span[1] = row['id']
+            span[2] += 1
+    return [(user_id, first, last, path, count) for user_id, (first, last, count) in spans.items()]
+
+
+async def _index_segment(db: aiosqlite.Connection, path: str, rows: List[Dict]):
+    await db.executemany("""
+        INSERT OR REPLACE INTO ledger_segment_users (user_id, first_txn_id, last_txn_id, path, row_count)
+        VALUES (?, ?, ?, ?, ?)
+    """, _segment_users(path, rows))
+
+
+async def index_segments(db: aiosqlite.Connection, archive_dir: str = LEDGER_ARCHIVE_DIR) -> int:
+    """유저 색인 없이 보관된 세그먼트(v8 이전)를 읽어서 색인을 채웁니다. 채운 세그먼트 수를 돌려줍니다."""
+    async with db.execute("SELECT path FROM ledger_segments WHERE users_indexed = 0") as cursor:
+        paths = [row['path'] for row in await cursor.fetchall()]
+    for path in paths:
+        rows = await asyncio.to_thread(read_segment, os.path.join(archive_dir, path))
+        await _index_segment(db, path, rows)
+        await db.execute("UPDATE ledger_segments SET users_indexed = 1 WHERE path = ?", (path,))
+        await db.commit()
+    return len(paths)
+
+
+async def archive_cold_rows(db: aiosqlite.Connection, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                            archive_dir: str = LEDGER_ARCHIVE_DIR, segment_rows: int = SEGMENT_ROWS,
+                            max_rows: int = ARCHIVE_MAX_ROWS) -> Dict:
+    """
+    오래되고 체크포인트로 덮인 거래를 세그먼트 파일로 옮기고 테이블에서 지웁니다. (한 번에 최대 max_rows건)
+    세그먼트마다: 파일 쓰기(fsync) -> ledger_segments/유저 색인 기록 + 행 삭제 -> 커밋
+    (파일만 남고 DB가 안 바뀐 채 죽으면, 다음 실행 때 같은 이름으로 다시 씁니다.)
+    각 행에는 그 거래 직후의 거래 금액 누계(txn_total)를 같이 적어 둡니다.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    segments = archived = 0
+    while archived < max_rows:
+        async with db.execute("""
+            SELECT t.id, t.user_id, t.transaction_type, t.amount, t.balance_after, t.description, t.created_at
+            FROM transactions t
+            WHERE t.created_at < datetime('now', ?)
+              AND t.id <= (SELECT MAX(c.last_txn_id) FROM ledger_checkpoints c WHERE c.user_id = t.user_id)
+            ORDER BY t.id LIMIT ?
+        """, (f"-{older_than_days} days", min(segment_rows, max_rows - archived))) as cursor:
+            rows = [dict(row) for row in await cursor.fetchall()]
+        if not rows:
+            break
+
+        # 유저별 첫 행의 누계만 체크포인트로 구하고, 나머지는 금액을 더해가며 채움
+        running = {}
+        for row in rows:
+            user_id = row['user_id']
+            if user_id not in running:
+                running[user_id] = await balance_after(db, user_id, row['id']) - row['amount']
+            running[user_id] += row['amount']
+            row['txn_total'] = running[user_id]
+
+        first_id, last_id = rows[0]['id'], rows[-1]['id']
+        name = f"seg_{first_id:012d}_{last_id:012d}.jsonl.gz"
+        await asyncio.to_thread(_write_segment, os.path.join(archive_dir, name), rows)
+
+        await db.execute("""
+            INSERT OR REPLACE INTO ledger_segments (path, first_txn_id, last_txn_id, row_count, users_indexed)
+            VALUES (?, ?, ?, ?, 1)
+        """, (name, first_id, last_id, len(rows)))
+        await _index_segment(db, name, rows)
+        await db.executemany("DELETE FROM transactions WHERE id = ?", [(row['id'],) for row in rows])
+        await db.commit()
+        segments += 1
+        archived += len(rows)
+    return {"segments": segments, "archived": archived}
+
+
+async def compact_ledger(db: aiosqlite.Connection, min_rows: int = CHECKPOINT_MIN_ROWS,
+                         older_than_days: int = ARCHIVE_AFTER_DAYS, archive_dir: str = LEDGER_ARCHIVE_DIR,
+                         max_rows: int = ARCHIVE_MAX_ROWS) -> Dict:
+    """체크포인트를 찍고 오래된 거래를 최대 max_rows건 보관합니다. (주기 작업, 색인 없는 옛 세그먼트도 채움)"""
+    indexed = await index_segments(db, archive_dir)
+    checkpoints = await checkpoint_balances(db, min_rows, older_than_days)
+    await db.commit()
+    result = await archive_cold_rows(db, older_than_days, archive_dir, max_rows=max_rows)
+    return {"checkpoints": checkpoints, "indexed": indexed, **result}
+
+
+async def user_history(db: aiosqlite.Connection, user_id: int, limit: int = 50, before_id: Optional[int] = None,
+                       archive_dir: str = LEDGER_ARCHIVE_DIR) -> Dict:
+    """
+    유저의 거래 내역 (최신순, before_id보다 앞의 거래부터 limit건) + 거래마다 직후 거래 금액 누계(txn_total)
+    txn_total은 transactions 행만 더한 값이라 잔액이 아닙니다. (주문 정산분 빠짐, 위 설명 참고)
+    테이블에서 모자라면 보관된 세그먼트 중 이 유저가 들어있는 것만 이어서 읽습니다.
+    (보관된 행의 txn_total은 보관할 때 계산해서 파일에 같이 적어 둔 값)
+    다음 페이지는 next_before_id로 요청합니다.
+    """
+    before = before_id if before_id is not None else 2 ** 63 - 1
+    async with db.execute("""
+        SELECT id, transaction_type, amount, balance_after, description, created_at FROM transactions
+        WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+    """, (user_id, before, limit)) as cursor:
+        rows = [dict(row) for row in await cursor.fetchall()]
+
+    # 최신 행의 누계만 체크포인트에서 구하고, 나머지는 거꾸로 빼가며 채움
+    if rows:
+        total = await balance_after(db, user_id, rows[0]['id'])
+        for row in rows:
+            row['txn_total'] = total
+            total -= row['amount']
+
+    if len(rows) < limit:
+        oldest = rows[-1]['id'] if rows else before
+        # 색인이 아직 없는 옛 세그먼트는 들어있는지 모르므로 같이 엶
+        async with db.execute("""
+            SELECT path, first_txn_id FROM ledger_segment_users WHERE user_id = ? AND first_txn_id < ?
+            UNION ALL
+            SELECT path, first_txn_id FROM ledger_segments WHERE users_indexed = 0 AND first_txn_id < ?
+            ORDER BY first_txn_id DESC
+        """, (user_id, oldest, oldest)) as cursor:
+            paths = [row['path'] for row in await cursor.fetchall()]
+        for path in paths:
+            segment = await asyncio.to_thread(read_segment, os.path.join(archive_dir, path))
+            for row in reversed(segment):
+                if row['user_id'] == user_id and row['id'] < oldest:
+                    del row['user_id']
+                    rows.append(row)
+                    if len(rows) == limit:
+                        break
+            if len(rows) == limit:
+                break
+
+    return {
+        "user_id": user_id,
+        "transactions": rows,
+        "next_before_id": rows[-1]['id'] if len(rows) == limit else None,
+    }
@@ -1,37 +1,136 @@
 # main.py (Real Engine Version)
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 import asyncio
+import json
+import os
 import random
-from datetime import datetime
+import time
+from typing import Optional
 import aiosqlite
 
 
 # 엔진과 모델 임포트
 
+import database
 from database import init_db
 from routers import trade, social
 from market_engine import MarketEngine  # 진짜 엔진
+from order_book import EngineOrder
+from sharded_engine import ShardedMarketEngine
+from price_store import PriceStore
+from market_feed import MarketFeed
+from candles import CandleAggregator, MAX_CANDLES, RESOLUTIONS
+from tick_store import TickStore
+from accounts import AccountStore
+from recovery import restore_order_books
+from order_journal import OrderJournal
+from order_gateway import OrderGateway, GatewayFull
+from projection import journal_watermark, replay_journal, set_journal_watermark, settle_fills
+from ledger import ARCHIVE_MAX_ROWS, compact_ledger
 from domain_models import Order, OrderType, OrderSide, Agent # 주문 모델
 
 
 # [전역 설정]
 TARGET_TICKERS = ["삼성전자", "소현컴퍼니", "상은테크놀로지", "예진캐피탈"]
 
-# 엔진 초기화
-engine = MarketEngine()
+# 엔진 초기화 (ENGINE_SHARDS=2 이상이면 종목을 워커 프로세스들에 나눠서 매칭)
+ENGINE_SHARDS = int(os.getenv("ENGINE_SHARDS", "1"))
+engine = ShardedMarketEngine(ENGINE_SHARDS) if ENGINE_SHARDS > 1 else MarketEngine()
+
+# 종목 현재가 (메모리에서 읽고, PRICE_FLUSH_INTERVAL초마다 DB에 몰아서 저장)
+price_store = PriceStore(flush_interval=float(os.getenv("PRICE_FLUSH_INTERVAL", "5")))
+
+# 유저 잔액/보유량 (주문 전 확인은 메모리에서, /buy·/sell·/reward 변경은 ACCOUNT_FLUSH_INTERVAL초마다 DB에 몰아서 저장)
+accounts = AccountStore(flush_interval=float(os.getenv("ACCOUNT_FLUSH_INTERVAL", "1")))
+
+# 주문 저널 (주문/체결/취소의 원본 기록, DB 테이블은 여기서 반영된 결과)
+journal = OrderJournal(os.getenv("ORDER_JOURNAL_PATH", "order_journal.bin"))
+
+# 저널 반영 위치를 DB에 남기는 주기(초)와, 그 앞부분을 잘라낼 저널 파일 크기
+JOURNAL_CHECKPOINT_INTERVAL = float(os.getenv("JOURNAL_CHECKPOINT_INTERVAL", "5"))
+JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES", str(64 << 20)))
+
+# 주문 창구 (HTTP 요청과 틱 루프의 엔진 호출을 작업 태스크 하나가 순서대로 처리, 대기열이 꽉 차면 429)
+gateway = OrderGateway(engine, capacity=int(os.getenv("ORDER_GATEWAY_CAPACITY", "1000")))
+
+# 거래 원장 체크포인트/보관 주기 (초, 틱 루프와 따로 도는 백그라운드 작업) + 한 번에 보관할 최대 행 수
+LEDGER_COMPACT_INTERVAL = int(os.getenv("LEDGER_COMPACT_INTERVAL", "3600"))
+LEDGER_COMPACT_MAX_ROWS = int(os.getenv("LEDGER_COMPACT_MAX_ROWS", str(ARCHIVE_MAX_ROWS)))
 
 # 초기 데이터 (전역 변수 - 종목별 관리)
 current_news_display = "장 시작 준비 중..."
-price_history = {ticker: [] for ticker in TARGET_TICKERS}
 current_mentor_comments = {ticker: [] for ticker in TARGET_TICKERS}
 
+# 종목별 OHLCV 봉 (엔진 체결로 바로 갱신, 시세 화면 차트는 최근 30초 1초봉 종가)
+candles = CandleAggregator()
+
+# 체결 틱 저장소 (종목별 컬럼 파일, 틱마다 붙여 씀) + 재시작 시 최근 CANDLE_WARMUP_SEC초 틱으로 봉 복구
+tick_store = TickStore()
+CANDLE_WARMUP_SEC = int(os.getenv("CANDLE_WARMUP_SEC", "3600"))
+MAX_TICKS = 10_000     # /api/ticks 한 번에 돌려줄 최대 틱 수
+
+# /api/market-data 응답 캐시 (틱마다 종목별로 한 번만 만들어서 모든 접속자에게 같은 바이트를 보냄)
+market_data_cache = {}
+
+# /api/trade/orderbook 응답 캐시 ((종목, 칸 수) -> 응답, 틱마다 비움)
+ORDER_BOOK_MAX_LEVELS = 20
+order_book_cache = {}
+
+# 시세 스트리밍 (구독 시 스냅샷, 이후 틱마다 바뀐 것만 순번을 붙여 밀어줌, 브라우저는 폴링하지 않음)
+feed = MarketFeed()
+
+
+async def market_data_payload(ticker: str) -> dict:
+    """종목 하나의 시세/호가/뉴스/멘토 상태"""
+    comp = engine.companies[ticker]
+
+    # 엔진 호가 (가격대별 집계, 상위 5칸씩)
+    depth = await engine.get_depth_async(ticker, 5)
+
+    payload = {
+        "ticker": ticker,     
+        "name": ticker,
+        "price": comp.current_price,
+        "news": current_news_display,
+        "history": candles.history(ticker, 30),
+        "buy_orders": depth["BUY"],
+        "sell_orders": depth["SELL"],
+        "mentors": current_mentor_comments.get(ticker, [])
+    }
+    return payload
+
+
+async def build_market_data(ticker: str) -> bytes:
+    """/api/market-data 응답 (JSON 바이트)"""
+    return json.dumps(await market_data_payload(ticker), ensure_ascii=False).encode("utf-8")
+
+
+async def order_book_snapshot(ticker: str, levels: int) -> dict:
+    """
+    종목 호가창 (매수/매도 각각 상위 levels개 가격 칸의 수량/주문 수 합계)
+    같은 틱 안에서는 처음 만든 응답을 그대로 돌려줍니다. (요청마다 엔진 장부를 다시 훑지 않음)
+    """
+    key = (ticker, levels)
+    snapshot = order_book_cache.get(key)
+    if snapshot is None:
+        depth = await engine.get_depth_async(ticker, levels)
+        snapshot = {
+            "company": ticker,
+            "price": engine.companies[ticker].current_price,
+            "asks": [{"price": o["price"], "qty": o["quantity"], "orders": o["orders"]} for o in depth["SELL"]],
+            "bids": [{"price": o["price"], "qty": o["quantity"], "orders": o["orders"]} for o in depth["BUY"]],
+        }
+        order_book_cache[key] = snapshot
+    return snapshot
+
 
 # [시뮬레이션 엔진] - 봇 활동 + 사용자 주문 체결 처리(청산)
 async def simulate_market_background():
-    global current_news_display, price_history, current_mentor_comments
+    global current_news_display, current_mentor_comments
     
     print("🚀 리얼 마켓 엔진 & 청산 시스템 가동!")
     
@@ -45,35 +144,70 @@ async def simulate_market_background():
         print(f"⚠️ [경고] AI 설정 실패: {e}")
 
     loop_count = 0
+
+    # 체결 이벤트 구독 (사용자 주문만 저널에 적고 큐에 담아두고 매 틱마다 정산)
+    fill_queue: asyncio.Queue = asyncio.Queue()
+    fill_pin = None     # 큐에 담긴 체결들의 저널 레코드가 정산될 때까지 반영 위치를 잡아둠
+
+    def on_fill(fill):
+        nonlocal fill_pin
+        if fill.agent_id.startswith("User_"):
+            if fill_pin is None:
+                fill_pin = journal.pin()
+            journal.append_fill(int(fill.order_id), fill.price, fill.quantity, fill.remaining)
+            fill_queue.put_nowait(fill)
+
+    def requeue_fills(fills, pin):
+        """정산에 실패한 체결을 그 사이 들어온 체결보다 앞에 다시 넣고 반영 위치도 되돌림 (다음 틱에 재시도)"""
+        nonlocal fill_pin
+        later = []
+        while not fill_queue.empty():
+            later.append(fill_queue.get_nowait())
+        for fill in fills + later:
+            fill_queue.put_nowait(fill)
+        # 앞서 잡은 pin이 그 뒤 레코드까지 덮으므로 새로 잡힌 것은 풀어도 됨
+        if fill_pin is not None:
+            journal.unpin(fill_pin)
+        fill_pin = pin
+
+    engine.subscribe(on_fill)
+    engine.subscribe(candles.on_fill)
+    engine.subscribe(tick_store.on_fill)
     
-    # DB 연결 (WAL 모드)
-    db = await aiosqlite.connect("stock_game.db", timeout=30.0)
-    await db.execute("PRAGMA journal_mode=WAL;") 
-    db.row_factory = aiosqlite.Row 
+    # DB 연결 (루프 전용 연결 1개, 풀은 요청 처리용으로 남겨둠)
+    db = await database.connect()
 
     try:
         
         # [초기화] 사용자 종목 등록
+        await price_store.load(db)
         for ticker in TARGET_TICKERS:
             # DB 가격 동기화
-            cursor = await db.execute("SELECT * FROM stocks WHERE company_name = ?", (ticker,))
-            row = await cursor.fetchone()
-            start_price = row['current_price'] if row else 70000
+            start_price = price_store.get(ticker, 70000)
             
-            if not row:
+            if ticker not in price_store:
                 await db.execute("INSERT OR IGNORE INTO stocks (symbol, company_name, current_price) VALUES (?, ?, ?)", 
                                  (ticker, ticker, start_price))
+                price_store.set(ticker, start_price)
             
             # 엔진 등록
             if ticker not in engine.companies:
                 from domain_models import Company
                 new_comp = Company(ticker=ticker, name=ticker, sector="Tech", description="Custom", current_price=float(start_price), total_shares=1000000)
-                engine.companies[ticker] = new_comp
-                engine.order_books[ticker] = {"BUY": [], "SELL": []}
+                await engine.add_company_async(new_comp)
                 print(f"⚙️ 엔진 등록: {ticker}")
 
         await db.commit()
 
+        # [재시작 복구] DB에 남아있는 대기 주문을 엔진 호가창에 다시 올림 (매칭 없이 대량 적재)
+        restored = await restore_order_books(engine, db)
+        if restored["loaded"] or restored["skipped"]:
+            print(f"♻️ [복구] 대기 주문 {restored['loaded']:,}건 복구 "
+                  f"(건너뜀 {restored['skipped']:,}건, {restored['total_ms']:,.0f}ms)")
+
+        watermark = await journal_watermark(db)
+        last_checkpoint = time.time()
+
         # [무한 루프] 봇 주문 + 사용자 체결 확인
         while True:
             await asyncio.sleep(1) 
@@ -84,34 +218,39 @@ async def simulate_market_background():
                 events = ["반도체 수요 폭발", "금리 동결 발표", "경쟁사 실적 부진", "특별한 이슈 없음", "신제품 출시 임박"]
                 current_news_display = random.choice(events)
 
+            # 1. 봇(Bot)의 랜덤 주문 투입 (전 종목 주문을 모아서 한 번에 제출)
+            prev_prices = {}
+            bot_orders = []
             for ticker in TARGET_TICKERS:
                 if ticker not in engine.companies: continue
                 
-                # 1. 봇(Bot)의 랜덤 주문 투입
                 current_p = engine.companies[ticker].current_price
+                prev_prices[ticker] = current_p
                 bot_side = random.choice([OrderSide.BUY, OrderSide.SELL])
                 spread = random.randint(-500, 500)
                 order_price = int(current_p + spread)
                 if order_price < 10: order_price = 10
                 qty = random.randint(1, 5) # 봇은 소량으로 자주 거래
 
-                bot_order = Order(
-                    agent_id="Bot_Noise", ticker=ticker, side=bot_side,
-                    order_type=OrderType.LIMIT, quantity=qty, price=order_price
-                )
-                engine.place_order(bot_order)
-                
-                # 2. 가격 변동 DB 반영
+                # 봇 주문은 pydantic 모델 없이 엔진용 객체로 바로 만듦 (매 틱 생성 비용 절감)
+                bot_orders.append(EngineOrder("Bot_Noise", ticker, bot_side, qty, order_price))
+            try:
+                # 사용자 주문과 같은 창구로 넣어서 엔진을 건드리는 쪽이 하나뿐이게 함
+                await gateway.call(engine.place_orders_async, bot_orders)
+            except GatewayFull:
+                print("⚠️ [주문 창구] 대기열이 꽉 차서 이번 틱 봇 주문을 건너뜁니다.")
+
+            # 호가창 캐시는 이번 틱 장부로 다시 만들도록 비움
+            order_book_cache.clear()
+
+            now = time.time()
+            for ticker, current_p in prev_prices.items():
+                # 2. 가격 변동 반영 (메모리만 갱신, DB에는 price_store가 주기적으로 몰아서 저장)
                 new_price = int(engine.companies[ticker].current_price)
-                if new_price != current_p:
-                    await db.execute("UPDATE stocks SET current_price = ? WHERE company_name = ?", (new_price, ticker))
-                    await db.commit()
-                    # 봇 체결 알림 (너무 많으면 주석 처리)
-                    # print(f"✨ [시장] {ticker} 현재가 {new_price}원으로 변경")
+                price_store.set(ticker, new_price)
 
-                # 히스토리 저장
-                price_history[ticker].append({"time": datetime.now().strftime("%H:%M:%S"), "price": new_price})
-                if len(price_history[ticker]) > 30: price_history[ticker].pop(0)
+                # 봉 이어 붙이기 (거래가 없던 초도 차트에 점이 찍히게)
+                candles.roll(ticker, now, new_price)
 
                 # 3. 멘토링 (삼성전자만 Real AI)
                 if real_ai_mode and ticker == "삼성전자" and (loop_count % 30 == 0):
@@ -124,70 +263,130 @@ async def simulate_market_background():
                     if ticker != "삼성전자" or not current_mentor_comments[ticker]:
                         current_mentor_comments[ticker] = random.sample(comments_pool, 1)
 
+                # 4. 이번 틱의 응답 미리 만들어두고 스트리밍 구독자에게 전송
+                payload = await market_data_payload(ticker)
+                market_data_cache[ticker] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                feed.publish(ticker, payload)
+
             
             # 사용자 주문 정산 (Settlement)
-            # DB에 'PENDING'으로 남아있는 주문들을 가져와서, 엔진에서 사라졌는지(체결됐는지) 확인합니다.         
-            async with db.execute("SELECT * FROM orders WHERE status = 'PENDING'") as cursor:
-                pending_orders = await cursor.fetchall()
-
-            for db_order in pending_orders:
-                order_id = db_order['id']
-                user_id = db_order['user_id']
-                target_ticker = db_order['company_name']
-                o_type = db_order['order_type'] # 'BUY' or 'SELL'
-                qty = db_order['quantity']
-                price = db_order['price']
-                
-                # 엔진에서 내 주문 찾기 (Agent ID: User_{user_id})
-                # 엔진의 오더북(호가창)을 뒤져서 내 주문이 남아있는지 봅니다.
-                is_alive_in_engine = False
-                book = engine.order_books.get(target_ticker, {"BUY": [], "SELL": []})
-                
-                # 매수 주문이면 BUY 쪽, 매도면 SELL 쪽 확인
-                check_list = book["BUY"] if o_type == "BUY" else book["SELL"]
-                
-                for eng_order in check_list:
-                    if eng_order.agent_id == f"User_{user_id}" and eng_order.price == price:
-                        # 아직 호가창에 남아있음 -> 체결 안 됨
-                        is_alive_in_engine = True
-                        break
-                
-                # 😲 호가창에서 사라졌다? = 체결 완료 (FILLED)!
-                if not is_alive_in_engine:
-                    print(f"🎉 [체결 성공] 사용자 {user_id}님의 {target_ticker} 주문이 체결되었습니다!")
-                    
-                    # 1. 주문 상태 변경
-                    await db.execute("UPDATE orders SET status = 'FILLED' WHERE id = ?", (order_id,))
-                    
-                    # 2. 자산 지급 (Step 3에서 이미 차감했으므로, 들어올 것만 주면 됨)
-                    if o_type == "BUY":
-                        # 매수 성공: 주식 지급
-                        await db.execute("""
-                            INSERT INTO holdings (user_id, company_name, quantity, average_price)
-                            VALUES (?, ?, ?, ?)
-                            ON CONFLICT(user_id, company_name) DO UPDATE SET quantity = quantity + ?, average_price = ?
-                        """, (user_id, target_ticker, qty, price, qty, price)) # 평단가는 단순하게 체결가로 갱신
-                        
-                    elif o_type == "SELL":
-                        # 매도 성공: 현금 지급
-                        income = price * qty
-                        await db.execute("UPDATE users SET balance = balance + ? WHERE id = ?", (income, user_id))
-
-                    # 3. 퀘스트 자동 달성 (보너스)
-                    quest_name = "첫 매수 성공" if o_type == "BUY" else "첫 매도 성공"
-                    cursor = await db.execute("SELECT count(*) FROM user_quests WHERE user_id = ? AND quest_name = ?", (user_id, quest_name))
-                    if (await cursor.fetchone())[0] == 0:
-                         reward = 500000 if o_type == "BUY" else 1000000
-                         await db.execute("INSERT INTO user_quests (user_id, quest_name, reward_amount) VALUES (?, ?, ?)", (user_id, quest_name, reward))
-                         await db.execute("UPDATE users SET balance = balance + ? WHERE id = ?", (reward, user_id))
-                         print(f"🎁 [퀘스트 완료] {quest_name}! 보상 {reward}원 지급")
-
-                    await db.commit() # 정산 확정
+            # 이번 틱에 쌓인 체결 이벤트를 모아서 한 트랜잭션으로 한꺼번에 정산합니다.
+            fills = []
+            while not fill_queue.empty():
+                fills.append(fill_queue.get_nowait())
+            pin, fill_pin = fill_pin, None     # 이 뒤에 나오는 체결은 새로 잡음
+            if fills:
+                started = time.perf_counter()
+                try:
+                    # 체결 기록이 디스크에 남은 뒤에 DB에 반영 (다른 주문 요청과 fsync를 같이 씀)
+                    await journal.commit()
+                except Exception as e:
+                    # fsync 실패: 체결은 메모리에 남아 있으므로 다음 틱에 다시 커밋하고 정산
+                    # (버려진 체결 기록은 다시 적지 않음 - 아직 버퍼에 있던 것과 겹치면 재시작 때 두 번 정산됨)
+                    print(f"⚠️ [정산 보류] 체결 기록 저장 실패, 다음 틱에 다시 시도합니다: {e}")
+                    requeue_fills(fills, pin)
+                else:
+                    try:
+                        changes = []
+                        settled = await settle_fills(db, fills, changes)
+                        await db.commit() # 정산 확정 (틱당 1번)
+                    except Exception as e:
+                        await db.rollback()
+                        print(f"⚠️ [정산 보류] DB 반영 실패, 다음 틱에 다시 시도합니다: {e}")
+                        requeue_fills(fills, pin)
+                    else:
+                        accounts.apply(changes)
+                        journal.unpin(pin)
+                        elapsed_ms = (time.perf_counter() - started) * 1000
+                        if settled:
+                            print(f"🧾 [정산] {settled}건 정산 완료 ({elapsed_ms:.1f}ms)")
+                        if elapsed_ms > 1000:
+                            print(f"⚠️ [정산 지연] 틱 주기(1초)보다 오래 걸렸습니다: {elapsed_ms:.1f}ms")
+
+            # 가격 저장 (flush 주기가 됐을 때만 바뀐 것들을 한 번에)
+            await price_store.maybe_flush(db)
+            tick_store.flush()
+
+            # 저널 반영 위치 기록 (재시작 때 이 다음부터만 다시 반영) + 파일이 커졌으면 그 앞부분을 잘라냄
+            if now - last_checkpoint >= JOURNAL_CHECKPOINT_INTERVAL:
+                last_checkpoint = now
+                applied = journal.applied_seq
+                if applied > watermark:
+                    try:
+                        await set_journal_watermark(db, applied)
+                        await db.commit()
+                        watermark = applied
+                        if journal.size > JOURNAL_COMPACT_BYTES:
+                            removed = await journal.compact(watermark)
+                            print(f"📼 [저널] seq {watermark}까지 잘라냄 ({removed:,} bytes)")
+                    except Exception as e:
+                        await db.rollback()
+                        print(f"⚠️ [저널] 반영 위치 기록/정리 실패, 다음 주기에 다시 시도합니다: {e}")
 
     except Exception as e:
         print(f"❌ 시뮬레이션 치명적 에러: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        engine.unsubscribe(on_fill)
+        engine.unsubscribe(candles.on_fill)
+        engine.unsubscribe(tick_store.on_fill)
+        # 종료 직전 마지막 가격 저장 (계좌는 flush_accounts_background / 종료 시 lifespan에서)
+        try:
+            await price_store.flush(db)
+        except Exception as e:
+            print(f"⚠️ 가격 저장 실패: {e}")
+        await db.close()
+
+async def flush_accounts_background():
+    """
+    계좌 write-behind (/buy, /sell, /reward 변경을 ACCOUNT_FLUSH_INTERVAL초마다 DB에 몰아서 저장)
+    틱 루프가 멈춰도 계좌 저장은 계속되게 전용 연결로 따로 돕니다. (실패한 변경은 다음 주기에 다시 씀)
+    """
+    db = await database.connect()
+    try:
+        while True:
+            await asyncio.sleep(accounts.flush_interval)
+            try:
+                await accounts.flush(db)
+            except Exception as e:
+                print(f"⚠️ 계좌 저장 실패 (다음 주기에 다시 시도): {e}")
+    finally:
+        await db.close()
+
+async def flush_accounts_final():
+    """종료 직전 남은 계좌 변경 저장"""
+    db = await database.connect()
+    try:
+        await accounts.flush(db)
+    except Exception as e:
+        print(f"⚠️ 계좌 저장 실패: {e}")
+    finally:
+        await db.close()
+
+async def compact_ledger_background():
+    """
+    거래 원장 정리 (체크포인트 + 오래된 거래 보관)
+    틱 루프를 막지 않게 전용 연결로 따로 돌고, 한 번에 LEDGER_COMPACT_MAX_ROWS건까지만 보관합니다.
+    (다 못 옮겼으면 주기를 기다리지 않고 잠깐 쉬었다가 이어서)
+    """
+    db = await database.connect()
+    try:
+        while True:
+            await asyncio.sleep(LEDGER_COMPACT_INTERVAL)
+            while True:
+                try:
+                    compacted = await compact_ledger(db, max_rows=LEDGER_COMPACT_MAX_ROWS)
+                except Exception as e:
+                    await db.rollback()
+                    print(f"⚠️ 원장 정리 실패: {e}")
+                    break
+                if compacted["checkpoints"] or compacted["archived"]:
+                    print(f"📚 [원장 정리] 체크포인트 {compacted['checkpoints']}개, "
+                          f"거래 {compacted['archived']:,}건 보관 (세그먼트 {compacted['segments']}개)")
+                if compacted["archived"] < LEDGER_COMPACT_MAX_ROWS:
+                    break
+                await asyncio.sleep(1)
     finally:
         await db.close()
 
@@ -195,9 +394,52 @@ async def simulate_market_background():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+
+    # 저널을 열고, DB에 아직 반영 안 된 레코드를 먼저 반영 (그 다음에 호가창 복구)
+    journal.open()
+    db = await database.connect()
+    try:
+        replayed = await replay_journal(db, journal)
+        # 저널 이전에 DB가 매긴 주문 번호와 겹치지 않게
+        async with db.execute("SELECT COALESCE(MAX(id), 0) FROM orders") as cursor:
+            journal.reserve_order_ids((await cursor.fetchone())[0])
+        # 저널까지 반영된 잔액/보유량을 메모리로
+        await accounts.load(db)
+    finally:
+        await db.close()
+    if replayed["records"]:
+        print(f"📼 [저널] seq {replayed['from_seq'] + 1}~{replayed['to_seq']} 레코드 {replayed['records']:,}건 "
+              f"DB 반영 ({replayed['ms']:,.0f}ms)")
+
+    # 저장해 둔 최근 틱으로 차트 봉 복구
+    tick_store.open()
+    since_ns = time.time_ns() - CANDLE_WARMUP_SEC * 1_000_000_000
+    for ticker in tick_store.tickers():
+        candles.load(ticker, *tick_store.read(ticker, since_ns))
+
+    await database.open_pool()
+    gateway.start()
     task = asyncio.create_task(simulate_market_background())
+    compact_task = asyncio.create_task(compact_ledger_background())
+    account_task = asyncio.create_task(flush_accounts_background())
     yield
     task.cancel()
+    compact_task.cancel()
+    account_task.cancel()
+    feed.close()
+    # 시뮬레이션 루프가 마지막 가격을 저장하고 끝날 때까지 기다림
+    with suppress(asyncio.CancelledError):
+        await task
+    with suppress(asyncio.CancelledError):
+        await compact_task
+    with suppress(asyncio.CancelledError):
+        await account_task
+    await gateway.stop()
+    await flush_accounts_final()
+    engine.close()
+    journal.close()
+    tick_store.close()
+    await database.close_pool()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -209,28 +451,98 @@ app.add_middleware(
 app.include_router(trade.router)
 app.include_router(social.router, prefix="/api/social", tags=["Social & Ranking"])
 
+@app.get("/api/metrics/db-pool")
+async def get_db_pool_metrics():
+    """DB 연결 풀 상태 (사용 중/대기 중 연결 수, 연결을 받기까지 기다린 시간)"""
+    return database.pool.stats()
+
+@app.get("/api/metrics/journal")
+async def get_journal_metrics():
+    """주문 저널 상태 (마지막 seq, fsync 횟수, fsync 한 번에 같이 내려간 레코드 수)"""
+    return journal.stats()
+
+@app.get("/api/metrics/order-gateway")
+async def get_order_gateway_metrics():
+    """주문 창구 상태 (대기열 길이, 꽉 차서 돌려보낸 횟수, 접수부터 엔진 처리까지 걸린 시간)"""
+    return gateway.stats()
+
+@app.get("/api/metrics/accounts")
+async def get_account_metrics():
+    """계좌 저장소 상태 (메모리에 올린 유저 수, DB에 아직 안 내려간 변경 수)"""
+    return accounts.stats()
+
+@app.get("/api/prices")
+async def get_prices():
+    """전 종목 현재가 (메모리에서 바로 응답)"""
+    return price_store.snapshot()
+
 @app.get("/api/market-data")
 async def get_market_data(ticker: str = "삼성전자"):
     if ticker not in engine.companies:
         return {"ticker": ticker, "price": 0, "error": "존재하지 않는 종목"}
 
-    comp = engine.companies[ticker]
-    book = engine.order_books.get(ticker, {"BUY": [], "SELL": []})
-    
-    # 엔진 호가
-    # engine.order_books에 있는 Order 객체들을 딕셔너리로 변환
-    buy_orders = [o.dict() for o in book["BUY"][:5]]  # 상위 5개
-    sell_orders = [o.dict() for o in book["SELL"][:5]] # 상위 5개
+    # 틱 루프가 만들어 둔 응답을 그대로 보냄 (아직 첫 틱 전이면 지금 만듦)
+    body = market_data_cache.get(ticker)
+    if body is None:
+        body = await build_market_data(ticker)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/api/market-stream")
+async def stream_market_data(ticker: str = "삼성전자"):
+    """
+    [시세 스트리밍 - SSE] 접속하자마자 스냅샷(/api/market-data와 같은 필드 + seq)을 받고,
+    이후 틱마다 바뀐 것만 담은 변경분(seq가 1씩 증가)을 받습니다. (브라우저는 EventSource로 구독)
+    seq가 건너뛰면 다시 접속해서 스냅샷부터 받으면 됩니다.
+    """
+    if ticker not in engine.companies:
+        raise HTTPException(status_code=404, detail=f"존재하지 않는 종목입니다: {ticker}")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(feed.stream(ticker), media_type="text/event-stream", headers=headers)
 
+@app.get("/api/candles")
+async def get_candles(ticker: str = "삼성전자", resolution: str = "1m", start: Optional[float] = None,
+                      end: Optional[float] = None, limit: int = 500):
+    """
+    [봉 차트] OHLCV + VWAP, 오래된 것부터
+    resolution: 1s / 1m / 5m / 1h, start/end: 유닉스 시각(초, 양끝 포함), 범위가 limit보다 길면 최근 limit개
+    """
+    if ticker not in engine.companies:
+        raise HTTPException(status_code=404, detail=f"존재하지 않는 종목입니다: {ticker}")
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"봉 단위는 {', '.join(RESOLUTIONS)} 중 하나여야 합니다.")
     return {
-        "ticker": ticker,     
-        "name": ticker,
-        "price": comp.current_price,
-        "news": current_news_display,
-        "history": price_history.get(ticker, []),
-        "buy_orders": buy_orders,
-        "sell_orders": sell_orders,
-        "mentors": current_mentor_comments.get(ticker, [])
+        "ticker": ticker,
+        "resolution": resolution,
+        "candles": candles.candles(ticker, resolution, start, end, max(1, min(limit, MAX_CANDLES))),
+    }
+
+@app.get("/api/ticks")
+async def get_ticks(ticker: str = "삼성전자", start: Optional[float] = None, end: Optional[float] = None,
+                    limit: int = 1000):
+    """
+    [체결 틱] 틱 저장소에서 시간순으로 (시각ns, 가격, 수량) 컬럼을 돌려줍니다.
+    start/end: 유닉스 시각(초, [start, end)), 범위가 limit보다 길면 최근 limit개
+    """
+    if ticker not in engine.companies:
+        raise HTTPException(status_code=404, detail=f"존재하지 않는 종목입니다: {ticker}")
+    ticks = tick_store.read(ticker, None if start is None else int(start * 1e9),
+                            None if end is None else int(end * 1e9))
+    n = max(1, min(limit, MAX_TICKS))
+    return {
+        "ticker": ticker,
+        "timestamp": ticks.timestamp[-n:].tolist(),
+        "price": ticks.price[-n:].tolist(),
+        "quantity": ticks.quantity[-n:].tolist(),
     }
 
+@app.get("/api/metrics/tick-store")
+async def get_tick_store_metrics():
+    """틱 저장소 상태 (종목별 틱 수, 세그먼트 수, 아직 파일에 안 쓴 틱 수)"""
+    return tick_store.stats()
+
+@app.get("/api/metrics/market-feed")
+async def get_market_feed_metrics():
+    """시세 스트리밍 상태 (종목별 구독자 수/seq, 변경분·스냅샷 평균 크기, 다시 맞춘 횟수)"""
+    return feed.stats()
+
 app.mount("/", StaticFiles(directory="static", html=True), name="static")
\ No newline at end of file
@@ -1,37 +1,81 @@
-from typing import List, Dict, Optional
+import time
+import itertools
+from typing import Callable, Iterable, List, Dict, NamedTuple, Optional, Tuple, Union
 from datetime import datetime
 from domain_models import Company, Order, OrderType, OrderSide, get_initial_companies
+from order_book import EngineOrder, OrderBook
+from trade_log import TradeLog
+
+# 엔진 주문 ID: 외부에서 준 문자열 ID 또는 엔진이 매긴 정수 ID
+OrderKey = Union[str, int]
+
+
+class FillEvent(NamedTuple):
+    """
+    체결 이벤트 (주문 한 건 기준)
+    거래 1건이 나면 매수 주문/매도 주문 각각에 대해 하나씩 발행됩니다.
+    """
+    order_id: OrderKey
+    agent_id: str
+    ticker: str
+    side: str          # "BUY" / "SELL"
+    price: float       # 실제 체결가
+    quantity: int      # 이번에 체결된 수량
+    remaining: int     # 체결 후 남은 수량 (0이면 전량 체결)
+
 
 class MarketEngine:
-    def __init__(self):
+    def __init__(self, trade_log_capacity: int = 100_000, trade_log_path: Optional[str] = None,
+                 market_protection: float = 0.05):
         # 1. 초기 기업 데이터 로드 (ASFM 논문 데이터)
         self.companies: Dict[str, Company] = {c.ticker: c for c in get_initial_companies()}
         
         # 2. 오더북 (주문 장부) 초기화
-        # 구조: { "IT008": { "BUY": [], "SELL": [] } }
-        self.order_books: Dict[str, Dict[str, List[Order]]] = {
-            ticker: {"BUY": [], "SELL": []} for ticker in self.companies.keys()
+        # 구조: { "IT008": OrderBook } (book["BUY"], book["SELL"]은 가격 칸별 FIFO 큐)
+        self.order_books: Dict[str, OrderBook] = {
+            ticker: OrderBook(ticker) for ticker in self.companies.keys()
         }
         
-        # 3. 체결 내역 (로그)
-        self.trade_logs: List[Dict] = []
+        # 3. 체결 내역 (로그) - 최근 trade_log_capacity건만 메모리에 유지
+        self.trade_logs = TradeLog(capacity=trade_log_capacity, spill_path=trade_log_path)
+
+        # 4. 주문 색인 { order_id: EngineOrder } - 취소/정정할 때 장부를 뒤지지 않고 바로 찾음
+        self.order_index: Dict[OrderKey, EngineOrder] = {}
+        self._next_order_id = itertools.count(1)
+
+        # 5. 체결 이벤트 구독자 (정산 루프 등)
+        self._fill_subscribers: List[Callable[[FillEvent], None]] = []
+
+        # 6. 시장가 주문 보호 범위 (현재가 대비 ±5%까지만 체결)
+        self.market_protection = market_protection
 
-    def place_order(self, order: Order) -> Dict:
+    def subscribe(self, callback: Callable[[FillEvent], None]):
+        """체결이 날 때마다 callback(FillEvent)를 호출하도록 등록합니다."""
+        self._fill_subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[FillEvent], None]):
+        if callback in self._fill_subscribers:
+            self._fill_subscribers.remove(callback)
+
+    def place_order(self, order: Union[Order, EngineOrder]) -> Dict:
         """
         주문을 받아서 장부에 적고, 매칭을 시도하는 함수
         (나중에 프론트엔드에서 '매수' 버튼 누르면 이 함수가 호출됨)
+        pydantic Order를 주면 EngineOrder로 바꿔서 넣고, 봇처럼 자주 주문하는 쪽은
+        EngineOrder를 바로 넘기면 모델 생성 비용 없이 들어갑니다.
         """
-        # 1. 주문 유효성 검사 (시장가 주문인데 가격이 없거나 등등)
-        if order.order_type == OrderType.LIMIT and order.price is None:
-            return {"status": "ERROR", "msg": "지정가 주문은 가격이 필수입니다."}
+        if isinstance(order, Order):
+            order = EngineOrder.from_model(order)
 
-        # 2. 장부에 등록
-        ticker = order.ticker
-        if ticker not in self.order_books:
-            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {ticker}"}
+        # 시장가 주문은 장부에 올리지 않고 바로 체결 (남은 수량은 즉시 취소)
+        if order.order_type == OrderType.MARKET:
+            return self._execute_market(order)[0]
 
-        # 매수/매도 리스트에 추가
-        self.order_books[ticker][order.side.value].append(order)
+        # 1~2. 유효성 검사 후 장부에 등록
+        error = self._add_order(order)
+        if error:
+            return error
+        ticker = order.ticker
         
         # 3. 매칭 엔진 가동 (즉시 체결 시도)
         trades = self._match_orders(ticker)
@@ -43,70 +87,349 @@ class MarketEngine:
             "current_price": self.companies[ticker].current_price
         }
 
+    def place_orders(self, orders: List[Union[Order, EngineOrder]]) -> Dict:
+        """
+        주문 여러 건을 한꺼번에 장부에 적고, 종목별로 매칭을 한 번만 돌립니다.
+        (봇/에이전트처럼 한 틱에 주문이 몰릴 때 place_order를 반복 호출하는 것보다 훨씬 쌈)
+        - 배치 안의 주문끼리는 들어온 순서대로 대기열에 서고, 모두 등록된 뒤에 체결됩니다.
+        - 시장가 주문은 지정가 주문 매칭이 끝난 뒤 입력 순서대로 처리합니다.
+        - results: 주문별 결과 (place_order와 같은 형태, 입력 순서 유지)
+        - trades: 이번 배치에서 나온 전체 체결 목록
+        """
+        orders = [EngineOrder.from_model(o) if isinstance(o, Order) else o for o in orders]
+        accepted = []
+        errors = {}
+        tickers = {}
+        market_orders = []
+        for i, order in enumerate(orders):
+            if order.order_type == OrderType.MARKET:
+                market_orders.append(i)
+                continue
+            error = self._add_order(order)
+            if error:
+                errors[i] = error
+            else:
+                accepted.append(order)
+                tickers[order.ticker] = True
+
+        trades = []
+        for ticker in tickers:
+            trades.extend(self._match_orders(ticker))
+
+        market_results = {}
+        for i in market_orders:
+            market_results[i], market_trades = self._execute_market(orders[i])
+            trades.extend(market_trades)
+
+        # 주문별 체결 건수
+        trade_counts: Dict[str, int] = {}
+        for trade in trades:
+            for oid in (trade["buy_order_id"], trade["sell_order_id"]):
+                trade_counts[oid] = trade_counts.get(oid, 0) + 1
+
+        results = []
+        for i, order in enumerate(orders):
+            if i in errors:
+                results.append(errors[i])
+                continue
+            if i in market_results:
+                results.append(market_results[i])
+                continue
+            results.append({
+                "status": "SUCCESS",
+                "order_id": order.order_id,
+                "trades_executed": trade_counts.get(order.order_id, 0),
+                "current_price": self.companies[order.ticker].current_price
+            })
+
+        return {"results": results, "trades": trades}
+
+    def _add_order(self, order: EngineOrder) -> Optional[Dict]:
+        """주문 유효성 검사 후 장부에 등록합니다. 문제가 있으면 에러 응답을 돌려줍니다."""
+        # 1. 주문 유효성 검사 (시장가 주문인데 가격이 없거나 등등)
+        if order.order_type == OrderType.LIMIT and order.price is None:
+            return {"status": "ERROR", "msg": "지정가 주문은 가격이 필수입니다."}
+
+        # 2. 장부에 등록
+        ticker = order.ticker
+        if ticker not in self.order_books:
+            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {ticker}"}
+
+        # 외부 ID가 없는 주문(봇 등)은 엔진이 정수 ID를 매김
+        if order.order_id is None:
+            order.order_id = next(self._next_order_id)
+
+        # 매수/매도 호가 칸에 추가
+        self.order_books[ticker].add(order)
+        self.order_index[order.order_id] = order
+        return None
+
     def _match_orders(self, ticker: str) -> List[Dict]:
         """
         [핵심 로직] ASFM 논문의 Price-Time Priority 매칭 알고리즘
+        가격 칸(PriceLevel) 힙에서 최우선 호가를 바로 꺼내므로 매번 정렬하지 않습니다.
         """
         book = self.order_books[ticker]
+        bids, asks = book.bids, book.asks
         executed_trades = []
 
         # 매칭 루프: 매수와 매도 주문이 둘 다 있어야 매칭 시도
-        while book["BUY"] and book["SELL"]:
-            # 1. 정렬 (Priority 결정)
-            # 매수: 비싸게 산다는 사람 순서 (내림차순)
-            # 매도: 싸게 판다는 사람 순서 (오름차순)
-            # (시장가 주문은 가장 높은 우선순위로 처리해야 하지만, 일단 간단하게 지정가 기준 정렬)
-            book["BUY"].sort(key=lambda x: x.price if x.price else float('inf'), reverse=True)
-            book["SELL"].sort(key=lambda x: x.price if x.price else 0.0)
+        while True:
+            # 1. 최우선 호가 (매수: 최고가, 매도: 최저가 / 시장가는 맨 앞)
+            buy_level = bids.best_level()
+            sell_level = asks.best_level()
+            if buy_level is None or sell_level is None:
+                break
 
-            best_buy = book["BUY"][0]
-            best_sell = book["SELL"][0]
+            best_buy = buy_level.front()
+            best_sell = sell_level.front()
 
             # 2. 가격 조건 확인 (살 가격 >= 팔 가격)이어야 거래 성사
             # (시장가는 무조건 체결된다고 가정)
-            buy_price = best_buy.price if best_buy.price else best_sell.price
-            sell_price = best_sell.price if best_sell.price else best_buy.price
+            buy_price = best_buy.price if best_buy.price is not None else best_sell.price
+            sell_price = best_sell.price if best_sell.price is not None else best_buy.price
+            if buy_price is None or sell_price is None:
+                # 양쪽 다 시장가면 기준 가격이 없음
+                break
 
             if buy_price >= sell_price:
                 # 거래 체결!
                 trade_price = sell_price # 보통 먼저 걸려있던 주문 가격으로 체결됨
                 trade_qty = min(best_buy.quantity, best_sell.quantity)
 
-                # 3. 기록 및 상태 업데이트
-                trade_record = {
-                    "ticker": ticker,
-                    "price": trade_price,
-                    "quantity": trade_qty,
-                    "buyer_id": best_buy.agent_id,
-                    "seller_id": best_sell.agent_id,
-                    "timestamp": datetime.now()
-                }
-                executed_trades.append(trade_record)
-                self.trade_logs.append(trade_record)
-
-                # 4. 주가 업데이트 (ASFM: 체결가로 현재가 갱신)
-                self.companies[ticker].current_price = trade_price
-
-                # 5. 물량 차감 및 주문 완료 처리
+                # 3. 물량 차감 및 주문 완료 처리
                 best_buy.quantity -= trade_qty
                 best_sell.quantity -= trade_qty
+                buy_level.total_qty -= trade_qty
+                sell_level.total_qty -= trade_qty
 
                 if best_buy.quantity == 0:
-                    book["BUY"].pop(0) # 대기열에서 삭제
+                    bids.pop_front(buy_level) # 대기열에서 삭제
                     best_buy.status = "FILLED"
-                
+                    self.order_index.pop(best_buy.order_id, None)
+
                 if best_sell.quantity == 0:
-                    book["SELL"].pop(0) # 대기열에서 삭제
+                    asks.pop_front(sell_level) # 대기열에서 삭제
                     best_sell.status = "FILLED"
-                
-                print(f"✨ [체결 알림] {ticker} {trade_qty}주 @ {trade_price}원 (현재가 갱신!)")
+                    self.order_index.pop(best_sell.order_id, None)
+
+                # 4. 기록, 현재가 갱신, 체결 이벤트 발행
+                executed_trades.append(self._record_trade(ticker, best_buy, best_sell, trade_price, trade_qty))
 
             else:
                 # 가격이 안 맞으면 매칭 종료 (더 볼 필요 없음)
                 break
-        
+
         return executed_trades
 
+    def _record_trade(self, ticker: str, buy: EngineOrder, sell: EngineOrder,
+                      trade_price: float, trade_qty: int) -> Dict:
+        """
+        체결 1건을 기록합니다. (물량 차감/대기열 정리는 부르는 쪽에서 먼저 끝낸 뒤 호출)
+        체결 로그 -> 현재가 갱신 -> 체결 이벤트 발행 순서
+        """
+        trade_record = {
+            "ticker": ticker,
+            "price": trade_price,
+            "quantity": trade_qty,
+            "buyer_id": buy.agent_id,
+            "seller_id": sell.agent_id,
+            "buy_order_id": buy.order_id,
+            "sell_order_id": sell.order_id,
+            "timestamp": datetime.now()
+        }
+        self.trade_logs.append(ticker, trade_price, trade_qty, buy.agent_id, sell.agent_id)
+
+        # ASFM: 체결가로 현재가 갱신
+        self.companies[ticker].current_price = trade_price
+
+        # 체결 이벤트 발행 (구독자에게 바로 전달)
+        for callback in self._fill_subscribers:
+            callback(FillEvent(buy.order_id, buy.agent_id, ticker, "BUY",
+                               trade_price, trade_qty, buy.quantity))
+            callback(FillEvent(sell.order_id, sell.agent_id, ticker, "SELL",
+                               trade_price, trade_qty, sell.quantity))
+
+        print(f"✨ [체결 알림] {ticker} {trade_qty}주 @ {trade_price}원 (현재가 갱신!)")
+        return trade_record
+
+    # ==========================================
+    # 시장가 주문 (장부에 올리지 않고 즉시 체결)
+    # ==========================================
+    def _protection_price(self, ticker: str, side: OrderSide) -> float:
+        """시장가 주문이 쓸어담을 수 있는 한계 가격 (현재가 ± market_protection)"""
+        ref = self.companies[ticker].current_price
+        if side == OrderSide.BUY:
+            return ref * (1 + self.market_protection)
+        return ref * (1 - self.market_protection)
+
+    def quote_market(self, ticker: str, side: OrderSide, quantity: int) -> Dict:
+        """
+        지금 시장가로 quantity주를 주문하면 얼마에 몇 주가 체결될지 미리 계산합니다. (장부는 건드리지 않음)
+        호가 칸을 좋은 가격부터 한 번만 훑으므로, 주문 전 잔액 확인에 씁니다.
+        """
+        if ticker not in self.order_books:
+            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {ticker}"}
+        book = self.order_books[ticker]
+        opposite = book.asks if side == OrderSide.BUY else book.bids
+        limit = self._protection_price(ticker, side)
+
+        filled, cost, worst = 0, 0.0, None
+        for level in opposite.iter_levels():
+            if (level.price > limit) if side == OrderSide.BUY else (level.price < limit):
+                break
+            qty = min(quantity - filled, level.total_qty)
+            filled += qty
+            cost += qty * level.price
+            worst = level.price
+            if filled == quantity:
+                break
+
+        return {
+            "status": "SUCCESS",
+            "filled_quantity": filled,
+            "unfilled_quantity": quantity - filled,
+            "total_cost": cost,
+            "avg_price": cost / filled if filled else None,
+            "worst_price": worst,
+            "limit_price": limit,
+        }
+
+    def _execute_market(self, order: EngineOrder) -> Tuple[Dict, List[Dict]]:
+        """
+        시장가 주문: 반대편 최우선 호가부터 보호 가격까지 쓸어담고, 못 채운 수량은 즉시 취소(IOC)합니다.
+        체결 금액도 같은 루프에서 함께 계산합니다.
+        주문에 가격이 있으면 보호 가격보다 더 좁은 쪽을 한계로 씁니다. (미리 잡아둔 돈을 넘지 않게)
+        """
+        ticker = order.ticker
+        if ticker not in self.order_books:
+            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {ticker}"}, []
+        if order.order_id is None:
+            order.order_id = next(self._next_order_id)
+
+        is_buy = order.side == OrderSide.BUY
+        book = self.order_books[ticker]
+        opposite = book.asks if is_buy else book.bids
+        limit = self._protection_price(ticker, order.side)
+        if order.price is not None:
+            limit = min(limit, order.price) if is_buy else max(limit, order.price)
+
+        trades = []
+        filled, cost = 0, 0.0
+        while order.quantity > 0:
+            level = opposite.best_level()
+            if level is None or ((level.price > limit) if is_buy else (level.price < limit)):
+                break
+
+            resting = level.front()
+            qty = min(order.quantity, resting.quantity)
+            order.quantity -= qty
+            resting.quantity -= qty
+            level.total_qty -= qty
+            filled += qty
+            cost += qty * level.price
+
+            if resting.quantity == 0:
+                opposite.pop_front(level)
+                resting.status = "FILLED"
+                self.order_index.pop(resting.order_id, None)
+
+            # 체결가는 대기 중이던 주문의 가격
+            buy, sell = (order, resting) if is_buy else (resting, order)
+            trades.append(self._record_trade(ticker, buy, sell, level.price, qty))
+
+        order.status = "FILLED" if order.quantity == 0 else "CANCELLED"
+        return {
+            "status": "SUCCESS",
+            "order_id": order.order_id,
+            "trades_executed": len(trades),
+            "filled_quantity": filled,
+            "unfilled_quantity": order.quantity,
+            "avg_price": cost / filled if filled else None,
+            "total_cost": cost,
+            "current_price": self.companies[ticker].current_price
+        }, trades
+
+    def cancel_order(self, order_id: OrderKey) -> bool:
+        """
+        대기 중인 주문을 장부에서 뺍니다. (O(1))
+        이미 체결됐거나 없는 주문이면 False를 돌려줍니다.
+        """
+        order = self.order_index.pop(order_id, None)
+        if order is None:
+            return False
+        self.order_books[order.ticker].side(order.side).remove(order)
+        return True
+
+    def amend_order(self, order_id: OrderKey, quantity: Optional[int] = None, price: Optional[float] = None) -> Dict:
+        """
+        대기 중인 주문의 남은 수량/가격을 정정합니다.
+        - 가격은 그대로, 수량만 줄이면: 대기 순번 유지 (O(1))
+        - 가격을 바꾸거나 수량을 늘리면: 기존 주문 취소 후 맨 뒤로 다시 접수 (O(log n))
+        """
+        order = self.order_index.get(order_id)
+        if order is None:
+            return {"status": "ERROR", "msg": f"대기 중인 주문이 아닙니다: {order_id}"}
+
+        new_qty = order.quantity if quantity is None else quantity
+        new_price = order.price if price is None else price
+        if new_qty <= 0:
+            self.cancel_order(order_id)
+            return {"status": "SUCCESS", "order_id": order_id, "trades_executed": 0,
+                    "current_price": self.companies[order.ticker].current_price}
+
+        side = self.order_books[order.ticker].side(order.side)
+        if new_price == order.price and new_qty <= order.quantity:
+            side.reduce(order, new_qty)
+            return {"status": "SUCCESS", "order_id": order_id, "trades_executed": 0,
+                    "current_price": self.companies[order.ticker].current_price}
+
+        # 취소된 주문 객체는 큐에 흔적이 남아있으므로, 새 객체로 다시 접수합니다.
+        self.cancel_order(order_id)
+        replacement = order.copy(quantity=new_qty, price=new_price, ts_ns=time.monotonic_ns())
+        return self.place_order(replacement)
+
+    def get_order(self, order_id: OrderKey) -> Optional[Order]:
+        """대기 중인 주문을 pydantic Order로 돌려줍니다. (API 응답용)"""
+        order = self.order_index.get(order_id)
+        return order.to_model() if order else None
+
+    def load_orders(self, orders: Iterable[EngineOrder]) -> int:
+        """
+        [재시작 복구] 저장돼 있던 대기 주문을 매칭 없이 장부에 다시 올리고, 올린 주문 수를 돌려줍니다.
+        - 넘겨준 순서가 곧 시간 우선순위입니다. (DB id 순으로 넘겨주세요)
+        - 종목/방향별로 모아서 BookSide.load로 한 번에 적재합니다. (place_order처럼 주문마다 매칭하지 않음)
+        - 등록 안 된 종목, 가격 없는 주문은 건너뜁니다.
+        """
+        groups: Dict[Tuple[str, OrderSide], List[EngineOrder]] = {}
+        for order in orders:
+            if order.ticker not in self.order_books or order.price is None or order.quantity <= 0:
+                continue
+            if order.order_id is None:
+                order.order_id = next(self._next_order_id)
+            self.order_index[order.order_id] = order
+            groups.setdefault((order.ticker, order.side), []).append(order)
+
+        loaded = 0
+        for (ticker, side), group in groups.items():
+            loaded += self.order_books[ticker].side(side).load(group)
+        return loaded
+
+    def add_company(self, company: Company):
+        """엔진에 새 종목을 등록합니다. (이미 있으면 무시)"""
+        if company.ticker in self.companies:
+            return
+        self.companies[company.ticker] = company
+        self.order_books[company.ticker] = OrderBook(company.ticker)
+
+    def get_depth(self, ticker: str, levels: int = 5) -> Dict[str, List[Dict]]:
+        """호가창 표시용: 가격대별로 묶은 상위 호가 (가격, 총 수량, 주문 수)"""
+        return self.order_books[ticker].depth(levels)
+
+    def close(self):
+        """종료 시 정리 (체결 로그 스필 파일 닫기)"""
+        self.trade_logs.close()
+
     def get_market_status(self):
         """
         프론트엔드 대시보드용 데이터 반환
@@ -121,6 +444,38 @@ class MarketEngine:
             }
         return status
 
+    # ---------- 비동기 인터페이스 (ShardedMarketEngine과 같은 이름, 같은 프로세스라 바로 실행) ----------
+    async def place_order_async(self, order: Union[Order, EngineOrder]) -> Dict:
+        return self.place_order(order)
+
+    async def place_orders_async(self, orders: List[Union[Order, EngineOrder]]) -> Dict:
+        return self.place_orders(orders)
+
+    async def get_order_async(self, order_id: OrderKey) -> Optional[Order]:
+        return self.get_order(order_id)
+
+    async def cancel_order_async(self, order_id: OrderKey) -> bool:
+        return self.cancel_order(order_id)
+
+    async def amend_order_async(self, order_id: OrderKey, quantity: Optional[int] = None,
+                                price: Optional[float] = None) -> Dict:
+        return self.amend_order(order_id, quantity=quantity, price=price)
+
+    async def load_orders_async(self, orders: Iterable[EngineOrder]) -> int:
+        return self.load_orders(orders)
+
+    async def add_company_async(self, company: Company):
+        self.add_company(company)
+
+    async def quote_market_async(self, ticker: str, side: OrderSide, quantity: int) -> Dict:
+        return self.quote_market(ticker, side, quantity)
+
+    async def get_depth_async(self, ticker: str, levels: int = 5) -> Dict[str, List[Dict]]:
+        return self.get_depth(ticker, levels)
+
+    async def get_market_status_async(self):
+        return self.get_market_status()
+
 # ==========================================
 # 🚀 테스트 시나리오 (터미널 실행용)
 # ==========================================
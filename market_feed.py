@@ -0,0 +1,220 @@
+import json
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+# 구독자 한 명당 쌓아둘 수 있는 메시지 수 (넘치면 쌓인 변경분을 버리고 스냅샷으로 다시 맞춤)
+SUBSCRIBER_BUFFER = 8
+# 보낼 게 없어도 이 간격(초)마다 주석 줄을 보내서 프록시가 연결을 끊지 않게 함
+KEEPALIVE_SEC = 15
+
+# 대기열에 넣는 표시: 이 구독자에게는 다음에 스냅샷부터 보냄
+RESYNC = object()
+
+
+def sse_frame(message: Dict) -> bytes:
+    """메시지 -> SSE 이벤트 한 건 (공백 없는 JSON)"""
+    body = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+    return b"data: " + body.encode("utf-8") + b"\n\n"
+
+
+def _history_tail(old: List[Dict], new: List[Dict]) -> List[Dict]:
+    """
+    이전 틱 이후 바뀐 차트 점들 (이전 마지막 점과 같은 시각부터 끝까지)
+    이전 마지막 봉이 발행 뒤에 더 체결돼서 종가가 바뀐 경우도 포함됩니다. 안 바뀌었으면 빈 리스트
+    """
+    if not new:
+        return []
+    if not old:
+        return list(new)
+    last_time = old[-1]["time"]
+    for k in range(len(new) - 1, -1, -1):
+        if new[k]["time"] == last_time:
+            tail = new[k:]
+            return [] if tail == old[-1:] else list(tail)
+    return list(new)
+
+
+def _level_map(levels: List[Dict]) -> Dict[float, tuple]:
+    return {level["price"]: (level["quantity"], level["orders"]) for level in levels}
+
+
+def _level_changes(old: Dict[float, tuple], new: Dict[float, tuple]) -> List[list]:
+    """바뀐 호가 칸만 [가격, 수량, 주문 수]로 (화면에서 빠진 칸은 수량 0)"""
+    changes = [[price, qty, orders] for price, (qty, orders) in new.items() if old.get(price) != (qty, orders)]
+    changes += [[price, 0, 0] for price in old if price not in new]
+    return changes
+
+
+class TickerState:
+    """종목 하나의 마지막 상태 (변경분 계산과 스냅샷용)"""
+    __slots__ = ("seq", "payload", "levels", "snapshot")
+
+    def __init__(self):
+        self.seq = 0
+        self.payload: Optional[Dict] = None
+        self.levels: Dict[str, Dict[float, tuple]] = {"BUY": {}, "SELL": {}}
+        self.snapshot: Optional[bytes] = None   # 이번 seq의 스냅샷 프레임 (처음 필요할 때 만듦)
+
+
+class Subscriber:
+    """구독자 한 명의 전송 대기열 (크기 제한)"""
+    __slots__ = ("ticker", "queue", "resyncs")
+
+    def __init__(self, ticker: str, buffer: int = SUBSCRIBER_BUFFER):
+        self.ticker = ticker
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.resyncs = 0
+
+    def push(self, item):
+        if self.queue.full():
+            # 못 따라오는 클라이언트: 밀린 변경분을 버리고 다음에 스냅샷부터 (변경분을 하나라도 빼먹으면 화면이 틀어지므로)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.resyncs += 1
+            if item is None:
+                self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(item)
+
+
+class MarketFeed:
+    """
+    시세 스트리밍 (SSE, 순번이 붙은 변경분)
+    - 구독하면 먼저 스냅샷(type=snapshot, /api/market-data와 같은 필드 + seq)을 받고,
+      이후 틱마다 바뀐 것만 담은 변경분(type=delta)을 seq+1씩 받습니다.
+      변경분: 현재가, 바뀐 차트 점(첫 점과 같은 시각부터 갈아끼움), 바뀐 호가 칸(수량 0 = 삭제), 바뀐 뉴스/멘토
+    - 클라이언트는 seq가 이어지지 않으면 다시 구독해서 스냅샷부터 받습니다.
+      서버 쪽에서도 대기열이 넘친 구독자는 밀린 변경분을 버리고 스냅샷으로 다시 맞춥니다.
+    - 변경분 프레임은 틱당 종목당 한 번만 만들고 구독자 전원에게 같은 바이트를 보냅니다. (접속자 수와 무관)
+    """
+
+    def __init__(self, buffer: int = SUBSCRIBER_BUFFER):
+        self.buffer = buffer
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._tickers: Dict[str, TickerState] = {}
+        self.published = 0
+        self.delivered = 0
+        self.delta_frames = 0
+        self.delta_bytes = 0
+        self.snapshots_sent = 0
+        self.snapshot_bytes = 0
+        self.resyncs = 0
+
+    # ---------- 발행 (틱 루프) ----------
+    def publish(self, ticker: str, payload: Dict):
+        """종목 상태를 받아 이전 틱과의 변경분을 구독자 전원에게 보냅니다. (틱 루프에서 종목마다 1번)"""
+        state = self._tickers.setdefault(ticker, TickerState())
+        levels = {"BUY": _level_map(payload["buy_orders"]), "SELL": _level_map(payload["sell_orders"])}
+        history = payload["history"]
+
+        delta = {"type": "delta", "seq": state.seq + 1, "price": payload["price"]}
+        if state.payload is not None:
+            tail = _history_tail(state.payload["history"], history)
+            if tail:
+                delta["history"] = tail
+            for side in ("BUY", "SELL"):
+                changes = _level_changes(state.levels[side], levels[side])
+                if changes:
+                    delta[side] = changes
+            for key in ("news", "mentors"):
+                if payload[key] != state.payload[key]:
+                    delta[key] = payload[key]
+
+        state.seq += 1
+        # 틱 루프가 같은 리스트를 계속 고치므로 스냅샷용으로 떠둠
+        state.payload = {**payload, "history": list(history), "mentors": list(payload["mentors"])}
+        state.levels = levels
+        state.snapshot = None
+        self.published += 1
+
+        subscribers = self._subscribers.get(ticker)
+        if not subscribers:
+            return
+        frame = sse_frame(delta)
+        self.delta_frames += 1
+        self.delta_bytes += len(frame)
+        for subscriber in subscribers:
+            subscriber.push((state.seq, frame))
+            self.delivered += 1
+
+    def snapshot(self, ticker: str) -> Optional[tuple]:
+        """(seq, 스냅샷 프레임) - 아직 발행 전인 종목이면 None"""
+        state = self._tickers.get(ticker)
+        if state is None or state.payload is None:
+            return None
+        if state.snapshot is None:
+            state.snapshot = sse_frame({"type": "snapshot", "seq": state.seq, **state.payload})
+        return state.seq, state.snapshot
+
+    # ---------- 구독 ----------
+    def subscribe(self, ticker: str) -> Subscriber:
+        subscriber = Subscriber(ticker, self.buffer)
+        self._subscribers.setdefault(ticker, set()).add(subscriber)
+        subscriber.push(RESYNC)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.ticker)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.ticker]
+        self.resyncs += subscriber.resyncs
+
+    def close(self):
+        """구독자 전원의 스트림을 끝냄 (서버 종료 시)"""
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                subscriber.push(None)
+
+    async def stream(self, ticker: str) -> AsyncIterator[bytes]:
+        """StreamingResponse에 넘길 SSE 바이트 스트림 (연결이 끊기면 구독 해제)"""
+        subscriber = self.subscribe(ticker)
+        sent_seq = None
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if item is None:
+                    return
+                if item is RESYNC:
+                    snapshot = self.snapshot(ticker)
+                    if snapshot is None:
+                        continue     # 첫 틱 전: 첫 변경분을 받으면 그때 스냅샷부터
+                    sent_seq, frame = snapshot
+                    self.snapshots_sent += 1
+                    self.snapshot_bytes += len(frame)
+                    yield frame
+                    continue
+                seq, frame = item
+                if sent_seq is None:
+                    # 스냅샷 없이 변경분부터 받을 수는 없으므로 지금 상태의 스냅샷으로 대신함
+                    snapshot = self.snapshot(ticker)
+                    sent_seq, frame = snapshot
+                    self.snapshots_sent += 1
+                    self.snapshot_bytes += len(frame)
+                    yield frame
+                    continue
+                if seq <= sent_seq:
+                    continue         # 이미 스냅샷에 들어간 변경분
+                sent_seq = seq
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": {ticker: len(subs) for ticker, subs in self._subscribers.items()},
+            "seq": {ticker: state.seq for ticker, state in self._tickers.items()},
+            "published": self.published,
+            "delivered": self.delivered,
+            "avg_delta_bytes": round(self.delta_bytes / self.delta_frames, 1) if self.delta_frames else 0.0,
+            "snapshots_sent": self.snapshots_sent,
+            "avg_snapshot_bytes": round(self.snapshot_bytes / self.snapshots_sent, 1) if self.snapshots_sent else 0.0,
+            # 대기열이 넘쳐서 스냅샷으로 다시 맞춘 횟수 (접속 중인 구독자 포함)
+            "resyncs": self.resyncs + sum(s.resyncs for subs in self._subscribers.values() for s in subs),
+        }
@@ -0,0 +1,382 @@
+# migrations.py
+"""
+DB 스키마 버전 관리
+- 스키마 변경은 여기 MIGRATIONS에 버전 순서대로 추가합니다. (scripts/*.py에서 직접 ALTER 하지 않기)
+- 적용된 버전은 schema_migrations 테이블에 남고, migrate()는 아직 안 된 버전만 한 트랜잭션씩 적용합니다.
+- HOT_QUERIES는 서버가 자주 날리는 쿼리들로, check_query_plans()가 풀 스캔으로 떨어지는지 검사합니다.
+"""
+import re
+from typing import Awaitable, Callable, List, Set, Tuple
+import aiosqlite
+
+
+# ---------- 도우미 ----------
+async def _columns(db: aiosqlite.Connection, table: str) -> Set[str]:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return {row[1] for row in await cursor.fetchall()}
+
+
+async def _add_column(db: aiosqlite.Connection, table: str, column: str, decl: str):
+    """컬럼이 없을 때만 추가 (예전 스크립트로 이미 추가된 DB도 있음)"""
+    if column not in await _columns(db, table):
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# ---------- 버전별 마이그레이션 ----------
+async def _v1_base_tables(db: aiosqlite.Connection):
+    """기존 init_db가 만들던 기본 테이블"""
+    # 1. 유저 테이블 (Users)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        password TEXT,
+        balance INTEGER DEFAULT 1000000,
+        level INTEGER DEFAULT 1
+    )
+    """)
+
+    # 2. 보유 주식 테이블 (Holdings)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS holdings (
+        user_id INTEGER,
+        company_name TEXT,
+        quantity INTEGER,
+        average_price REAL,
+        PRIMARY KEY (user_id, company_name)
+    )
+    """)
+
+    # 3. 거래 내역 테이블 (Transactions)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        transaction_type TEXT,
+        amount INTEGER,
+        balance_after INTEGER,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # 4. 주식 종목 테이블 (Stocks)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS stocks (
+        symbol TEXT PRIMARY KEY,
+        company_name TEXT,
+        current_price INTEGER,
+        description TEXT
+    )
+    """)
+
+    # 5. 뉴스 테이블 (News)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS news (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        content TEXT,
+        impact_level INTEGER, 
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # 6. 퀘스트 목록 (Quests)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS quests (
+        quest_id TEXT PRIMARY KEY,
+        title TEXT,
+        description TEXT,
+        reward_exp INTEGER
+    )
+    """)
+
+    # 7. 유저 퀘스트 완료 기록 (UserQuests)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS user_quests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        quest_name TEXT,
+        status TEXT DEFAULT 'COMPLETED',
+        reward_amount INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # 8. 주문 내역 테이블 (Orders)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        company_name TEXT,
+        order_type TEXT,      -- BUY / SELL
+        price INTEGER,        -- 희망 가격
+        quantity INTEGER,     -- 수량
+        status TEXT DEFAULT 'PENDING', -- PENDING / FILLED / CANCELLED
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+async def _v2_gamification(db: aiosqlite.Connection):
+    """
+    게이미피케이션 컬럼 (scripts/init_gamification.py, scripts/fix_quest.py에서 가져옴)
+    user_quests는 정산 루프(quest_name)와 services/gamification.py(quest_id)가 쓰는 컬럼이 달라서 둘 다 둡니다.
+    """
+    await _add_column(db, "users", "exp", "INTEGER DEFAULT 0")
+    await _add_column(db, "quests", "target_value", "INTEGER")
+    await _add_column(db, "user_quests", "quest_id", "TEXT")
+    await _add_column(db, "user_quests", "is_completed", "BOOLEAN DEFAULT 0")
+    await _add_column(db, "user_quests", "completed_at", "TIMESTAMP")
+    # INSERT OR REPLACE (user_id, quest_id)가 덮어쓰기 되려면 유니크 인덱스가 필요
+    await db.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_user_quests_quest_id
+        ON user_quests (user_id, quest_id) WHERE quest_id IS NOT NULL
+    """)
+    await db.executemany("""
+        INSERT OR IGNORE INTO quests (quest_id, title, description, target_value, reward_exp)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        ("news_read_1", "정보 수집가", "뉴스 1개 읽기", 1, 10),
+        ("trade_first", "첫 투자", "주식 1주 매수하기", 1, 50),
+        ("trade_sell_first", "첫 수익 실현", "처음으로 주식을 판매해보세요.", 1, 50),
+        ("level_5", "개미 탈출", "레벨 5 달성하기", 5, 100),
+    ])
+
+
+async def _v3_ranking_snapshot(db: aiosqlite.Connection):
+    """랭킹 스냅샷 테이블 (scripts/init_rank_table.py에서 가져옴)"""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS ranking_snapshot (
+        rank INTEGER,
+        user_id INTEGER,
+        username TEXT,
+        total_asset REAL,
+        profit_rate REAL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+async def _v4_hot_query_indexes(db: aiosqlite.Connection):
+    """자주 날리는 쿼리용 인덱스 (HOT_QUERIES 참고)"""
+    # 상태별 주문 조회 (재시작 시 PENDING 전체 로딩 등)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)")
+    # 내 주문 내역: user_id + status, created_at 역순 정렬까지 인덱스로
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_status ON orders (user_id, status, created_at)")
+    # 가격 조건 체결(process_orders): 대기 주문만 담는 부분 인덱스, 조회 컬럼까지 포함(커버링)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_pending_book
+        ON orders (company_name, order_type, price, user_id, quantity) WHERE status = 'PENDING'
+    """)
+    # 첫 체결 퀘스트 확인 / 퀘스트 개수
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_user_quests_user_quest ON user_quests (user_id, quest_name)")
+    # 틱마다 종목명으로 가격 갱신
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_stocks_company ON stocks (company_name)")
+    # 유저별 거래 내역
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id, id)")
+
+
+async def _v5_partial_fills(db: aiosqlite.Connection):
+    """부분 체결 기록: 지금까지 체결된 수량과 체결가 가중평균"""
+    await _add_column(db, "orders", "filled_quantity", "INTEGER DEFAULT 0")
+    await _add_column(db, "orders", "avg_fill_price", "REAL")
+
+
+async def _v6_journal_state(db: aiosqlite.Connection):
+    """주문 저널을 DB에 어디까지 반영했는지 (재시작 시 이 seq 다음부터 다시 반영)"""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS journal_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_seq INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+async def _v7_ledger(db: aiosqlite.Connection):
+    """거래 원장 체크포인트 + 보관 세그먼트 목록 (ledger.py)"""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+        user_id INTEGER,
+        last_txn_id INTEGER,       -- 이 거래까지 포함
+        ledger_balance REAL,       -- 거래 금액 누계
+        txn_count INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, last_txn_id)
+    )
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_segments (
+        path TEXT PRIMARY KEY,     -- LEDGER_ARCHIVE_DIR 기준 파일 이름
+        first_txn_id INTEGER,
+        last_txn_id INTEGER,
+        row_count INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # 보관 대상(오래된 거래) 찾기
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_transactions_created ON transactions (created_at)")
+
+
+async def _v8_ledger_segment_users(db: aiosqlite.Connection):
+    """보관 세그먼트별 유저 색인 (내역 조회 때 그 유저가 들어있는 세그먼트만 엶)"""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_segment_users (
+        user_id INTEGER,
+        first_txn_id INTEGER,      -- 이 세그먼트 안에서 이 유저의 첫/마지막 거래
+        last_txn_id INTEGER,
+        path TEXT,
+        row_count INTEGER,
+        PRIMARY KEY (user_id, first_txn_id)
+    )
+    """)
+    # 색인을 만들기 전에 보관된 세그먼트 (ledger.index_segments가 채우고 1로 바꿈)
+    await _add_column(db, "ledger_segments", "users_indexed", "INTEGER DEFAULT 0")
+
+
+async def _v9_move_current_balance(db: aiosqlite.Connection):
+    """
+    옛 스키마(scripts/init_db_manual.py)의 users.current_balance -> balance 이사 (scripts/migrate_balance.py가 하던 일)
+    - current_balance 컬럼이 없으면 할 일 없음
+    - balance 컬럼이 없으면 만들고 전원 옮김
+    - 둘 다 있으면 이미 balance로 거래해 온 DB일 수 있으므로, 새 지갑을 쓴 흔적(주문/거래 내역)이 없고
+      balance가 기본값 그대로인 유저만 옮김 (이미 쓰고 있는 잔액을 옛 값으로 덮어쓰지 않게)
+    """
+    columns = await _columns(db, "users")
+    if "current_balance" not in columns:
+        return
+    if "balance" not in columns:
+        await db.execute("ALTER TABLE users ADD COLUMN balance INTEGER DEFAULT 1000000")
+        await db.execute("UPDATE users SET balance = current_balance WHERE current_balance IS NOT NULL")
+        return
+    await db.execute("""
+        UPDATE users SET balance = current_balance
+        WHERE current_balance IS NOT NULL AND (balance IS NULL OR balance = 1000000)
+          AND NOT EXISTS (SELECT 1 FROM orders o WHERE o.user_id = users.id)
+          AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.user_id = users.id)
+    """)
+
+
+Migration = Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+MIGRATIONS: List[Migration] = [
+    (1, "기본 테이블", _v1_base_tables),
+    (2, "게이미피케이션 컬럼 + 퀘스트 목록", _v2_gamification),
+    (3, "랭킹 스냅샷 테이블", _v3_ranking_snapshot),
+    (4, "핫 쿼리 인덱스", _v4_hot_query_indexes),
+    (5, "부분 체결 컬럼", _v5_partial_fills),
+    (6, "주문 저널 반영 위치", _v6_journal_state),
+    (7, "거래 원장 체크포인트/보관", _v7_ledger),
+    (8, "거래 원장 세그먼트 유저 색인", _v8_ledger_segment_users),
+    (9, "current_balance -> balance 이사", _v9_move_current_balance),
+]
+
+
+# ---------- 실행기 ----------
+async def current_version(db: aiosqlite.Connection) -> int:
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    async with db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations") as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def migrate(db: aiosqlite.Connection) -> int:
+    """아직 적용 안 된 마이그레이션을 버전 순서대로 적용하고, 최종 버전을 돌려줍니다."""
+    version = await current_version(db)
+    await db.commit()
+    for target, name, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        # 버전 하나 = 트랜잭션 하나 (SQLite는 DDL도 롤백됨)
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            await apply(db)
+            await db.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (target, name))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        print(f"📐 [마이그레이션] v{target} {name} 적용 완료")
+        version = target
+    return version
+
+
+# ---------- 쿼리 플랜 검사 ----------
+# (이름, SQL, 더미 파라미터) - 서버 코드의 쿼리와 같은 모양으로 유지해 주세요.
+HOT_QUERIES: List[Tuple[str, str, tuple]] = [
+    ("정산: 체결된 주문 조회",
+     "SELECT id, user_id, company_name, order_type, quantity, price, filled_quantity, avg_fill_price FROM orders "
+     "WHERE status IN ('PENDING', 'CANCELLED') AND id IN (?, ?)",
+     (1, 2)),
+    ("재시작: 대기 주문 전체",
+     "SELECT id, user_id, company_name, order_type, price, quantity, filled_quantity FROM orders "
+     "WHERE status = 'PENDING' ORDER BY id",
+     ()),
+    ("내 주문 내역",
+     "SELECT id, company_name, order_type, price, quantity, filled_quantity, avg_fill_price, created_at, status "
+     "FROM orders WHERE user_id = ? AND status = 'PENDING' ORDER BY created_at DESC",
+     (1,)),
+    ("가격 조건 체결 (매수)",
+     "SELECT id, user_id, quantity, price FROM orders "
+     "WHERE company_name = ? AND order_type = 'BUY' AND status = 'PENDING' AND price >= ?",
+     ("삼성전자", 70000)),
+    ("가격 조건 체결 (매도)",
+     "SELECT id, user_id, quantity, price FROM orders "
+     "WHERE company_name = ? AND order_type = 'SELL' AND status = 'PENDING' AND price <= ?",
+     ("삼성전자", 70000)),
+    ("정산: 첫 체결 퀘스트",
+     "SELECT DISTINCT user_id, quest_name FROM user_quests WHERE quest_name IN (?, ?) AND user_id IN (?, ?)",
+     ("첫 매수 성공", "첫 매도 성공", 1, 2)),
+    ("퀘스트 완료 여부",
+     "SELECT is_completed FROM user_quests WHERE user_id = ? AND quest_id = ?",
+     (1, "trade_first")),
+    ("퀘스트 개수",
+     "SELECT count(*) FROM user_quests WHERE user_id = ?",
+     (1,)),
+    ("보유 주식",
+     "SELECT company_name, quantity, average_price FROM holdings WHERE user_id = ? AND quantity > 0",
+     (1,)),
+    ("내 거래 내역",
+     "SELECT id, transaction_type, amount, balance_after, description, created_at FROM transactions "
+     "WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+     (1, 100, 50)),
+    ("원장: 가장 가까운 체크포인트",
+     "SELECT last_txn_id, ledger_balance FROM ledger_checkpoints "
+     "WHERE user_id = ? AND last_txn_id >= ? ORDER BY last_txn_id LIMIT 1",
+     (1, 100)),
+    ("원장: 유저가 들어있는 보관 세그먼트",
+     "SELECT path, first_txn_id FROM ledger_segment_users "
+     "WHERE user_id = ? AND first_txn_id < ? ORDER BY first_txn_id DESC",
+     (1, 100)),
+    ("틱 가격 갱신",
+     "UPDATE stocks SET current_price = ? WHERE company_name = ?",
+     (70000, "삼성전자")),
+]
+
+# "SCAN orders" / "SCAN orders USING INDEX ..." = 테이블(또는 인덱스) 전체를 훑음
+_FULL_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+async def check_query_plans(db: aiosqlite.Connection) -> List[str]:
+    """
+    HOT_QUERIES의 실행 계획을 확인해서, 풀 스캔으로 떨어진 쿼리를 "이름: 계획" 목록으로 돌려줍니다.
+    빈 목록이면 통과입니다.
+    """
+    async with db.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as cursor:
+        tables = {row[0] for row in await cursor.fetchall()}
+
+    problems = []
+    for name, sql, params in HOT_QUERIES:
+        async with db.execute("EXPLAIN QUERY PLAN " + sql, params) as cursor:
+            plan = [row[3] for row in await cursor.fetchall()]
+        for detail in plan:
+            match = _FULL_SCAN.match(detail)
+            if match and match.group(1) in tables:
+                problems.append(f"{name}: {detail}")
+    return problems
@@ -0,0 +1,268 @@
+import time
+import heapq
+import itertools
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Union
+from domain_models import Order, OrderSide, OrderType
+
+# 시장가 주문은 가격이 없으므로, 항상 맨 앞에 서도록 정렬용 가격을 따로 줍니다.
+# (기존 엔진의 sort key와 동일: 매수 = inf, 매도 = 0.0)
+MARKET_BUY_KEY = float('inf')
+MARKET_SELL_KEY = 0.0
+
+# monotonic 시각 <-> 실제 시각 변환용 차이값 (프로세스 시작 시 한 번 계산)
+_WALL_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+class EngineOrder:
+    """
+    엔진 내부용 가벼운 주문 객체 (매칭 핫패스 전용)
+    pydantic Order는 uuid 생성 + datetime + 검증 비용이 커서 API 경계에서만 쓰고,
+    엔진 안에서는 이 객체로 바꿔서 다룹니다.
+    - order_id: 외부에서 준 ID(문자열) 또는 엔진이 매기는 정수 ID
+    - ts_ns: time.monotonic_ns() 접수 시각
+    """
+    __slots__ = ("order_id", "agent_id", "ticker", "side", "order_type",
+                 "quantity", "price", "ts_ns", "status")
+
+    def __init__(self, agent_id: str, ticker: str, side: OrderSide, quantity: int,
+                 price: Optional[float] = None, order_type: OrderType = OrderType.LIMIT,
+                 order_id: Union[str, int, None] = None, ts_ns: Optional[int] = None):
+        self.order_id = order_id
+        self.agent_id = agent_id
+        self.ticker = ticker
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.price = price
+        self.ts_ns = time.monotonic_ns() if ts_ns is None else ts_ns
+        self.status = "PENDING"
+
+    @classmethod
+    def from_model(cls, order: Order) -> "EngineOrder":
+        """pydantic Order -> EngineOrder"""
+        ts_ns = int(order.timestamp.timestamp() * 1e9) - _WALL_OFFSET_NS
+        engine_order = cls(order.agent_id, order.ticker, order.side, order.quantity,
+                           order.price, order.order_type, order.order_id, ts_ns)
+        engine_order.status = order.status
+        return engine_order
+
+    def to_model(self) -> Order:
+        """EngineOrder -> pydantic Order (API 응답용)"""
+        return Order(
+            order_id=str(self.order_id), agent_id=self.agent_id, ticker=self.ticker,
+            side=self.side, order_type=self.order_type, quantity=self.quantity, price=self.price,
+            timestamp=datetime.fromtimestamp((self.ts_ns + _WALL_OFFSET_NS) / 1e9),
+            status=self.status,
+        )
+
+    def copy(self, **changes) -> "EngineOrder":
+        order = EngineOrder(self.agent_id, self.ticker, self.side, self.quantity,
+                            self.price, self.order_type, self.order_id, self.ts_ns)
+        for name, value in changes.items():
+            setattr(order, name, value)
+        return order
+
+
+class PriceLevel:
+    """
+    같은 가격에 걸린 주문 묶음 (호가 한 칸)
+    - orders: 먼저 들어온 주문이 앞에 있는 FIFO 큐 (Time Priority)
+    - total_qty: 이 가격에 남아있는 총 수량
+    - count: 살아있는 주문 수 (취소된 주문은 큐에 남아있어도 세지 않음)
+    """
+    __slots__ = ("price", "orders", "total_qty", "count")
+
+    def __init__(self, price: float):
+        self.price = price
+        self.orders: Deque[EngineOrder] = deque()
+        self.total_qty = 0
+        self.count = 0
+
+    def front(self) -> EngineOrder:
+        """맨 앞의 살아있는 주문 (취소되어 남아있던 주문은 여기서 치웁니다)"""
+        orders = self.orders
+        while orders[0].status == "CANCELLED":
+            orders.popleft()
+        return orders[0]
+
+    def __len__(self):
+        return self.count
+
+
+class BookSide:
+    """
+    오더북의 한쪽 (매수 또는 매도)
+    - levels: {가격: PriceLevel}
+    - _heap: 가격 힙 (매수는 -가격으로 넣어서 최고가가 맨 위에 오게 함)
+    힙에 있는 가격과 levels의 키는 항상 1:1로 유지됩니다.
+    """
+
+    def __init__(self, side: OrderSide):
+        self.side = side
+        self.levels: Dict[float, PriceLevel] = {}
+        self._heap: List[float] = []
+        self.order_count = 0
+
+    def _key(self, order: EngineOrder) -> float:
+        if order.price is not None:
+            return order.price
+        return MARKET_BUY_KEY if self.side == OrderSide.BUY else MARKET_SELL_KEY
+
+    def add(self, order: EngineOrder) -> PriceLevel:
+        """주문을 해당 가격 칸의 맨 뒤에 넣습니다. (새 가격이면 O(log n), 기존 가격이면 O(1))"""
+        price = self._key(order)
+        level = self.levels.get(price)
+        if level is None:
+            level = PriceLevel(price)
+            self.levels[price] = level
+            heapq.heappush(self._heap, -price if self.side == OrderSide.BUY else price)
+        level.orders.append(order)
+        level.total_qty += order.quantity
+        level.count += 1
+        self.order_count += 1
+        return level
+
+    def load(self, orders: Iterable[EngineOrder]) -> int:
+        """
+        재시작 복구용 대량 적재 (매칭 없음)
+        넘겨준 순서대로 칸의 맨 뒤에 넣고, 새 가격은 힙 리스트에 모아뒀다가 마지막에 heapify 한 번으로 정리합니다.
+        (주문마다 heappush하는 O(n log n) 대신 O(n))
+        """
+        levels, heap = self.levels, self._heap
+        is_buy = self.side == OrderSide.BUY
+        count = 0
+        for order in orders:
+            price = self._key(order)
+            level = levels.get(price)
+            if level is None:
+                level = PriceLevel(price)
+                levels[price] = level
+                heap.append(-price if is_buy else price)
+            level.orders.append(order)
+            level.total_qty += order.quantity
+            level.count += 1
+            count += 1
+        heapq.heapify(heap)
+        self.order_count += count
+        return count
+
+    def level_of(self, order: EngineOrder) -> PriceLevel:
+        return self.levels[self._key(order)]
+
+    def best_level(self) -> Optional[PriceLevel]:
+        """최우선 호가 칸 (비어버린 칸은 여기서 정리합니다)"""
+        heap = self._heap
+        while heap:
+            price = -heap[0] if self.side == OrderSide.BUY else heap[0]
+            level = self.levels[price]
+            if level.count:
+                return level
+            heapq.heappop(heap)
+            del self.levels[price]
+        return None
+
+    def best_price(self) -> Optional[float]:
+        level = self.best_level()
+        return level.price if level else None
+
+    def pop_front(self, level: PriceLevel) -> EngineOrder:
+        """호가 칸의 맨 앞 주문을 대기열에서 뺍니다."""
+        order = level.front()
+        level.orders.popleft()
+        level.total_qty -= order.quantity
+        level.count -= 1
+        self.order_count -= 1
+        return order
+
+    def remove(self, order: EngineOrder):
+        """
+        주문을 대기열에서 뺍니다. (O(1))
+        큐 중간에서 직접 지우지 않고 CANCELLED로 표시만 해두면,
+        맨 앞에 왔을 때 front()가 치워줍니다.
+        """
+        level = self.level_of(order)
+        order.status = "CANCELLED"
+        level.total_qty -= order.quantity
+        level.count -= 1
+        self.order_count -= 1
+
+    def reduce(self, order: EngineOrder, new_qty: int):
+        """대기 순번을 유지한 채 수량만 줄입니다. (O(1))"""
+        level = self.level_of(order)
+        level.total_qty -= order.quantity - new_qty
+        order.quantity = new_qty
+
+    def depth(self, n: int) -> List[Dict]:
+        """
+        상위 n개 호가 칸의 집계 (가격, 총 수량, 주문 수)
+        칸별 합계는 주문이 들어오고 나갈 때마다 갱신되어 있으므로 여기서는 고르기만 합니다.
+        """
+        return [{"price": level.price, "quantity": level.total_qty, "orders": level.count}
+                for level in itertools.islice(self.iter_levels(), n)]
+
+    def iter_levels(self) -> Iterator[PriceLevel]:
+        """
+        우선순위 순서대로 호가 칸을 돌려줍니다. (조회용, 도는 동안 장부를 바꾸면 안 됨)
+        힙을 정렬하거나 복사하지 않고 트리를 따라 필요한 만큼만 꺼내므로, k칸에 O(k log k)입니다.
+        """
+        heap = self._heap
+        if not heap:
+            return
+        is_buy = self.side == OrderSide.BUY
+        frontier = [(heap[0], 0)]
+        while frontier:
+            key, i = heapq.heappop(frontier)
+            level = self.levels[-key if is_buy else key]
+            if level.count:
+                yield level
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def iter_orders(self, limit: Optional[int] = None) -> Iterator[EngineOrder]:
+        """가격-시간 우선순위 순서대로 주문을 돌려줍니다."""
+        count = 0
+        for level in self.iter_levels():
+            for order in level.orders:
+                if order.status == "CANCELLED":
+                    continue
+                if limit is not None and count >= limit:
+                    return
+                yield order
+                count += 1
+
+    def __len__(self):
+        return self.order_count
+
+    def __iter__(self):
+        return self.iter_orders()
+
+    def __bool__(self):
+        return self.order_count > 0
+
+
+class OrderBook:
+    """
+    종목 하나의 주문 장부
+    기존 { "BUY": [...], "SELL": [...] } 구조처럼 book["BUY"], book["SELL"]로 접근할 수 있습니다.
+    """
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.bids = BookSide(OrderSide.BUY)
+        self.asks = BookSide(OrderSide.SELL)
+
+    def side(self, side: OrderSide) -> BookSide:
+        return self.bids if side == OrderSide.BUY else self.asks
+
+    def __getitem__(self, side: str) -> BookSide:
+        return self.side(OrderSide(side))
+
+    def add(self, order: EngineOrder) -> PriceLevel:
+        return self.side(order.side).add(order)
+
+    def depth(self, n: int = 5) -> Dict[str, List[Dict]]:
+        """호가창(L2) 스냅샷: 매수/매도 각각 상위 n개 가격 칸"""
+        return {"BUY": self.bids.depth(n), "SELL": self.asks.depth(n)}
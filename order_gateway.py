@@ -0,0 +1,186 @@
+import time
+import asyncio
+import inspect
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Union
+from domain_models import Order, OrderType
+from order_book import EngineOrder
+
+
+class GatewayFull(Exception):
+    """주문 대기열이 꽉 참 (HTTP 429)"""
+
+
+class GatewayClosed(Exception):
+    """게이트웨이가 아직 안 떴거나 멈춤 (HTTP 503)"""
+
+
+class OrderGateway:
+    """
+    HTTP 요청과 엔진 사이의 주문 창구 (엔진에 쓰는 코루틴은 하나뿐)
+    - 요청은 대기열(크기 capacity)에 작업을 넣고 future로 처리 결과(ack)를 기다립니다.
+    - 엔진 작업 태스크 하나가 대기열을 순서대로 비우면서 엔진을 호출합니다.
+      연달아 들어온 지정가 주문은 engine.place_orders_async 한 번으로 묶어서 넣습니다.
+    - 엔진 호출은 *_async 메서드를 await하므로, 샤드 엔진이 매칭하는 동안에도 이벤트 루프는 멈추지 않습니다.
+      (작업 태스크는 하나라서 엔진 쪽 순서는 그대로 지켜짐)
+    - 한 번에 max_batch건까지만 처리하고 이벤트 루프에 양보하므로, 주문이 몰려도 다른 요청이 멈추지 않습니다.
+    - 대기열이 꽉 차면 기다리지 않고 바로 GatewayFull을 던집니다. (라우터가 429로 바꿔서 응답)
+    """
+
+    def __init__(self, engine, capacity: int = 1000, max_batch: int = 64):
+        self.engine = engine
+        self.capacity = capacity
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=capacity)
+        self._task: Optional[asyncio.Task] = None
+
+        # 통계 (ack 지연은 최근 1000건으로 백분위 계산)
+        self.submitted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.batches = 0
+        self._ack_ms = deque(maxlen=1000)
+        self._max_ack_ms = 0.0
+
+    # ---------- 시작/종료 ----------
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """대기열에 남은 작업은 GatewayClosed로 돌려보내고 멈춥니다."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(GatewayClosed("주문 창구가 종료되었습니다."))
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    # ---------- 제출 ----------
+    def _submit(self, kind: str, payload) -> asyncio.Future:
+        if not self.running:
+            raise GatewayClosed("주문 창구가 열려있지 않습니다.")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((kind, payload, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise GatewayFull(f"주문 대기열이 꽉 찼습니다. ({self.capacity}건)")
+        self.submitted += 1
+        return future
+
+    async def place_order(self, order: Union[Order, EngineOrder]) -> Dict:
+        """엔진 place_order와 같은 결과를 돌려줍니다."""
+        return await self._submit("place", order)
+
+    async def call(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        fn(*args)를 엔진 작업 태스크에서 실행하고 결과를 돌려줍니다. (fn이 코루틴 함수면 끝날 때까지 await)
+        다른 주문이 끼어들면 안 되는 여러 단계(조회 -> 취소, 호가 계산 -> 시장가 체결 등)를 한 함수로 묶어서 넘깁니다.
+        fn이 던진 예외는 그대로 호출한 쪽으로 전달됩니다.
+        """
+        return await self._submit("call", (fn, args))
+
+    # ---------- 엔진 작업 태스크 ----------
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._process(batch)
+            except asyncio.CancelledError:
+                # 처리하던 묶음에서 아직 답을 못 받은 요청도 돌려보냄
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(GatewayClosed("주문 창구가 종료되었습니다."))
+                raise
+            self.batches += 1
+            # 한 묶음 처리 후 다른 코루틴(요청, 틱 루프)에 차례를 넘김
+            await asyncio.sleep(0)
+
+    async def _process(self, batch: List[tuple]):
+        limits: List[tuple] = []
+        for item in batch:
+            kind, payload, _, _ = item
+            if kind == "place" and payload.order_type == OrderType.LIMIT:
+                limits.append(item)
+                continue
+            # 앞에 모인 지정가 주문부터 넣어서 들어온 순서를 지킴
+            await self._place_limits(limits)
+            limits = []
+            if kind == "place":
+                await self._run_one(item, self.engine.place_order_async, payload)
+            else:
+                fn, args = payload
+                await self._run_one(item, fn, *args)
+        await self._place_limits(limits)
+
+    async def _place_limits(self, items: List[tuple]):
+        if not items:
+            return
+        if len(items) == 1:
+            await self._run_one(items[0], self.engine.place_order_async, items[0][1])
+            return
+        try:
+            results = (await self.engine.place_orders_async([payload for _, payload, _, _ in items]))["results"]
+        except Exception as e:
+            for item in items:
+                self._ack(item, error=e)
+            return
+        for item, result in zip(items, results):
+            self._ack(item, result)
+
+    async def _run_one(self, item: tuple, fn: Callable[..., Any], *args):
+        try:
+            result = fn(*args)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            self._ack(item, error=e)
+        else:
+            self._ack(item, result)
+
+    def _ack(self, item: tuple, result: Any = None, error: Optional[BaseException] = None):
+        _, _, future, enqueued = item
+        ack_ms = (time.perf_counter() - enqueued) * 1000
+        self._ack_ms.append(ack_ms)
+        if ack_ms > self._max_ack_ms:
+            self._max_ack_ms = ack_ms
+        self.processed += 1
+        # 기다리던 요청이 이미 끊겼으면 결과는 버림
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> Dict:
+        acks = sorted(self._ack_ms)
+        def pct(q):
+            return round(acks[min(len(acks) - 1, int(q * len(acks)))], 3) if acks else 0.0
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "capacity": self.capacity,
+            "submitted": self.submitted,
+            "rejected": self.rejected,     # 대기열이 꽉 차서 돌려보낸 횟수
+            "processed": self.processed,
+            "avg_batch": round(self.processed / self.batches, 2) if self.batches else 0.0,
+            "ack_ms": {"p50": pct(0.50), "p99": pct(0.99), "max": round(self._max_ack_ms, 3)},
+        }
@@ -0,0 +1,336 @@
+import os
+import time
+import zlib
+import struct
+import asyncio
+import itertools
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# 레코드 = 프레임(본문 길이, crc32) + 본문(헤더 + 내용)
+FRAME = struct.Struct("<II")
+HEADER = struct.Struct("<QqB")              # seq, 기록 시각(ns), 종류
+ORDER_BODY = struct.Struct("<qqBBdq")       # 주문ID, 유저ID, 방향, 주문유형, 가격, 수량 (+ 종목명 utf-8)
+FILL_BODY = struct.Struct("<qdqq")          # 주문ID, 체결가, 체결 수량, 남은 수량
+CANCEL_BODY = struct.Struct("<qq")          # 주문ID, 취소된 잔량
+MARK_BODY = struct.Struct("<q")             # 그때까지 매긴 가장 큰 주문ID
+
+# 레코드 종류
+ORDER = 1
+FILL = 2
+CANCEL = 3
+MARK = 4        # 앞부분을 잘라낸 저널의 첫 레코드 (seq = 잘라낸 마지막 seq, seq/주문ID를 이어받기 위한 표시)
+
+READ_CHUNK = 1 << 20        # 저널을 읽을 때 한 번에 읽는 크기
+MAX_RECORD = 1 << 16        # 이보다 긴 레코드 길이는 깨진 프레임으로 봄
+
+SIDES = ("BUY", "SELL")
+ORDER_TYPES = ("LIMIT", "MARKET")
+
+
+class JournalRecord(NamedTuple):
+    """
+    저널 레코드 한 건 (종류에 따라 안 쓰는 필드는 None)
+    FILL 레코드는 FillEvent와 같은 이름(order_id, price, quantity, remaining)을 가지므로 정산 함수에 그대로 넘길 수 있습니다.
+    """
+    seq: int
+    ts_ns: int
+    kind: int
+    order_id: int
+    user_id: Optional[int] = None
+    ticker: Optional[str] = None
+    side: Optional[str] = None
+    order_type: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    remaining: Optional[int] = None
+
+
+def _decode(body: bytes) -> JournalRecord:
+    seq, ts_ns, kind = HEADER.unpack_from(body)
+    rest = body[HEADER.size:]
+    if kind == ORDER:
+        order_id, user_id, side, order_type, price, quantity = ORDER_BODY.unpack_from(rest)
+        ticker = rest[ORDER_BODY.size:].decode("utf-8")
+        return JournalRecord(seq, ts_ns, kind, order_id, user_id, ticker, SIDES[side], ORDER_TYPES[order_type],
+                             price, quantity, quantity)
+    if kind == FILL:
+        order_id, price, quantity, remaining = FILL_BODY.unpack_from(rest)
+        return JournalRecord(seq, ts_ns, kind, order_id, price=price, quantity=quantity, remaining=remaining)
+    if kind == CANCEL:
+        order_id, remaining = CANCEL_BODY.unpack_from(rest)
+        return JournalRecord(seq, ts_ns, kind, order_id, remaining=remaining)
+    if kind == MARK:
+        (max_order_id,) = MARK_BODY.unpack_from(rest)
+        return JournalRecord(seq, ts_ns, kind, max_order_id)
+    raise ValueError(f"알 수 없는 저널 레코드 종류: {kind}")
+
+
+def _scan(path: str) -> Tuple[int, int, int]:
+    """저널 파일을 끝까지 읽어서 (마지막 seq, 가장 큰 주문ID, 온전한 마지막 위치)를 돌려줍니다."""
+    last_seq = max_order_id = good_end = 0
+    for record, end in _iter_file(path):
+        last_seq = record.seq
+        max_order_id = max(max_order_id, record.order_id)
+        good_end = end
+    return last_seq, max_order_id, good_end
+
+
+def _frame(body: bytes) -> bytes:
+    return FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def _iter_file(path: str) -> Iterator[Tuple[JournalRecord, int]]:
+    """(레코드, 레코드 끝 위치)를 앞에서부터 (파일 전체를 올리지 않고 READ_CHUNK씩 읽음)"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        buf = b""
+        offset = 0      # buf 첫 바이트의 파일 위치
+        while True:
+            pos = 0
+            while pos + FRAME.size <= len(buf):
+                length, crc = FRAME.unpack_from(buf, pos)
+                if length > MAX_RECORD:
+                    return
+                start = pos + FRAME.size
+                if start + length > len(buf):
+                    break       # 레코드가 다음 조각에 걸침
+                body = buf[start:start + length]
+                # 깨진 레코드에서 멈춤
+                if zlib.crc32(body) != crc:
+                    return
+                pos = start + length
+                yield _decode(body), offset + pos
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return          # 쓰다가 죽어서 잘린 꼬리는 버림
+            buf = buf[pos:] + chunk
+            offset += pos
+
+
+class OrderJournal:
+    """
+    주문/체결/취소 저널 (append-only 바이너리 로그, 시스템의 원본 기록)
+    - 레코드마다 1부터 증가하는 seq가 붙고, 주문 ID도 저널이 매깁니다.
+    - append_*()는 메모리 버퍼에 쌓기만 하고, commit(seq)가 디스크에 내려쓰고 fsync될 때까지 기다립니다.
+    - 그룹 커밋: fsync가 진행되는 동안 들어온 요청들은 다음 fsync 한 번에 같이 내려갑니다.
+      (동시에 들어온 주문 N건 = fsync 1번)
+    - DB의 orders/holdings/users는 이 저널을 반영한 결과(projection)이고, 재시작 시 projection.replay_journal로 맞춥니다.
+    - 레코드를 쓰고 DB에 반영하는 쪽은 쓰기 전에 pin()으로 자리를 잡고 DB 커밋 뒤 unpin()합니다.
+      applied_seq(잡힌 자리 중 가장 앞 - 1)까지는 DB 반영이 끝난 것이므로 DB에 반영 위치로 남기고,
+      compact()로 그 앞부분을 파일에서 잘라낼 수 있습니다.
+    """
+
+    def __init__(self, path: str = "order_journal.bin"):
+        self.path = path
+        self.seq = 0               # 마지막으로 붙인 seq
+        self.durable_seq = 0       # fsync까지 끝난 seq
+        self._next_order_id = 1
+        self._buf = bytearray()
+        self._file = None
+        self.size = 0              # 파일에 온전히 쓴 바이트 수
+        self._waiters: List[Tuple[int, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._io_lock = asyncio.Lock()     # fsync와 compact가 동시에 파일을 만지지 않게
+        self._pins: Dict[int, int] = {}    # pin 번호 -> 그 뒤로 쓸 첫 seq
+        self._pin_ids = itertools.count(1)
+
+        # 통계
+        self.appended = 0
+        self.fsyncs = 0
+        self.last_fsync_ms = 0.0
+        self._fsync_ms_total = 0.0
+
+    # ---------- 열기/닫기 ----------
+    def open(self):
+        """기존 저널을 훑어서 seq/주문ID를 이어받고, 잘린 꼬리가 있으면 잘라냅니다."""
+        last_seq, max_order_id, good_end = _scan(self.path)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > good_end:
+            print(f"⚠️ [저널] 마지막 레코드가 깨져 있어 잘라냅니다. ({os.path.getsize(self.path) - good_end} bytes)")
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+        self.seq = self.durable_seq = last_seq
+        self._next_order_id = max(self._next_order_id, max_order_id + 1)
+        self.size = good_end
+        self._file = open(self.path, "ab")
+        return self
+
+    def reserve_order_ids(self, above: int):
+        """이 번호 이하의 주문 ID는 쓰지 않음 (DB에 이미 있는 주문과 겹치지 않게)"""
+        self._next_order_id = max(self._next_order_id, above + 1)
+
+    def next_order_id(self) -> int:
+        order_id = self._next_order_id
+        self._next_order_id += 1
+        return order_id
+
+    # ---------- DB 반영 위치 ----------
+    def pin(self) -> int:
+        """지금부터 쓸 레코드는 DB에 반영될 때까지 applied_seq에 포함하지 않음. unpin()에 넘길 번호를 돌려줍니다."""
+        pin_id = next(self._pin_ids)
+        self._pins[pin_id] = self.seq + 1
+        return pin_id
+
+    def unpin(self, pin_id: int):
+        """pin 이후 쓴 레코드의 DB 반영(또는 반영할 필요 없음)이 확정됨
+        (반영에 실패해서 확실하지 않으면 풀지 않고 두면 재시작 때 다시 반영됩니다.)"""
+        self._pins.pop(pin_id, None)
+
+    @property
+    def applied_seq(self) -> int:
+        """이 seq까지는 디스크에 남았고 DB 반영도 끝남 (재시작 때 이 다음부터 반영하면 됨)"""
+        if self._pins:
+            return min(self.durable_seq, min(self._pins.values()) - 1)
+        return self.durable_seq
+
+    def close(self):
+        """남은 버퍼를 내려쓰고 닫습니다. (종료 시)"""
+        if self._file is None:
+            return
+        self._write(bytes(self._buf))
+        self._buf.clear()
+        self.durable_seq = self.seq
+        self._file.close()
+        self._file = None
+
+    # ---------- 기록 ----------
+    def _append(self, kind: int, payload: bytes) -> int:
+        self.seq += 1
+        body = HEADER.pack(self.seq, time.time_ns(), kind) + payload
+        self._buf += FRAME.pack(len(body), zlib.crc32(body))
+        self._buf += body
+        self.appended += 1
+        return self.seq
+
+    def append_order(self, order_id: int, user_id: int, ticker: str, side: str, order_type: str,
+                     price: Optional[float], quantity: int) -> int:
+        return self._append(ORDER, ORDER_BODY.pack(
+            order_id, user_id, SIDES.index(side), ORDER_TYPES.index(order_type),
+            float("nan") if price is None else price, quantity) + ticker.encode("utf-8"))
+
+    def append_fill(self, order_id: int, price: float, quantity: int, remaining: int) -> int:
+        return self._append(FILL, FILL_BODY.pack(order_id, price, quantity, remaining))
+
+    def append_cancel(self, order_id: int, remaining: int) -> int:
+        return self._append(CANCEL, CANCEL_BODY.pack(order_id, remaining))
+
+    # ---------- 그룹 커밋 ----------
+    async def commit(self, seq: Optional[int] = None):
+        """seq까지 디스크에 안전하게 남을 때까지 기다립니다. (기본값: 지금까지 쓴 전부)"""
+        seq = self.seq if seq is None else seq
+        if seq <= self.durable_seq:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((seq, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        await future
+
+    async def _flush_loop(self):
+        while self._waiters:
+            data = bytes(self._buf)
+            self._buf.clear()
+            upto = self.seq
+            started = time.perf_counter()
+            try:
+                async with self._io_lock:
+                    await asyncio.to_thread(self._write, data)
+            except Exception as e:
+                waiters, self._waiters = self._waiters, []
+                for _, future in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            self.last_fsync_ms = (time.perf_counter() - started) * 1000
+            self._fsync_ms_total += self.last_fsync_ms
+            self.fsyncs += 1
+            self.durable_seq = upto
+
+            pending = []
+            for seq, future in self._waiters:
+                if seq <= upto:
+                    if not future.done():
+                        future.set_result(None)
+                else:
+                    pending.append((seq, future))
+            self._waiters = pending
+
+    def _write(self, data: bytes):
+        try:
+            if data:
+                self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            # 반쯤 쓴 레코드가 남으면 재시작 때 그 뒤 레코드를 모두 못 읽으므로 마지막 온전한 위치로 되돌림
+            # (실패한 레코드는 기다리던 쪽에 예외로 돌려보내고 버림)
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            os.truncate(self.path, self.size)
+            self._file = open(self.path, "ab")
+            raise
+        self.size += len(data)
+
+    # ---------- 앞부분 잘라내기 ----------
+    async def compact(self, upto_seq: int) -> int:
+        """
+        upto_seq 이하(DB 반영이 끝나서 재시작 때 다시 읽을 필요 없는) 레코드를 파일에서 잘라냅니다.
+        남길 레코드를 MARK 레코드 뒤에 붙여 임시 파일에 쓰고(fsync) 바꿔치기하므로, 중간에 죽어도 원래 파일이 남습니다.
+        줄어든 바이트 수를 돌려줍니다.
+        """
+        upto_seq = min(upto_seq, self.durable_seq)
+        async with self._io_lock:
+            before = self.size
+            await asyncio.to_thread(self._rewrite, upto_seq)
+        return before - self.size
+
+    def _rewrite(self, upto_seq: int):
+        # 남길 첫 레코드의 위치 (seq 순서로 쓰여 있으므로 그 뒤는 전부 남김)
+        keep_from = good_end = 0
+        for record, end in _iter_file(self.path):
+            if record.seq <= upto_seq:
+                keep_from = end
+            good_end = end
+        mark = _frame(HEADER.pack(upto_seq, time.time_ns(), MARK) + MARK_BODY.pack(self._next_order_id - 1))
+
+        tmp = self.path + ".tmp"
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            dst.write(mark)
+            src.seek(keep_from)
+            left = good_end - keep_from
+            while left > 0:
+                chunk = src.read(min(READ_CHUNK, left))
+                if not chunk:
+                    break
+                dst.write(chunk)
+                left -= len(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, self.path)
+        self._file.close()
+        self._file = open(self.path, "ab")
+        self.size = len(mark) + good_end - keep_from
+
+    def stats(self) -> Dict:
+        return {
+            "seq": self.seq,
+            "durable_seq": self.durable_seq,
+            "applied_seq": self.applied_seq,
+            "pins": len(self._pins),
+            "size": self.size,
+            "appended": self.appended,
+            "fsyncs": self.fsyncs,
+            "records_per_fsync": round(self.appended / self.fsyncs, 2) if self.fsyncs else 0.0,
+            "fsync_ms": {"last": round(self.last_fsync_ms, 3),
+                         "avg": round(self._fsync_ms_total / self.fsyncs, 3) if self.fsyncs else 0.0},
+        }
+
+    # ---------- 읽기 ----------
+    @staticmethod
+    def read(path: str, after_seq: int = 0) -> Iterator[JournalRecord]:
+        """저널을 seq 순서대로 읽습니다. (after_seq 다음 레코드부터, MARK 레코드 포함)"""
+        for record, _ in _iter_file(path):
+            if record.seq > after_seq:
+                yield record
@@ -0,0 +1,71 @@
+import time
+from typing import Dict, Optional, Set
+import aiosqlite
+
+
+class PriceStore:
+    """
+    종목 현재가 저장소 (write-behind)
+    - 현재가는 메모리에서 읽고 씁니다. (조회할 때 SQLite를 거치지 않음)
+    - 가격이 바뀐 종목만 표시해 뒀다가 flush_interval초마다 한 번에 UPDATE + 커밋 1번으로 내려씁니다.
+    - 서버 종료 시 flush()를 한 번 더 불러서 마지막 가격을 남깁니다.
+    """
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self._prices: Dict[str, int] = {}
+        self._dirty: Set[str] = set()
+        self._last_flush = time.monotonic()
+        self.flushes = 0
+        self.rows_written = 0
+
+    async def load(self, db: aiosqlite.Connection):
+        """DB에 저장된 가격을 메모리로 올립니다. (시작할 때 한 번)"""
+        async with db.execute("SELECT company_name, current_price FROM stocks") as cursor:
+            for row in await cursor.fetchall():
+                self._prices[row[0]] = row[1]
+
+    # ---------- 읽기/쓰기 (메모리) ----------
+    def get(self, ticker: str, default: Optional[int] = None) -> Optional[int]:
+        return self._prices.get(ticker, default)
+
+    def set(self, ticker: str, price: int):
+        if self._prices.get(ticker) != price:
+            self._prices[ticker] = price
+            self._dirty.add(ticker)
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self._prices)
+
+    def __contains__(self, ticker: str):
+        return ticker in self._prices
+
+    # ---------- 내려쓰기 ----------
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    async def flush(self, db: aiosqlite.Connection) -> int:
+        """바뀐 종목만 한 번에 DB에 씁니다. 쓴 종목 수를 돌려줍니다."""
+        self._last_flush = time.monotonic()
+        if not self._dirty:
+            return 0
+        # 기다리는 동안 들어온 가격은 다시 표시되도록 먼저 비워둠
+        rows = [(self._prices[ticker], ticker) for ticker in self._dirty]
+        self._dirty.clear()
+        try:
+            await db.executemany("UPDATE stocks SET current_price = ? WHERE company_name = ?", rows)
+            await db.commit()
+        except Exception:
+            # 실패한 종목은 다음 flush에서 다시 시도 (그 사이 더 새 가격이 들어왔으면 그 값으로)
+            self._dirty.update(ticker for _, ticker in rows)
+            raise
+        self.flushes += 1
+        self.rows_written += len(rows)
+        return len(rows)
+
+    async def maybe_flush(self, db: aiosqlite.Connection) -> int:
+        """flush_interval이 지났을 때만 flush (틱 루프에서 매 틱 호출)"""
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        return await self.flush(db)
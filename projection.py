@@ -0,0 +1,263 @@
+import time
+from typing import Dict, List, Optional
+import aiosqlite
+from accounts import AccountChange
+from order_journal import CANCEL, FILL, MARK, ORDER, OrderJournal
+
+# DB 테이블(orders/holdings/users/user_quests)은 주문 저널을 반영한 결과(projection)입니다.
+# 여기 함수들은 같은 레코드를 두 번 반영해도 결과가 같도록(멱등) 만들어져 있어서,
+# 재시작할 때 저널을 처음부터 다시 흘려도 안전합니다. 커밋은 호출하는 쪽에서 하고,
+# changes 리스트를 넘기면 잔액/보유량 변화를 모아주므로 커밋 후 AccountStore.apply()에 넘깁니다.
+
+# 첫 체결 퀘스트 (주문 종류 -> (퀘스트 이름, 보상))
+FIRST_TRADE_QUESTS = {"BUY": ("첫 매수 성공", 500000), "SELL": ("첫 매도 성공", 1000000)}
+
+# SQLite 바인딩 변수 개수 제한을 넘지 않게 IN (...) 조회를 나눠서 보냄
+SETTLE_CHUNK = 500
+
+
+def _record(changes: Optional[List[AccountChange]], user_id: int, cash_delta: float,
+            ticker: Optional[str] = None, quantity_delta: int = 0):
+    """DB에 쓴 잔액/보유량 변화를 changes에 모아둠 (커밋 후 AccountStore.apply로 메모리에 반영)"""
+    if changes is not None:
+        changes.append((user_id, cash_delta, ticker, quantity_delta, None))
+
+
+async def apply_order(db: aiosqlite.Connection, order_id: int, user_id: int, ticker: str, side: str,
+                      price: float, quantity: int, changes: Optional[List[AccountChange]] = None) -> bool:
+    """
+    [ORDER] 주문을 PENDING으로 기록하고 자산을 잡아둡니다. (매수: 가격 x 수량만큼 현금, 매도: 주식)
+    이미 있는 주문이면 아무것도 하지 않고 False (재반영 시 이중 차감 방지)
+    잔액 확인은 주문을 받을 때 AccountStore가 먼저 하므로 여기서는 하지 않습니다.
+    """
+    async with db.execute("SELECT 1 FROM orders WHERE id = ?", (order_id,)) as cursor:
+        if await cursor.fetchone():
+            return False
+
+    if side == "BUY":
+        await db.execute("UPDATE users SET balance = balance - ? WHERE id = ?", (price * quantity, user_id))
+        _record(changes, user_id, -price * quantity)
+    else:
+        await db.execute("UPDATE holdings SET quantity = quantity - ? WHERE user_id = ? AND company_name = ?",
+                         (quantity, user_id, ticker))
+        _record(changes, user_id, 0, ticker, -quantity)
+
+    await db.execute("""
+        INSERT INTO orders (id, user_id, company_name, order_type, price, quantity, status)
+        VALUES (?, ?, ?, ?, ?, ?, 'PENDING')
+    """, (order_id, user_id, ticker, side, price, quantity))
+    return True
+
+
+async def apply_cancel(db: aiosqlite.Connection, order_id: int, remaining: int,
+                       changes: Optional[List[AccountChange]] = None) -> bool:
+    """
+    [CANCEL] 대기 중인 주문을 취소하고 체결 안 된 잔량만큼 잡아둔 자산을 돌려줍니다.
+    이미 취소/체결된 주문이면 아무것도 하지 않음 (재반영 시 이중 환불 방지)
+    """
+    async with db.execute("""
+        SELECT user_id, company_name, order_type, price FROM orders WHERE id = ? AND status = 'PENDING'
+    """, (order_id,)) as cursor:
+        order = await cursor.fetchone()
+    if order is None:
+        return False
+
+    await db.execute("UPDATE orders SET status = 'CANCELLED' WHERE id = ?", (order_id,))
+    if remaining > 0:
+        if order['order_type'] == "BUY":
+            await db.execute("UPDATE users SET balance = balance + ? WHERE id = ?",
+                             (order['price'] * remaining, order['user_id']))
+            _record(changes, order['user_id'], order['price'] * remaining)
+        elif order['order_type'] == "SELL":
+            await db.execute("UPDATE holdings SET quantity = quantity + ? WHERE user_id = ? AND company_name = ?",
+                             (remaining, order['user_id'], order['company_name']))
+            _record(changes, order['user_id'], 0, order['company_name'], remaining)
+    return True
+
+
+async def settle_fills(db: aiosqlite.Connection, fills, changes: Optional[List[AccountChange]] = None) -> int:
+    """
+    [FILL] 체결 이벤트들을 정산하고, 정산한 주문 수를 돌려줍니다. (FillEvent, 저널 FILL 레코드 모두 가능)
+    부분 체결도 체결된 만큼 바로 정산합니다. (주식/현금은 실제 체결가 기준)
+    - 매수: 주문 때 지정가로 잡아둔 돈 중, 더 싸게 체결된 차액은 돌려줌
+    - 매도: 주문 때 주식은 이미 뺐으므로 체결 대금만 지급
+    주문마다 쿼리를 날리지 않고 executemany로 몰아서 처리하므로, 일은 체결 건수만큼만 합니다.
+    """
+    # 0. 주문별로 체결 합치기: [체결 수량, 체결 금액, 마지막 잔량]
+    per_order = {}
+    for fill in fills:
+        acc = per_order.setdefault(int(fill.order_id), [0, 0.0, None])
+        acc[0] += fill.quantity
+        acc[1] += fill.quantity * fill.price
+        acc[2] = fill.remaining
+    order_ids = list(per_order)
+
+    # 1. 주문 조회 (체결 직전에 취소된 주문도 이미 체결된 만큼은 정산해야 하므로 CANCELLED도 포함)
+    db_orders = []
+    for i in range(0, len(order_ids), SETTLE_CHUNK):
+        chunk = order_ids[i:i + SETTLE_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        async with db.execute(f"""
+            SELECT id, user_id, company_name, order_type, quantity, price, filled_quantity, avg_fill_price FROM orders
+            WHERE status IN ('PENDING', 'CANCELLED') AND id IN ({placeholders})
+        """, chunk) as cursor:
+            db_orders.extend(await cursor.fetchall())
+
+    order_updates = []
+    holding_updates = []
+    balance_delta = {}
+    settled = []
+    for o in db_orders:
+        tick_qty, tick_amount, remaining = per_order[o['id']]
+        already = o['filled_quantity'] or 0
+        # 누적 체결 수량 = 주문 수량 - 엔진 잔량 (이미 정산된 몫은 빼고, 같은 체결을 두 번 정산하지 않음)
+        new_qty = min(tick_qty, o['quantity'] - remaining - already)
+        if new_qty <= 0:
+            continue
+        amount = tick_amount * new_qty / tick_qty
+        filled = already + new_qty
+        avg_fill = ((o['avg_fill_price'] or 0) * already + amount) / filled
+        status = "FILLED" if filled >= o['quantity'] else None
+        order_updates.append((filled, avg_fill, status, o['id']))
+
+        if o['order_type'] == "BUY":
+            # 매수: 체결가로 주식 지급 + 지정가와 체결가 차액 환불
+            holding_updates.append((o['user_id'], o['company_name'], new_qty, amount / new_qty))
+            refund = o['price'] * new_qty - amount
+            if refund:
+                balance_delta[o['user_id']] = balance_delta.get(o['user_id'], 0) + refund
+        elif o['order_type'] == "SELL":
+            # 매도: 체결 대금 지급
+            balance_delta[o['user_id']] = balance_delta.get(o['user_id'], 0) + amount
+        settled.append((o, new_qty, amount / new_qty, status))
+
+    if not settled:
+        return 0
+
+    # 2. 주문 체결 기록 (전량 체결되면 FILLED)
+    await db.executemany("""
+        UPDATE orders SET filled_quantity = ?, avg_fill_price = ?, status = COALESCE(?, status) WHERE id = ?
+    """, order_updates)
+
+    # 3. 주식 지급 (평단가는 체결가 가중평균)
+    await db.executemany("""
+        INSERT INTO holdings (user_id, company_name, quantity, average_price)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id, company_name) DO UPDATE SET
+            average_price = (quantity * COALESCE(average_price, 0) + excluded.quantity * excluded.average_price)
+                            / (quantity + excluded.quantity),
+            quantity = quantity + excluded.quantity
+    """, holding_updates)
+
+    # 4. 퀘스트 자동 달성 (보너스): 대상 유저들의 달성 기록을 한 번에 조회
+    candidates = {(o['user_id'], FIRST_TRADE_QUESTS[o['order_type']][0]): FIRST_TRADE_QUESTS[o['order_type']][1]
+                  for o, _, _, _ in settled if o['order_type'] in FIRST_TRADE_QUESTS}
+    user_ids = list({user_id for user_id, _ in candidates})
+    done = set()
+    for i in range(0, len(user_ids), SETTLE_CHUNK):
+        chunk = user_ids[i:i + SETTLE_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        async with db.execute(f"""
+            SELECT DISTINCT user_id, quest_name FROM user_quests
+            WHERE quest_name IN (?, ?) AND user_id IN ({placeholders})
+        """, [FIRST_TRADE_QUESTS["BUY"][0], FIRST_TRADE_QUESTS["SELL"][0], *chunk]) as cursor:
+            done.update((row['user_id'], row['quest_name']) for row in await cursor.fetchall())
+
+    new_quests = [(user_id, quest_name, reward) for (user_id, quest_name), reward in candidates.items()
+                  if (user_id, quest_name) not in done]
+    await db.executemany("INSERT INTO user_quests (user_id, quest_name, reward_amount) VALUES (?, ?, ?)", new_quests)
+    for user_id, quest_name, reward in new_quests:
+        balance_delta[user_id] = balance_delta.get(user_id, 0) + reward
+        print(f"🎁 [퀘스트 완료] {quest_name}! 보상 {reward}원 지급")
+
+    # 5. 현금 지급 (매도 대금 + 매수 차액 환불 + 퀘스트 보상, 유저별로 합쳐서 한 번씩)
+    await db.executemany("UPDATE users SET balance = balance + ? WHERE id = ?",
+                         [(amount, user_id) for user_id, amount in balance_delta.items()])
+
+    if changes is not None:
+        changes.extend((user_id, 0, ticker, qty, price) for user_id, ticker, qty, price in holding_updates)
+        changes.extend((user_id, amount, None, 0, None) for user_id, amount in balance_delta.items())
+
+    for o, qty, price, status in settled:
+        kind = "체결" if status == "FILLED" else "부분 체결"
+        print(f"🎉 [{kind}] 사용자 {o['user_id']}님의 {o['company_name']} 주문 {qty}주 @ {price:.0f}원")
+
+    return len(settled)
+
+
+# ---------- 재시작 복구 ----------
+async def journal_watermark(db: aiosqlite.Connection) -> int:
+    async with db.execute("SELECT last_seq FROM journal_state WHERE id = 1") as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def set_journal_watermark(db: aiosqlite.Connection, seq: int):
+    await db.execute("""
+        INSERT INTO journal_state (id, last_seq) VALUES (1, ?)
+        ON CONFLICT(id) DO UPDATE SET last_seq = excluded.last_seq, updated_at = CURRENT_TIMESTAMP
+    """, (seq,))
+
+
+async def replay_journal(db: aiosqlite.Connection, journal: OrderJournal, after_seq: Optional[int] = None) -> Dict:
+    """
+    [재시작 복구] DB에 아직 반영되지 않았을 수 있는 저널 레코드를 seq 순서대로 다시 반영합니다.
+    - 기본값은 journal_state에 남겨둔 마지막 반영 seq 다음부터
+    - 연달아 나온 FILL은 모아서 settle_fills 한 번으로 정산
+    - 접수만 되고 끝나지 않은 시장가 주문(ORDER는 있는데 CANCEL 전에 죽은 경우)은 잔량을 취소 처리
+    돌려주는 값: {"from_seq", "to_seq", "records", "ms"}
+    """
+    started = time.perf_counter()
+    if after_seq is None:
+        after_seq = await journal_watermark(db)
+        if after_seq > journal.seq:
+            # 저널 파일이 새로 만들어졌는데 DB 기록만 남아있는 경우: 처음부터 (멱등이라 안전)
+            print(f"⚠️ [저널] DB 기록(seq {after_seq})이 저널(seq {journal.seq})보다 앞서 있어 처음부터 다시 반영합니다.")
+            after_seq = 0
+
+    records = 0
+    fills = []
+    open_market: Dict[int, int] = {}   # 시장가 주문ID -> 남은 수량
+
+    for record in OrderJournal.read(journal.path, after_seq):
+        if record.kind == MARK:
+            # 잘라낸 앞부분(seq <= record.seq)은 DB에 반영된 뒤에만 잘라내므로 여기 걸리면 DB가 저널보다 뒤처진 것
+            print(f"⚠️ [저널] seq {after_seq + 1}~{record.seq}는 이미 잘려나가서 다시 반영할 수 없습니다.")
+            continue
+        records += 1
+        if record.kind == FILL:
+            fills.append(record)
+            if record.order_id in open_market:
+                if record.remaining:
+                    open_market[record.order_id] = record.remaining
+                else:
+                    del open_market[record.order_id]
+            continue
+        if fills:
+            await settle_fills(db, fills)
+            fills = []
+        if record.kind == ORDER:
+            await apply_order(db, record.order_id, record.user_id, record.ticker, record.side,
+                              record.price, record.quantity)
+            if record.order_type == "MARKET":
+                open_market[record.order_id] = record.quantity
+        elif record.kind == CANCEL:
+            open_market.pop(record.order_id, None)
+            await apply_cancel(db, record.order_id, record.remaining)
+    if fills:
+        await settle_fills(db, fills)
+
+    for order_id, remaining in open_market.items():
+        journal.append_cancel(order_id, remaining)
+        await apply_cancel(db, order_id, remaining)
+    if open_market:
+        await journal.commit()
+
+    await set_journal_watermark(db, journal.seq)
+    await db.commit()
+    return {
+        "from_seq": after_seq,
+        "to_seq": journal.seq,
+        "records": records,
+        "ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -17,7 +17,7 @@ def update_ranking_snapshot():
     cursor = conn.cursor()
 
     try:
-        # 1. 현재 주가 가져오기
+        # 1. 현재 주가 가져오기 (DB의 가격은 최대 flush 주기만큼 늦을 수 있음)
         cursor.execute("SELECT company_name, current_price FROM stocks")
         stock_rows = cursor.fetchall()
         current_prices = {row[0]: row[1] for row in stock_rows}
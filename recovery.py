@@ -0,0 +1,55 @@
+import time
+from typing import Dict
+import aiosqlite
+from domain_models import OrderSide, OrderType
+from order_book import EngineOrder
+
+# 한 번에 읽어올 대기 주문 수 (메모리를 한꺼번에 쓰지 않게 나눠서 적재)
+RESTORE_BATCH = 50_000
+
+
+async def restore_order_books(engine, db: aiosqlite.Connection, batch_size: int = RESTORE_BATCH) -> Dict:
+    """
+    [재시작 복구] orders 테이블의 PENDING 주문으로 엔진 호가창을 다시 만듭니다.
+    - 엔진은 메모리에만 장부를 들고 있으므로, 서버가 다시 뜨면 대기 주문이 엔진에서 사라져 있습니다.
+    - DB id 순서(= 접수 순서)로 읽어서 engine.load_orders_async로 매칭 없이 한꺼번에 올립니다.
+    - 이미 부분 체결된 주문은 남은 수량(quantity - filled_quantity)만 올립니다.
+    돌려주는 값: {"loaded", "skipped", "read_ms", "load_ms", "total_ms"}
+    """
+    sides = {"BUY": OrderSide.BUY, "SELL": OrderSide.SELL}
+    started = time.perf_counter()
+    read_ns = load_ns = 0
+    loaded = skipped = 0
+
+    async with db.execute("""
+        SELECT id, user_id, company_name, order_type, price, quantity, filled_quantity FROM orders
+        WHERE status = 'PENDING' ORDER BY id
+    """) as cursor:
+        while True:
+            t0 = time.perf_counter_ns()
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = []
+            for order_id, user_id, ticker, order_type, price, quantity, filled in rows:
+                remaining = quantity - (filled or 0)
+                side = sides.get(order_type)
+                if price is None or remaining <= 0 or side is None:
+                    skipped += 1
+                    continue
+                batch.append(EngineOrder(f"User_{user_id}", ticker, side, remaining,
+                                         price, OrderType.LIMIT, str(order_id)))
+            t1 = time.perf_counter_ns()
+            count = await engine.load_orders_async(batch)
+            load_ns += time.perf_counter_ns() - t1
+            read_ns += t1 - t0
+            loaded += count
+            skipped += len(batch) - count
+
+    return {
+        "loaded": loaded,
+        "skipped": skipped,
+        "read_ms": round(read_ns / 1e6, 1),
+        "load_ms": round(load_ns / 1e6, 1),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -71,9 +71,10 @@ async def get_news_detail(
     target_user_id = x_user_id
 
     # 3. 게이미피케이션 로직 실행
-    await gain_exp(target_user_id, 10, max_level=5)
+    # (이미 빌린 연결을 넘김: 풀에서 연결을 하나 더 빌리면 요청이 몰릴 때 서로 기다리다 멈춤)
+    await gain_exp(target_user_id, 10, max_level=5, db=db)
     
     # 퀘스트 체크 (레벨 상관없이 퀘스트는 깰 수 있게 둠)
-    await check_quest(target_user_id, "news_read_1")
+    await check_quest(target_user_id, "news_read_1", db=db)
 
     return news_item
\ No newline at end of file
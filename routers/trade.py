@@ -1,9 +1,14 @@
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 import aiosqlite
 from database import get_db_connection
 from services.gamification import gain_exp, check_quest
 from domain_models import Order, OrderType, OrderSide
+from market_engine import FillEvent
+from projection import apply_cancel, apply_order, settle_fills
+from ledger import user_history
+from order_gateway import GatewayClosed, GatewayFull
 
 router = APIRouter(prefix="/api/trade", tags=["Trade"])
 
@@ -43,6 +48,8 @@ async def init_user(user: UserCreate, db: aiosqlite.Connection = Depends(get_db_
         """, (user_id,))
         
         await db.commit() # 최종 저장
+        from main import accounts
+        accounts.add_user(user_id, balance)
         
         return {
             "status": "created", 
@@ -68,81 +75,32 @@ async def init_user(user: UserCreate, db: aiosqlite.Connection = Depends(get_db_
 async def buy_stock(trade: TradeRequest, db: aiosqlite.Connection = Depends(get_db_connection)):
     """
     [매수 트랜잭션]
-    1. 잔액 확인 (balance) -> 2. 잔액 차감 -> 3. 주식 지급 -> 4. 경험치/퀘스트
+    1. 잔액 확인 + 차감 + 주식 지급 (메모리에서 한 번에) -> 2. 퀘스트
+    DB(잔액, 보유 주식, 거래 원장)에는 계좌 저장소가 잠시 뒤 몰아서 내려씁니다.
     """
-    total_cost = trade.price * trade.quantity
-    
-    try:
-        # 🔒 트랜잭션 시작
-        await db.execute("BEGIN IMMEDIATE") 
-        
-        # 1. 잔액 확인
-        cursor = await db.execute("SELECT balance FROM users WHERE id = ?", (trade.user_id,))
-        row = await cursor.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
-        
-        balance_amount = row[0]
-        
-        if balance_amount < total_cost:
-            raise HTTPException(status_code=400, detail="잔액이 부족합니다.")
-
-        # 2. 잔액 차감
-        new_balance = balance_amount - total_cost
-        await db.execute("UPDATE users SET balance = ? WHERE id = ?", (new_balance, trade.user_id))
+    from main import accounts
 
-        # 3. 주식 보유량 업데이트
-        cursor = await db.execute("SELECT quantity, average_price FROM holdings WHERE user_id = ? AND company_name = ?", (trade.user_id, trade.company_name))
-        holding = await cursor.fetchone()
-        
-        if holding:
-            # 추가 매수
-            old_qty, old_avg = holding
-            new_qty = old_qty + trade.quantity
-            new_avg = ((old_qty * old_avg) + total_cost) / new_qty
-            await db.execute("UPDATE holdings SET quantity = ?, average_price = ? WHERE user_id = ? AND company_name = ?", (new_qty, new_avg, trade.user_id, trade.company_name))
-        else:
-            # 신규 매수
-            await db.execute("INSERT INTO holdings (user_id, company_name, quantity, average_price) VALUES (?, ?, ?, ?)", (trade.user_id, trade.company_name, trade.quantity, trade.price))
+    if trade.price <= 0 or trade.quantity <= 0:
+        raise HTTPException(status_code=400, detail="가격과 수량은 양수여야 합니다.")
+    if await accounts.ensure(db, trade.user_id) is None:
+        raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
 
-        await db.commit()
-        try:
-            # 1. 경험치 지급 (20점, 레벨 제한 없음)
-            #await gain_exp(trade.user_id, 20)
-            
-            # 2. '첫 주식 매수' 퀘스트 체크
-            await check_quest(trade.user_id, "trade_first")
-        except Exception as e:
-            # 보상 지급 중 에러가 나도, 주식 산 건 취소되면 안 되니까 로그만 찍고 넘어감
-            print(f"⚠️ 보상 지급 중 에러 발생: {e}")
+    new_balance = accounts.buy(trade.user_id, trade.company_name, trade.quantity, trade.price,
+                               f"{trade.company_name} {trade.quantity}주 매수")
+    if new_balance is None:
+        raise HTTPException(status_code=400, detail="잔액이 부족합니다.")
 
-        return {"message": "매수 체결 완료!", "balance": new_balance}
+    try:
+        # 1. 경험치 지급 (20점, 레벨 제한 없음)
+        #await gain_exp(trade.user_id, 20)
 
+        # 2. '첫 주식 매수' 퀘스트 체크
+        await check_quest(trade.user_id, "trade_first", db=db)
     except Exception as e:
-        await db.rollback() # 에러 나면 주식 사기 전으로 되돌림
-        raise e
-
-        # 4. 거래 원장(Ledger) 기록
-        await db.execute("""
-            INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description)
-            VALUES (?, 'BUY', ?, ?, ?)
-        """, (trade.user_id, -total_cost, new_balance, f"{trade.company_name} {trade.quantity}주 매수"))
-        
-        # ✅ 승인 (Commit)
-        await db.commit()
-        
-        return {
-            "status": "success", 
-            "message": f"{trade.company_name} 매수 성공!", 
-            "balance": new_balance,
-            "holdings": {"company": trade.company_name, "quantity": trade.quantity}
-        }
+        # 보상 지급 중 에러가 나도, 주식 산 건 취소되면 안 되니까 로그만 찍고 넘어감
+        print(f"⚠️ 보상 지급 중 에러 발생: {e}")
 
-    except Exception as e:
-        # ❌ 에러 발생 시 취소 (Rollback)
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"거래 실패: {str(e)}")
+    return {"message": "매수 체결 완료!", "balance": new_balance}
 
 # 4. 내 정보(잔액) 조회 API
 @router.get("/user/{user_id}")
@@ -151,25 +109,22 @@ async def get_user_info(user_id: int, db: aiosqlite.Connection = Depends(get_db_
     [지갑 조회]
     앱 메인화면에 띄워줄 유저의 현재 잔액과 보유 주식 정보를 가져옵니다.
     """
-    # 1. 잔액 조회
-    cursor = await db.execute("SELECT username, balance FROM users WHERE id = ?", (user_id,))
+    # 1. 유저 확인
+    cursor = await db.execute("SELECT username FROM users WHERE id = ?", (user_id,))
     user_row = await cursor.fetchone()
     
     if not user_row:
         raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
-        
-    # 2. 보유 주식 조회 (현재 가지고 있는 것만)
-    cursor = await db.execute("""
-        SELECT company_name, quantity, average_price 
-        FROM holdings 
-        WHERE user_id = ? AND quantity > 0
-    """, (user_id,))
-    holdings_rows = await cursor.fetchall()
-    
+
+    # 2. 잔액/보유 주식/평단가는 계좌 저장소 기준 (DB에 아직 안 내려간 /buy, /sell 반영분까지 포함)
+    from main import accounts
+    account = await accounts.ensure(db, user_id)
     return {
         "username": user_row[0],
-        "balance": user_row[1],
-        "holdings": [dict(row) for row in holdings_rows]
+        "balance": account.cash,
+        "holdings": [{"company_name": ticker, "quantity": quantity,
+                      "average_price": account.average_prices.get(ticker)}
+                     for ticker, quantity in account.positions.items() if quantity > 0]
     }
 
 # 5. 보상 지급 API (퀘스트, 배당금 등)
@@ -185,42 +140,21 @@ async def give_reward(reward: RewardRequest, db: aiosqlite.Connection = Depends(
     [보상 지급 시스템]
     - 특정 유저에게 돈을 지급합니다.
     - 퀘스트 완료, 레벨업 축하금, 배당금 지급 등에 사용됩니다.
-    - 거래 장부(Ledger)에 'REWARD' 타입으로 기록됩니다.
+    - 거래 장부(Ledger)에 'REWARD' 타입으로 기록됩니다. (계좌 저장소가 잠시 뒤 몰아서 내려씀)
     """
-    try:
-        await db.execute("BEGIN IMMEDIATE") # 트랜잭션 시작
-
-        # 1. 유저 존재 확인 및 현재 잔액 조회
-        cursor = await db.execute("SELECT balance FROM users WHERE id = ?", (reward.user_id,))
-        row = await cursor.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
-            
-        balance = row[0]
-        
-        # 2. 잔액 증가 (더하기)
-        new_balance = balance + reward.amount
-        await db.execute("UPDATE users SET balance = ? WHERE id = ?", (new_balance, reward.user_id))
+    from main import accounts
 
-        # 3. 거래 원장(Ledger)에 기록 (돈의 출처 남기기)
-        await db.execute("""
-            INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description)
-            VALUES (?, 'REWARD', ?, ?, ?)
-        """, (reward.user_id, reward.amount, new_balance, reward.description))
-
-        await db.commit() # 저장
-
-        return {
-            "status": "success",
-            "message": f"보상 지급 완료: {reward.amount}원",
-            "balance": new_balance,
-            "reason": reward.description
-        }
+    await accounts.ensure(db, reward.user_id)
+    new_balance = accounts.credit(reward.user_id, reward.amount, "REWARD", reward.description)
+    if new_balance is None:
+        raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
 
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"보상 지급 실패: {str(e)}")
+    return {
+        "status": "success",
+        "message": f"보상 지급 완료: {reward.amount}원",
+        "balance": new_balance,
+        "reason": reward.description
+    }
 
 
 # 6. 주식 매도 API (Sell)
@@ -228,87 +162,42 @@ async def give_reward(reward: RewardRequest, db: aiosqlite.Connection = Depends(
 async def sell_stock(trade: TradeRequest, db: aiosqlite.Connection = Depends(get_db_connection)):
     """
     [매도 트랜잭션]
-    1. 보유 주식 확인
-    2. 주식 차감
-    3. 잔액 증가
-    4. 거래 장부 기록 (transactions 테이블)
-    5. 경험치 및 퀘스트 보상 지급 (New!)
+    1. 보유 주식 확인 + 차감 + 잔액 증가 (메모리에서 한 번에)
+    2. 거래 장부 기록 (계좌 저장소가 잠시 뒤 transactions 테이블에 몰아서 내려씀)
+    3. 퀘스트 보상 지급
     """
-    total_income = trade.price * trade.quantity
-    
-    try:
-        await db.execute("BEGIN IMMEDIATE") # 트랜잭션 시작
-
-        # 1. 내 주식고(Holdings) 확인
-        cursor = await db.execute("""
-            SELECT quantity, average_price 
-            FROM holdings 
-            WHERE user_id = ? AND company_name = ?
-        """, (trade.user_id, trade.company_name))
-        
-        holding = await cursor.fetchone()
-        
-        # 주식이 아예 없거나, 팔려는 개수보다 적게 가지고 있다면?
-        if not holding or holding[0] < trade.quantity:
-            raise HTTPException(status_code=400, detail="매도할 주식이 부족합니다.")
-
-        current_qty = holding[0]
-        
-        # 2. 주식 수량 차감
-        new_qty = current_qty - trade.quantity
-        
-        # (사용자님의 좋은 습관: 수량이 0이 되어도 기록을 남김)
-        await db.execute("""
-            UPDATE holdings SET quantity = ? 
-            WHERE user_id = ? AND company_name = ?
-        """, (new_qty, trade.user_id, trade.company_name))
-
-        # 3. 유저 잔액 증가 (돈 받기)
-        cursor = await db.execute("SELECT balance FROM users WHERE id = ?", (trade.user_id,))
-        row = await cursor.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
+    from main import accounts
 
-        balance = row[0]
-        new_balance = balance + total_income
-        
-        await db.execute("UPDATE users SET balance = ? WHERE id = ?", (new_balance, trade.user_id))
+    if trade.price <= 0 or trade.quantity <= 0:
+        raise HTTPException(status_code=400, detail="가격과 수량은 양수여야 합니다.")
+    account = await accounts.ensure(db, trade.user_id)
+    if account is None:
+        raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
 
-        # 4. 거래 원장(Ledger) 기록
-        # (기존에 작성하신 꼼꼼한 기록 코드 유지)
-        await db.execute("""
-            INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description)
-            VALUES (?, 'SELL', ?, ?, ?)
-        """, (trade.user_id, total_income, new_balance, f"{trade.company_name} {trade.quantity}주 매도"))
+    new_balance = accounts.sell(trade.user_id, trade.company_name, trade.quantity, trade.price,
+                                f"{trade.company_name} {trade.quantity}주 매도")
+    # 주식이 아예 없거나, 팔려는 개수보다 적게 가지고 있다면?
+    if new_balance is None:
+        raise HTTPException(status_code=400, detail="매도할 주식이 부족합니다.")
 
-        await db.commit() # ✅ 여기서 DB 저장 완료!
-        
-        # 매도 보상 지급 (저장이 확실히 된 후 실행)
-        try:
-            # 1. 매도 경험치 20점 지급
-            #await gain_exp(trade.user_id, 20)
-            
-            # 2. '첫 매도' 퀘스트 체크 (ID: trade_sell_first)
-            await check_quest(trade.user_id, "trade_sell_first")
-            
-        except Exception as e:
-            # 보상 지급 중 에러가 나도, 주식 판 건 취소되면 안 되니까 로그만 찍고 넘어감
-            print(f"⚠️ 보상 지급 중 에러 발생: {e}")
+    # 매도 보상 지급
+    try:
+        # 1. 매도 경험치 20점 지급
+        #await gain_exp(trade.user_id, 20)
 
-        return {
-            "status": "success",
-            "message": f"{trade.company_name} {trade.quantity}주 매도 완료!",
-            "balance": new_balance,
-            "holdings": {"company": trade.company_name, "remaining_quantity": new_qty}
-        }
+        # 2. '첫 매도' 퀘스트 체크 (ID: trade_sell_first)
+        await check_quest(trade.user_id, "trade_sell_first", db=db)
 
-    except HTTPException as he:
-        await db.rollback()
-        raise he
     except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"매도 실패: {str(e)}")
+        # 보상 지급 중 에러가 나도, 주식 판 건 취소되면 안 되니까 로그만 찍고 넘어감
+        print(f"⚠️ 보상 지급 중 에러 발생: {e}")
+
+    return {
+        "status": "success",
+        "message": f"{trade.company_name} {trade.quantity}주 매도 완료!",
+        "balance": new_balance,
+        "holdings": {"company": trade.company_name, "remaining_quantity": account.positions.get(trade.company_name, 0)}
+    }
 
 
 # 7. 지정가 주문 시스템 (Limit Order)
@@ -319,11 +208,19 @@ class OrderRequest(BaseModel):
     ticker: str = None          # 신규 방식
     company_name: str = None    # 기존 호환용
     order_type: str  
-    price: int
+    price_type: str = "LIMIT"   # LIMIT(지정가) / MARKET(시장가)
+    price: Optional[int] = None # 시장가 주문은 비워둠
     quantity: int
 
+def gateway_error(e: Exception) -> HTTPException:
+    """주문 창구 거절 -> HTTP 응답 (꽉 참: 429 + 잠시 후 재시도, 닫힘: 503)"""
+    if isinstance(e, GatewayFull):
+        return HTTPException(status_code=429, detail="주문이 몰려 있습니다. 잠시 후 다시 시도해주세요.",
+                             headers={"Retry-After": "1"})
+    return HTTPException(status_code=503, detail="주문 창구가 열려있지 않습니다.")
+
 @router.post("/order")
-async def place_order(req: OrderRequest):
+async def place_order(req: OrderRequest, db: aiosqlite.Connection = Depends(get_db_connection)):
     """
     사용자의 주문을 DB에 저장하고, 동시에 '진짜 엔진'으로 전송합니다.
     """
@@ -334,64 +231,94 @@ async def place_order(req: OrderRequest):
     if not target_ticker:
         raise HTTPException(status_code=400, detail="종목명(ticker)이 필요합니다.")
 
-    db = await get_db_connection()
     try:
-        # 1. 유효성 및 자산 검증
-        if req.price <= 0 or req.quantity <= 0:
-            raise HTTPException(status_code=400, detail="가격과 수량은 양수여야 합니다.")
+        # 시장가 주문은 대기 없이 그 자리에서 체결/정산
+        if req.price_type == "MARKET":
+            return await place_market_order(req, target_ticker, db)
+
+        from main import engine, gateway, journal, accounts
+
+        # 대기열이 이미 꽉 찼으면 저널/DB에 쓰기 전에 바로 돌려보냄
+        if gateway.full():
+            raise gateway_error(GatewayFull())
 
+        # 1. 유효성 검증
+        if req.price is None or req.price <= 0 or req.quantity <= 0:
+            raise HTTPException(status_code=400, detail="가격과 수량은 양수여야 합니다.")
+        if req.order_type not in ("BUY", "SELL"):
+            raise HTTPException(status_code=400, detail="주문 종류는 BUY 또는 SELL이어야 합니다.")
+        if target_ticker not in engine.companies:
+            raise HTTPException(status_code=400, detail=f"존재하지 않는 종목입니다: {target_ticker}")
+
+        # 2. 자산 확인 + 잡아두기 (메모리에서 await 없이 한 번에, 동시에 들어온 주문끼리 같은 돈을 못 씀)
+        await accounts.ensure(db, req.user_id)
+        cost = req.price * req.quantity
         if req.order_type == "BUY":
-            total_cost = req.price * req.quantity
-            cursor = await db.execute("SELECT balance FROM users WHERE id = ?", (req.user_id,))
-            row = await cursor.fetchone()
-            if not row or row['balance'] < total_cost:
+            if not accounts.reserve_cash(req.user_id, cost):
                 raise HTTPException(status_code=400, detail="현금이 부족합니다.")
-            
-            # 매수: 미리 돈 차감 (Locking)
-            new_balance = row['balance'] - total_cost
-            await db.execute("UPDATE users SET balance = ? WHERE id = ?", (new_balance, req.user_id))
-                
-        elif req.order_type == "SELL":
-            cursor = await db.execute("SELECT quantity FROM holdings WHERE user_id = ? AND company_name = ?", (req.user_id, target_ticker))
-            row = await cursor.fetchone()
-            if not row or row['quantity'] < req.quantity:
-                raise HTTPException(status_code=400, detail="보유 주식이 부족합니다.")
-            
-            # 매도: 미리 주식 차감 (Locking)
-            new_qty = row['quantity'] - req.quantity
-            await db.execute("UPDATE holdings SET quantity = ? WHERE user_id = ? AND company_name = ?", (new_qty, req.user_id, target_ticker))
+        elif not accounts.reserve_shares(req.user_id, target_ticker, req.quantity):
+            raise HTTPException(status_code=400, detail="보유 주식이 부족합니다.")
 
-        # 2. DB에 'PENDING' 상태로 저장
-        cursor = await db.execute("""
-            INSERT INTO orders (user_id, company_name, order_type, price, quantity, status)
-            VALUES (?, ?, ?, ?, ?, 'PENDING')
-            RETURNING id
-        """, (req.user_id, target_ticker, req.order_type, req.price, req.quantity))
-        
-        order_row = await cursor.fetchone()
-        new_order_id = order_row[0]
-        await db.commit()
-        
-        # 엔진으로 주문 전송!
+        changes = []
+        new_order_id = None
+        # 이 주문의 저널 레코드가 DB에 반영될 때까지 저널 반영 위치를 잡아둠
+        pin = journal.pin()
         try:
-            from main import engine
-            
-            side = OrderSide.BUY if req.order_type == "BUY" else OrderSide.SELL
-            
-            user_order = Order(
-                agent_id=f"User_{req.user_id}",
-                ticker=target_ticker,
-                side=side,
-                order_type=OrderType.LIMIT,
-                quantity=req.quantity,
-                price=req.price
-            )
-            
-            engine.place_order(user_order)
-            print(f"🙋‍♂️ [사용자 주문] {target_ticker} {req.order_type} {req.quantity}주 @ {req.price}원 -> 엔진 전송 완료!")
-
-        except Exception as e:
-            print(f"⚠️ [전송 실패] 엔진 에러: {e}")
+            # 3. 저널에 먼저 기록하고 디스크에 남을 때까지 대기 (동시에 들어온 주문들과 fsync 한 번을 나눠 씀)
+            new_order_id = journal.next_order_id()
+            journal.append_order(new_order_id, req.user_id, target_ticker, req.order_type, "LIMIT", req.price, req.quantity)
+            await journal.commit()
+
+            # 4. DB에 반영: 'PENDING' 저장 + 자산 차감
+            await apply_order(db, new_order_id, req.user_id, target_ticker, req.order_type, req.price, req.quantity, changes)
+            await db.commit()
+        except Exception:
+            if new_order_id is not None:
+                # 저널에만 남은 주문이 재시작 때 살아나지 않게 취소로 기록 (디스크에 남을 때까지 대기)
+                journal.append_cancel(new_order_id, req.quantity)
+                await journal.commit()
+            # 접수와 취소가 같이 남았으므로 DB에 안 올라가도 재시작 결과가 같음
+            journal.unpin(pin)
+            raise
+        finally:
+            # 잡아둔 몫을 풀고 커밋된 차감을 반영 (await 없이 연달아 하므로 그 사이 빈틈이 없음)
+            if req.order_type == "BUY":
+                accounts.release_cash(req.user_id, cost)
+            else:
+                accounts.release_shares(req.user_id, target_ticker, req.quantity)
+        accounts.apply(changes)
+
+        # 5. 주문 창구를 거쳐 엔진으로 전송! (엔진 주문 ID = 저널/DB 주문 ID, 취소할 때 이 번호로 엔진에서 바로 찾음)
+        side = OrderSide.BUY if req.order_type == "BUY" else OrderSide.SELL
+        user_order = Order(
+            order_id=str(new_order_id),
+            agent_id=f"User_{req.user_id}",
+            ticker=target_ticker,
+            side=side,
+            order_type=OrderType.LIMIT,
+            quantity=req.quantity,
+            price=req.price
+        )
+        rejected = None
+        try:
+            result = await gateway.place_order(user_order)
+        except (GatewayFull, GatewayClosed) as e:
+            result, rejected = {"status": "REJECTED", "msg": str(e)}, e
+        if result.get("status") != "SUCCESS":
+            # 엔진이 받지 않은 주문은 취소로 기록하고 잡아둔 자산을 돌려줌
+            print(f"⚠️ [전송 실패] 엔진 에러: {result.get('msg')}")
+            journal.append_cancel(new_order_id, req.quantity)
+            await journal.commit()
+            changes = []
+            await apply_cancel(db, new_order_id, req.quantity, changes)
+            await db.commit()
+            accounts.apply(changes)
+            journal.unpin(pin)
+            if rejected is not None:
+                raise gateway_error(rejected)
+            raise HTTPException(status_code=400, detail=result.get("msg", "주문 실패"))
+        journal.unpin(pin)
+        print(f"🙋‍♂️ [사용자 주문] {target_ticker} {req.order_type} {req.quantity}주 @ {req.price}원 -> 엔진 전송 완료!")
 
         return {"status": "success", "order_id": new_order_id, "msg": "주문이 정상 접수되었습니다."}
 
@@ -402,8 +329,117 @@ async def place_order(req: OrderRequest):
         await db.rollback()
         print(f"❌ 주문 에러: {e}")
         raise HTTPException(status_code=500, detail="서버 에러")
+
+
+async def place_market_order(req: OrderRequest, target_ticker: str, db: aiosqlite.Connection):
+    """
+    [시장가 주문] 엔진이 반대편 호가를 보호 가격(현재가 ±5%)까지 바로 쓸어담고,
+    못 채운 수량은 즉시 취소됩니다. 체결된 만큼만 그 자리에서 정산하므로 정산 루프를 기다리지 않습니다.
+    저널에는 접수(ORDER) -> 체결(FILL, 엔진 구독자가 기록) -> 잔량 취소(CANCEL)가 한 번에 적히고,
+    DB 반영은 지정가 주문과 같은 projection 함수들을 씁니다. (자산은 보호 가격으로 잡았다가 체결가와의 차액을 돌려줌)
+    """
+    from main import engine, gateway, journal, accounts
+
+    if req.quantity <= 0:
+        raise HTTPException(status_code=400, detail="수량은 양수여야 합니다.")
+    if req.order_type not in ("BUY", "SELL"):
+        raise HTTPException(status_code=400, detail="주문 종류는 BUY 또는 SELL이어야 합니다.")
+    side = OrderSide.BUY if req.order_type == "BUY" else OrderSide.SELL
+    await accounts.ensure(db, req.user_id)
+
+    async def execute():
+        """주문 창구 작업 태스크에서 한 번에 실행 (중간에 다른 주문이 끼지 않으므로 미리 계산한 체결 결과가 실제 체결과 같음)"""
+        # 1. 지금 호가로 체결 가능한지 미리 계산하고 자산 확인 + 잡아두기
+        #    매수는 한계 가격 x 주문 수량(DB에 접수할 때 빼는 금액)을 잡고, 엔진도 그 가격 안에서만 체결하므로
+        #    호가가 미리 계산한 것과 달라져도 실제 체결 금액이 잡아둔 돈을 넘지 않음
+        quote = await engine.quote_market_async(target_ticker, side, req.quantity)
+        if quote["status"] != "SUCCESS":
+            raise HTTPException(status_code=400, detail=quote["msg"])
+        if quote["filled_quantity"] == 0:
+            raise HTTPException(status_code=400, detail="보호 가격 안에 체결 가능한 호가가 없습니다.")
+
+        if side == OrderSide.BUY:
+            if not accounts.reserve_cash(req.user_id, quote["limit_price"] * req.quantity):
+                raise HTTPException(status_code=400, detail="현금이 부족합니다.")
+        elif not accounts.reserve_shares(req.user_id, target_ticker, req.quantity):
+            raise HTTPException(status_code=400, detail="보유 주식이 부족합니다.")
+
+        # 2. 접수 기록 -> 엔진에서 즉시 체결 -> 남은 수량 취소 기록 (연달아 적어서 한 번에 fsync)
+        try:
+            new_order_id = journal.next_order_id()
+            # 접수/취소 레코드가 DB에 반영될 때까지 저널 반영 위치를 잡아둠 (엔진에서 실패하면 풀지 않고 재시작 때 취소 처리)
+            pin = journal.pin()
+            journal.append_order(new_order_id, req.user_id, target_ticker, req.order_type, "MARKET",
+                                 quote["limit_price"], req.quantity)
+            result = await engine.place_order_async(Order(
+                order_id=str(new_order_id),
+                agent_id=f"User_{req.user_id}",
+                ticker=target_ticker,
+                side=side,
+                order_type=OrderType.MARKET,
+                quantity=req.quantity,
+                price=quote["limit_price"],
+            ))
+            unfilled = result.get("unfilled_quantity", req.quantity)
+            if unfilled:
+                journal.append_cancel(new_order_id, unfilled)
+        except Exception:
+            release(quote)
+            raise
+        return quote, new_order_id, result, pin
+
+    def release(quote):
+        if side == OrderSide.BUY:
+            accounts.release_cash(req.user_id, quote["limit_price"] * req.quantity)
+        else:
+            accounts.release_shares(req.user_id, target_ticker, req.quantity)
+
+    try:
+        quote, new_order_id, result, pin = await gateway.call(execute)
+    except (GatewayFull, GatewayClosed) as e:
+        raise gateway_error(e)
+
+    changes = []
+    try:
+        reserve_price = quote["limit_price"]
+        unfilled = result.get("unfilled_quantity", req.quantity)
+        await journal.commit()
+        if result.get("status") != "SUCCESS":
+            # 체결 없이 접수와 취소만 남았으므로 DB에 안 올라가도 재시작 결과가 같음
+            journal.unpin(pin)
+            raise HTTPException(status_code=400, detail=result.get("msg", "시장가 주문 실패"))
+
+        filled = result["filled_quantity"]
+        total_cost = result["total_cost"]
+        avg_price = result["avg_price"]
+
+        # 3. DB 반영: 접수 -> 체결된 만큼 정산 -> 못 채운 수량 취소 (커밋 전이라 정산 루프에는 보이지 않음)
+        await apply_order(db, new_order_id, req.user_id, target_ticker, req.order_type,
+                          reserve_price, req.quantity, changes)
+        if filled > 0:
+            await settle_fills(db, [FillEvent(str(new_order_id), f"User_{req.user_id}", target_ticker,
+                                              req.order_type, avg_price, filled, unfilled)], changes)
+        if unfilled:
+            await apply_cancel(db, new_order_id, unfilled, changes)
+        await db.commit()
+        journal.unpin(pin)
     finally:
-        await db.close()
+        release(quote)
+    accounts.apply(changes)
+    print(f"⚡ [시장가 주문] {target_ticker} {req.order_type} {filled}/{req.quantity}주 체결 (평균 {avg_price}원)")
+
+    return {
+        "status": "success",
+        "order_id": new_order_id,
+        "filled_quantity": filled,
+        "unfilled_quantity": unfilled,
+        "avg_price": avg_price,
+        "total_cost": total_cost,
+        "msg": "시장가 주문이 체결되었습니다." if unfilled == 0
+               else f"{filled}주 체결, 나머지 {unfilled}주는 보호 가격을 넘어 취소되었습니다.",
+    }
+
+
 @router.get("/orders/{user_id}")
 async def get_my_orders(user_id: int, db: aiosqlite.Connection = Depends(get_db_connection)):
     """
@@ -411,7 +447,7 @@ async def get_my_orders(user_id: int, db: aiosqlite.Connection = Depends(get_db_
     반드시 '아직 체결되지 않은(PENDING)' 주문만 가져와야 합니다.
     """
     cursor = await db.execute("""
-        SELECT id, company_name, order_type, price, quantity, created_at, status
+        SELECT id, company_name, order_type, price, quantity, filled_quantity, avg_fill_price, created_at, status
         FROM orders 
         WHERE user_id = ? AND status = 'PENDING' 
         ORDER BY created_at DESC
@@ -420,6 +456,17 @@ async def get_my_orders(user_id: int, db: aiosqlite.Connection = Depends(get_db_
     rows = await cursor.fetchall()
     return [dict(row) for row in rows]
 
+@router.get("/history/{user_id}")
+async def get_my_history(user_id: int, limit: int = 50, before_id: Optional[int] = None,
+                         db: aiosqlite.Connection = Depends(get_db_connection)):
+    """
+    [거래 내역 조회] 최신순, 거래마다 직후 거래 금액 누계(txn_total) 포함
+    txn_total은 거래 내역(transactions) 금액만 더한 값입니다. 지정가/시장가 주문 정산은 빠지므로 잔액으로 쓰지 마세요.
+    (현재 잔액은 /user/{user_id})
+    다음 페이지는 응답의 next_before_id를 before_id로 넘겨서 요청합니다. (오래된 내역은 보관 파일에서 읽음)
+    """
+    return await user_history(db, user_id, max(1, min(limit, 500)), before_id)
+
 @router.delete("/order/{order_id}")
 async def cancel_order(order_id: int, db: aiosqlite.Connection = Depends(get_db_connection)):
     """
@@ -454,24 +501,58 @@ async def cancel_order(order_id: int, db: aiosqlite.Connection = Depends(get_db_
             print(f"🚫 [거절] 상태가 PENDING이 아니라서 취소 불가. (현재: {current_status})")
             raise HTTPException(status_code=400, detail=f"취소 불가: 현재 상태가 '{current_status}' 입니다.")
             
-        # 3. 환불 절차
-        user_id = order['user_id']
-        price = order['price']
-        quantity = order['quantity']
-        
+        # 3. 저널에 취소 기록 -> 디스크에 남은 뒤에 엔진 호가창에서 뺌 (아직 체결 안 된 잔량)
+        #    잔량 확인 -> 기록 -> 취소를 주문 창구에서 한 번에 실행해서 그 사이에 체결이 끼지 않고,
+        #    fsync가 실패하면 주문은 호가창에 그대로 남습니다. (다시 넣을 필요 없음)
+        #    이미 체결된 몫은 정산 루프가 CANCELLED 주문도 마저 정산합니다.
+        from main import engine, gateway, journal, accounts
+
+        async def cancel_live() -> Optional[tuple]:
+            live_order = await engine.get_order_async(str(order_id))
+            if live_order is None:
+                return None
+            pin = journal.pin()
+            try:
+                journal.append_cancel(order_id, live_order.quantity)
+                await journal.commit()
+                await engine.cancel_order_async(str(order_id))
+            except BaseException:
+                # 실패한 취소 기록은 저널에서 버려지므로 잡아둘 것이 없음
+                journal.unpin(pin)
+                raise
+            return live_order, pin
+
+        try:
+            cancelled = await gateway.call(cancel_live)
+        except (GatewayFull, GatewayClosed) as e:
+            raise gateway_error(e)
+        if cancelled is None:
+            print(f"🚫 [거절] 엔진에 대기 중인 주문이 없습니다. (이미 체결됨)")
+            raise HTTPException(status_code=400, detail="취소 불가: 이미 체결된 주문입니다.")
+        live_order, pin = cancelled
+        quantity = live_order.quantity
+
+        # 4. 상태 변경 + 환불 (잔량만)
+        try:
+            changes = []
+            await apply_cancel(db, order_id, quantity, changes)
+            await db.commit()
+        except Exception:
+            # DB에는 아직 PENDING이므로 엔진에도 다시 올려서 맞춤
+            # (그 전에 죽으면 재시작 때 저널의 취소 기록이 DB에 반영되고, 호가창 복구에서도 빠짐)
+            try:
+                await gateway.place_order(live_order)
+            except Exception as e:
+                print(f"⚠️ [취소 복구 실패] 주문 {order_id}를 엔진에 다시 올리지 못했습니다: {e}")
+            raise
+        finally:
+            journal.unpin(pin)
+        accounts.apply(changes)
         if order['order_type'] == 'BUY':
-            refund = price * quantity
-            await db.execute("UPDATE users SET balance = balance + ? WHERE id = ?", (refund, user_id))
-            print(f"💰 [환불] 유저 {user_id}에게 {refund}원 환불 완료")
-            
+            print(f"💰 [환불] 유저 {order['user_id']}에게 {order['price'] * quantity}원 환불 완료")
         elif order['order_type'] == 'SELL':
-            await db.execute("UPDATE holdings SET quantity = quantity + ? WHERE user_id = ? AND company_name = ?", (quantity, user_id, order['company_name']))
-            print(f"📦 [반환] 유저 {user_id}에게 {order['company_name']} {quantity}주 반환 완료")
-            
-        # 4. 상태 변경
-        await db.execute("UPDATE orders SET status = 'CANCELLED' WHERE id = ?", (order_id,))
-        await db.commit()
-        
+            print(f"📦 [반환] 유저 {order['user_id']}에게 {order['company_name']} {quantity}주 반환 완료")
+
         print("✅ [성공] 주문 취소 및 환불 완료\n")
         return {"status": "success", "message": "주문이 취소되었습니다."}
         
@@ -493,6 +574,7 @@ async def process_market_price_change(company_name: str, current_price: float, d
     - 매도 주문: 지정가 <= 현재가 (비싸게 팔았으니 이득, 체결)
     """
     processed_count = 0
+    changes = []  # 커밋 후 계좌 저장소(메모리)에도 반영
     
     try:
         await db.execute("BEGIN IMMEDIATE")
@@ -519,12 +601,14 @@ async def process_market_price_change(company_name: str, current_price: float, d
             else:
                 await db.execute("INSERT INTO holdings (user_id, company_name, quantity, average_price) VALUES (?, ?, ?, ?)", (order['user_id'], company_name, order['quantity'], order['price']))
             
+            changes.append((order['user_id'], 0, company_name, order['quantity']))
+            
             # 주문 완료 처리
             await db.execute("UPDATE orders SET status = 'FILLED' WHERE id = ?", (order['id'],))
             
             # 거래 기록 남기기
-            await db.execute("INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description) VALUES (?, 'BUY', ?, 0, ?)", 
-                             (order['user_id'], -(order['price'] * order['quantity']), f"{company_name} {order['quantity']}주 지정가 체결"))
+            await db.execute("INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description) VALUES (?, 'BUY', ?, (SELECT balance FROM users WHERE id = ?), ?)",
+                             (order['user_id'], -(order['price'] * order['quantity']), order['user_id'], f"{company_name} {order['quantity']}주 지정가 체결"))
             processed_count += 1
 
         # 2. 체결 가능한 매도 주문 찾기 (내가 건 가격보다 현재가가 비싸거나 같으면 체결)
@@ -538,16 +622,19 @@ async def process_market_price_change(company_name: str, current_price: float, d
             # 판매 대금 지급
             income = order['price'] * order['quantity']
             await db.execute("UPDATE users SET balance = balance + ? WHERE id = ?", (income, order['user_id']))
+            changes.append((order['user_id'], income, None, 0))
             
             # 주문 완료 처리
             await db.execute("UPDATE orders SET status = 'FILLED' WHERE id = ?", (order['id'],))
             
             # 거래 기록
-            await db.execute("INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description) VALUES (?, 'SELL', ?, 0, ?)",
-                             (order['user_id'], income, f"{company_name} {order['quantity']}주 지정가 체결"))
+            await db.execute("INSERT INTO transactions (user_id, transaction_type, amount, balance_after, description) VALUES (?, 'SELL', ?, (SELECT balance FROM users WHERE id = ?), ?)",
+                             (order['user_id'], income, order['user_id'], f"{company_name} {order['quantity']}주 지정가 체결"))
             processed_count += 1
             
         await db.commit()
+        from main import accounts
+        accounts.apply(changes)
         return {"status": "success", "message": f"{processed_count}건의 주문이 체결되었습니다."}
         
     except Exception as e:
@@ -555,13 +642,12 @@ async def process_market_price_change(company_name: str, current_price: float, d
         raise HTTPException(500, str(e))
     
 # 🛑 [검문소 함수] 레벨 체크 디펜던시
-async def verify_level_5(db: aiosqlite.Connection = Depends(get_db_connection)):
+def verify_level_5():
+    """호가창 잠금 확인 (레벨은 계좌 저장소에 올라와 있는 값으로, 요청마다 DB를 읽지 않음)"""
+    from main import accounts
     user_id = 1  # (테스트용 고정 ID)
-    cursor = await db.execute("SELECT level FROM users WHERE id = ?", (user_id,))
-    row = await cursor.fetchone()
-    
-    current_level = row[0] if row else 1
-    
+    current_level = accounts.level_of(user_id)
+
     if current_level < 5:
         # 🚫 레벨 부족하면 403 에러 발생!
         raise HTTPException(
@@ -574,15 +660,15 @@ async def verify_level_5(db: aiosqlite.Connection = Depends(get_db_connection)):
 @router.get("/orderbook/{company_name}")
 async def get_order_book(
     company_name: str, 
+    levels: int = 10,
     is_authorized: bool = Depends(verify_level_5) # 👈 여기서 검사!
 ):
     """
     [호가창 조회]
     레벨 5 이상인 유저만 주식의 매수/매도 대기 물량을 볼 수 있습니다.
+    엔진 장부를 가격대별로 묶은 상위 levels칸 (asks: 낮은 가격부터, bids: 높은 가격부터), 틱마다 한 번만 새로 만듭니다.
     """
-    # (여기서는 실제 호가 데이터 대신 더미 데이터 반환)
-    return {
-        "company": company_name,
-        "asks": [{"price": 81000, "qty": 10}, {"price": 82000, "qty": 50}], # 팔려는 사람
-        "bids": [{"price": 79000, "qty": 20}, {"price": 78000, "qty": 100}] # 살려는 사람
-    }
\ No newline at end of file
+    from main import engine, order_book_snapshot, ORDER_BOOK_MAX_LEVELS
+    if company_name not in engine.companies:
+        raise HTTPException(status_code=404, detail=f"존재하지 않는 종목입니다: {company_name}")
+    return await order_book_snapshot(company_name, max(1, min(levels, ORDER_BOOK_MAX_LEVELS)))
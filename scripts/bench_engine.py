@@ -0,0 +1,209 @@
+# scripts/bench_engine.py
+# 매칭 엔진 처리량/지연시간 벤치마크
+# - 합성 주문 흐름(호가 깊이, 체결 비율, 종목 수, 주문 구성)을 place_order로 흘려보내고
+#   초당 주문 수, 주문당 매칭 지연(p50/p99/p999), 최대 메모리를 측정합니다.
+# - 결과를 JSON으로 저장해서 커밋 간 성능 변화를 비교할 수 있습니다.
+#
+# 실행 예:
+#   python scripts/bench_engine.py --depth 10000 --orders 50000 --out bench.json
+#   python scripts/bench_engine.py --compare bench.json      (이전 결과와 비교)
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_engine import MarketEngine
+from domain_models import Company, Order, OrderSide, OrderType
+from order_book import EngineOrder
+
+MID_PRICE = 1000
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="MarketEngine 처리량/지연시간 벤치마크")
+    p.add_argument("--depth", type=int, default=10000, help="종목당 미리 깔아둘 대기 주문 수")
+    p.add_argument("--orders", type=int, default=50000, help="측정할 주문 수")
+    p.add_argument("--tickers", type=int, default=4, help="종목 수")
+    p.add_argument("--cross-rate", type=float, default=0.3, help="반대편 호가를 넘어서 바로 체결되는 지정가 주문 비율")
+    p.add_argument("--market-rate", type=float, default=0.0, help="시장가 주문 비율")
+    p.add_argument("--cancel-rate", type=float, default=0.0, help="주문 대신 기존 대기 주문을 취소하는 비율")
+    p.add_argument("--model", choices=["engine", "pydantic"], default="engine",
+                   help="주문 객체 종류 (engine: EngineOrder 핫패스, pydantic: API 경계의 Order 변환 포함)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", help="결과 JSON 저장 경로")
+    p.add_argument("--compare", help="비교할 이전 결과 JSON 경로")
+    return p.parse_args(argv)
+
+
+def new_order(model, ticker, side, order_type, quantity, price=None, order_id=None):
+    if model == "pydantic":
+        return Order(agent_id="Bench", ticker=ticker, side=side, order_type=order_type,
+                     quantity=quantity, price=price)
+    return EngineOrder("Bench", ticker, side, quantity, price, order_type, order_id)
+
+
+def make_order(rng, model, ticker, crossing, order_id=None):
+    side = rng.choice([OrderSide.BUY, OrderSide.SELL])
+    if crossing:
+        price = MID_PRICE + 300 if side == OrderSide.BUY else MID_PRICE - 300
+    elif side == OrderSide.BUY:
+        price = MID_PRICE - rng.randint(1, 200)
+    else:
+        price = MID_PRICE + rng.randint(1, 200)
+    return new_order(model, ticker, side, OrderType.LIMIT, rng.randint(1, 5), float(price), order_id)
+
+
+def build_workload(args):
+    """
+    측정 전에 주문 객체를 모두 만들어 둡니다. (모델 생성 비용은 측정에서 제외)
+    flow의 각 항목은 ("place", Order) 또는 ("cancel", 취소할 주문의 order_id)
+    """
+    rng = random.Random(args.seed)
+    tickers = [f"BENCH{i:03d}" for i in range(args.tickers)]
+
+    resting = [make_order(rng, args.model, t, crossing=False) for t in tickers for _ in range(args.depth)]
+
+    flow = []
+    placed = []
+    for _ in range(args.orders):
+        r = rng.random()
+        ticker = rng.choice(tickers)
+        if r < args.cancel_rate and placed:
+            flow.append(("cancel", placed[rng.randrange(len(placed))]))
+        elif r < args.cancel_rate + args.market_rate:
+            side = rng.choice([OrderSide.BUY, OrderSide.SELL])
+            flow.append(("place", new_order(args.model, ticker, side, OrderType.MARKET, rng.randint(1, 5))))
+        else:
+            crossing = rng.random() < args.cross_rate
+            # 취소 대상으로 쓰려면 ID를 미리 알아야 하므로 EngineOrder에도 ID를 붙여둠
+            flow.append(("place", make_order(rng, args.model, ticker, crossing, order_id=f"F{len(flow)}")))
+            placed.append(flow[-1][1].order_id)
+    return tickers, resting, flow
+
+
+def new_engine(tickers):
+    engine = MarketEngine()
+    for t in tickers:
+        engine.add_company(Company(ticker=t, name=t, sector="Bench", description="Bench",
+                                   current_price=float(MID_PRICE)))
+    return engine
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[idx]
+
+
+def run(args):
+    tickers, resting, flow = build_workload(args)
+
+    # 1. 처리량 / 지연시간
+    engine = new_engine(tickers)
+    latencies = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        engine.place_orders(resting)
+        clock = time.perf_counter_ns
+        start = clock()
+        for op, item in flow:
+            t0 = clock()
+            if op == "place":
+                engine.place_order(item)
+            else:
+                engine.cancel_order(item)
+            latencies.append(clock() - t0)
+        elapsed_ns = clock() - start
+    latencies.sort()
+    fills = engine.trade_logs.total
+
+    # 2. 최대 메모리 (tracemalloc은 느려지므로 따로 한 번 더 돌림)
+    _, resting, flow = build_workload(args)
+    tracemalloc.start()
+    engine = new_engine(tickers)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        engine.place_orders(resting)
+        for op, item in flow:
+            if op == "place":
+                engine.place_order(item)
+            else:
+                engine.cancel_order(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {
+            "orders": len(flow),
+            "fills": fills,
+            "orders_per_sec": round(len(flow) / (elapsed_ns / 1e9), 1),
+            "latency_us": {
+                "p50": round(percentile(latencies, 0.50) / 1000, 2),
+                "p99": round(percentile(latencies, 0.99) / 1000, 2),
+                "p999": round(percentile(latencies, 0.999) / 1000, 2),
+                "max": round(latencies[-1] / 1000, 2) if latencies else 0.0,
+            },
+            "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(report, baseline=None):
+    r = report["results"]
+    b = baseline["results"] if baseline else None
+
+    def line(label, value, base_value, unit, higher_is_better):
+        text = f"{label:>16}: {value:>12,.2f} {unit}"
+        if base_value:
+            change = (value - base_value) / base_value * 100
+            better = change > 0 if higher_is_better else change < 0
+            mark = "" if abs(change) < 0.05 else ("👍" if better else "👎")
+            text += f"   ({change:+.1f}% {mark} vs {base_value:,.2f})"
+        print(text)
+
+    print(f"=== ⏱️ 엔진 벤치마크 (commit {report['env']['commit']}) ===")
+    print(f"  params: {report['params']}")
+    print(f"  orders: {r['orders']:,}  fills: {r['fills']:,}")
+    line("orders/sec", r["orders_per_sec"], b and b["orders_per_sec"], "", True)
+    for q in ("p50", "p99", "p999"):
+        line(f"latency {q}", r["latency_us"][q], b and b["latency_us"][q], "µs", False)
+    line("peak memory", r["peak_memory_mb"], b and b["peak_memory_mb"], "MB", False)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 결과 저장: {args.out}")
@@ -0,0 +1,107 @@
+# scripts/bench_order_book.py
+# 오더북 깊이(대기 주문 수)에 따라 매칭 시간이 어떻게 변하는지 측정합니다.
+# 실행: python scripts/bench_order_book.py
+import os
+import sys
+import time
+import random
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_engine import MarketEngine
+from domain_models import Order, OrderSide, OrderType
+
+TICKER = "IT008"
+DEPTHS = [100, 1000, 10000, 50000]
+ROUNDS = 2000
+
+
+def legacy_match(book):
+    """기존 방식 (매 루프마다 정렬 + pop(0)) - 비교용"""
+    while book["BUY"] and book["SELL"]:
+        book["BUY"].sort(key=lambda x: x.price, reverse=True)
+        book["SELL"].sort(key=lambda x: x.price)
+        best_buy, best_sell = book["BUY"][0], book["SELL"][0]
+        if best_buy.price < best_sell.price:
+            break
+        qty = min(best_buy.quantity, best_sell.quantity)
+        best_buy.quantity -= qty
+        best_sell.quantity -= qty
+        if best_buy.quantity == 0:
+            book["BUY"].pop(0)
+        if best_sell.quantity == 0:
+            book["SELL"].pop(0)
+
+
+def make_orders(depth):
+    """체결되지 않는 대기 주문(depth개)과, 하나씩 체결되는 주문(ROUNDS개)을 만듭니다."""
+    rng = random.Random(depth)
+    resting = []
+    for _ in range(depth // 2):
+        resting.append(Order(agent_id="Bench", ticker=TICKER, side=OrderSide.BUY,
+                             order_type=OrderType.LIMIT, quantity=1, price=float(rng.randint(500, 999))))
+        resting.append(Order(agent_id="Bench", ticker=TICKER, side=OrderSide.SELL,
+                             order_type=OrderType.LIMIT, quantity=1, price=float(rng.randint(1001, 1500))))
+    # 매수 1주 -> 최저 매도가에 체결, 이어서 같은 가격대에 매도 1주를 다시 걸어 깊이를 유지
+    flow = []
+    for _ in range(ROUNDS):
+        flow.append(Order(agent_id="Bench", ticker=TICKER, side=OrderSide.BUY,
+                          order_type=OrderType.LIMIT, quantity=1, price=2000.0))
+        flow.append(Order(agent_id="Bench", ticker=TICKER, side=OrderSide.SELL,
+                          order_type=OrderType.LIMIT, quantity=1, price=float(rng.randint(1001, 1500))))
+    return resting, flow
+
+
+def bench_engine(depth):
+    resting, flow = make_orders(depth)
+    engine = MarketEngine()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for o in resting:
+            engine.place_order(o)
+        start = time.perf_counter()
+        for o in flow:
+            engine.place_order(o)
+        elapsed = time.perf_counter() - start
+    return elapsed / len(flow) * 1e6
+
+
+def bench_legacy(depth):
+    resting, flow = make_orders(depth)
+    book = {"BUY": [], "SELL": []}
+    for o in resting:
+        book[o.side.value].append(o)
+    start = time.perf_counter()
+    for o in flow:
+        book[o.side.value].append(o)
+        legacy_match(book)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(flow) * 1e6
+
+
+def bench_batch(depth, batch_size):
+    """같은 주문 흐름을 batch_size개씩 place_orders로 제출"""
+    resting, flow = make_orders(depth)
+    engine = MarketEngine()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        engine.place_orders(resting)
+        start = time.perf_counter()
+        for i in range(0, len(flow), batch_size):
+            engine.place_orders(flow[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+    return elapsed / len(flow) * 1e6
+
+
+if __name__ == "__main__":
+    print("=== ⏱️ 오더북 깊이별 주문당 매칭 시간 (µs) ===")
+    print(f"{'depth':>8} | {'price-level book':>16} | {'legacy sort':>12}")
+    for depth in DEPTHS:
+        new_us = bench_engine(depth)
+        # 기존 방식은 깊은 장부에서 너무 느려서 10000건까지만 측정
+        legacy_us = bench_legacy(depth) if depth <= 10000 else float('nan')
+        print(f"{depth:>8} | {new_us:>16.2f} | {legacy_us:>12.2f}")
+
+    print("\n=== 📦 배치 제출(place_orders) 주문당 시간 (µs, depth=10000) ===")
+    print(f"{'batch':>8} | {'µs/order':>10}")
+    for batch_size in [1, 10, 100, 1000]:
+        print(f"{batch_size:>8} | {bench_batch(10000, batch_size):>10.2f}")
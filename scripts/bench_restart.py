@@ -0,0 +1,128 @@
+# scripts/bench_restart.py
+# 재시작 복구 시간 측정: PENDING 주문 N건이 쌓인 DB에서 엔진 호가창을 다시 만드는 데 걸리는 시간
+# - DB 읽기(+EngineOrder 변환)와 엔진 적재 시간을 나눠서 보여주고,
+#   --budget 초를 넘으면 종료 코드 1로 끝납니다. (CI에서 복구 시간 상한 확인용)
+# - 비교용으로 같은 주문을 place_order로 하나씩 넣는 시간도 --compare-place로 잴 수 있습니다.
+#
+# 실행 예:
+#   python scripts/bench_restart.py                      (100만 건, 상한 20초)
+#   python scripts/bench_restart.py --orders 200000 --compare-place
+import os
+import sys
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite
+from domain_models import Company, OrderSide, OrderType
+from market_engine import MarketEngine
+from migrations import migrate
+from order_book import EngineOrder
+from recovery import restore_order_books
+
+MID_PRICE = 70000
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="재시작 복구(대기 주문 -> 호가창) 시간 측정")
+    p.add_argument("--orders", type=int, default=1_000_000, help="DB에 쌓아둘 PENDING 주문 수")
+    p.add_argument("--tickers", type=int, default=4, help="종목 수")
+    p.add_argument("--levels", type=int, default=2000, help="방향별 가격 칸 수")
+    p.add_argument("--budget", type=float, default=20.0, help="복구 시간 상한 (초)")
+    p.add_argument("--compare-place", action="store_true", help="place_order로 하나씩 넣는 시간도 측정")
+    p.add_argument("--seed", type=int, default=42)
+    return p.parse_args(argv)
+
+
+def tickers_of(args):
+    return [f"BENCH{i:03d}" for i in range(args.tickers)]
+
+
+def new_engine(tickers):
+    engine = MarketEngine()
+    for t in tickers:
+        engine.add_company(Company(ticker=t, name=t, sector="Bench", description="Bench",
+                                   current_price=float(MID_PRICE)))
+    return engine
+
+
+def build_db(path, args):
+    """교차하지 않는 대기 주문 N건 (매수는 현재가 아래, 매도는 위)"""
+    asyncio.run(_migrate(path))
+    rng = random.Random(args.seed)
+    tickers = tickers_of(args)
+
+    def rows():
+        for i in range(args.orders):
+            side = "BUY" if i % 2 == 0 else "SELL"
+            offset = rng.randint(1, args.levels) * 10
+            price = MID_PRICE - offset if side == "BUY" else MID_PRICE + offset
+            yield (rng.randint(1, 1000), tickers[i % len(tickers)], side, price, rng.randint(1, 10), "PENDING")
+
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO orders (user_id, company_name, order_type, price, quantity, status) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows())
+    conn.commit()
+    conn.close()
+
+
+async def _migrate(path):
+    async with aiosqlite.connect(path) as db:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            await migrate(db)
+
+
+async def bench_restore(path, tickers):
+    engine = new_engine(tickers)
+    async with aiosqlite.connect(path) as db:
+        stats = await restore_order_books(engine, db)
+    return engine, stats
+
+
+def bench_place(path, tickers):
+    """비교용: 같은 주문을 place_order로 하나씩 (주문마다 매칭 시도)"""
+    engine = new_engine(tickers)
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT id, user_id, company_name, order_type, price, quantity FROM orders "
+                        "WHERE status = 'PENDING' ORDER BY id").fetchall()
+    conn.close()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for order_id, user_id, ticker, side, price, qty in rows:
+            engine.place_order(EngineOrder(f"User_{user_id}", ticker, OrderSide(side), qty,
+                                           price, OrderType.LIMIT, str(order_id)))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    tickers = tickers_of(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "restart.db")
+        print(f"🔨 대기 주문 {args.orders:,}건 DB 생성 중...")
+        build_db(path, args)
+
+        engine, stats = asyncio.run(bench_restore(path, tickers))
+        total_s = stats["total_ms"] / 1000
+        depth = sum(len(b.bids) + len(b.asks) for b in engine.order_books.values())
+
+        print(f"=== ♻️ 재시작 복구 ({args.orders:,}건, 종목 {args.tickers}개) ===")
+        print(f"  복구된 주문: {stats['loaded']:,} (엔진 장부 {depth:,})  건너뜀: {stats['skipped']:,}")
+        print(f"  DB 읽기+변환: {stats['read_ms']:>10,.1f} ms")
+        print(f"  엔진 적재:     {stats['load_ms']:>10,.1f} ms")
+        print(f"  전체:          {stats['total_ms']:>10,.1f} ms  ({stats['loaded'] / max(total_s, 1e-9):,.0f} 건/초)")
+
+        if args.compare_place:
+            place_s = bench_place(path, tickers)
+            print(f"  (비교) place_order 하나씩: {place_s * 1000:,.1f} ms")
+
+    if total_s > args.budget:
+        print(f"❌ 복구 시간 {total_s:.1f}초가 상한 {args.budget:.1f}초를 넘었습니다.")
+        sys.exit(1)
+    print(f"✅ 상한 {args.budget:.1f}초 이내")
@@ -0,0 +1,69 @@
+# scripts/bench_tick_store.py
+# 틱 저장소 쓰기/구간 읽기 벤치마크
+# - 합성 틱 N개를 임시 폴더의 틱 저장소에 쓰고, 전체 읽기와 무작위 구간 읽기 시간을 잽니다.
+# - numpy가 있으면 읽기 결과가 mmap을 그대로 보는 배열(복사 없음), 없으면 array.array 복사본입니다.
+#
+# 실행 예:
+#   python scripts/bench_tick_store.py --ticks 5000000 --queries 200
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tick_store import TickStore, np
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="틱 저장소 쓰기/구간 읽기 벤치마크")
+    p.add_argument("--ticks", type=int, default=5_000_000, help="쓸 틱 수")
+    p.add_argument("--queries", type=int, default=200, help="무작위 구간 읽기 횟수")
+    p.add_argument("--span", type=int, default=100_000, help="구간 읽기 한 번의 평균 틱 수")
+    p.add_argument("--seed", type=int, default=42)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as d:
+        store = TickStore(d).open()
+        series = store.series("BENCH")
+        # 1초에 1000틱씩 (1ms 간격)
+        base = time.time_ns()
+        series._buf["ts"] = array("q", range(base, base + args.ticks * 1_000_000, 1_000_000))
+        series._buf["px"] = array("d", (1000.0 + rng.randint(-50, 50) for _ in range(args.ticks)))
+        series._buf["qty"] = array("q", (rng.randint(1, 10) for _ in range(args.ticks)))
+
+        started = time.perf_counter()
+        store.flush()
+        write_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        everything = store.read("BENCH")
+        full_ms = (time.perf_counter() - started) * 1000
+
+        lat = []
+        total = 0
+        for _ in range(args.queries):
+            lo = base + rng.randrange(args.ticks) * 1_000_000
+            hi = lo + rng.randint(1, 2 * args.span) * 1_000_000
+            started = time.perf_counter()
+            total += len(store.read("BENCH", lo, hi).timestamp)
+            lat.append((time.perf_counter() - started) * 1000)
+        lat.sort()
+        store.close()
+
+    print(f"📼 틱 {args.ticks:,}개 (세그먼트 {len(series.segments)}개, numpy={'있음' if np is not None else '없음'})")
+    print(f"  쓰기: {write_s:.2f}s ({args.ticks / write_s:,.0f} ticks/s)")
+    print(f"  전체 읽기: {full_ms:,.1f}ms ({len(everything.timestamp):,}개)")
+    print(f"  구간 읽기 {args.queries}회 (평균 {total // max(1, args.queries):,}개): "
+          f"p50 {lat[len(lat) // 2]:.2f}ms / p99 {lat[min(len(lat) - 1, int(len(lat) * 0.99))]:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# scripts/check_query_plans.py
+# 자주 쓰는 쿼리(migrations.HOT_QUERIES)가 인덱스를 타는지 검사합니다.
+# 하나라도 풀 스캔이면 종료 코드 1 (CI나 스키마 변경 후 확인용)
+#
+# 실행 예:
+#   python scripts/check_query_plans.py                  (빈 임시 DB에 마이그레이션 후 검사)
+#   python scripts/check_query_plans.py stock_game.db    (실제 DB 파일 검사, 마이그레이션도 적용됨)
+import os
+import sys
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite
+from migrations import check_query_plans, migrate
+
+
+async def main(path: str) -> int:
+    async with aiosqlite.connect(path) as db:
+        version = await migrate(db)
+        problems = await check_query_plans(db)
+
+    print(f"=== 🔍 쿼리 플랜 검사 (스키마 v{version}) ===")
+    if problems:
+        for problem in problems:
+            print(f"❌ 풀 스캔: {problem}")
+        return 1
+    print("✅ 모든 핫 쿼리가 인덱스를 사용합니다.")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(asyncio.run(main(sys.argv[1])))
+    with tempfile.TemporaryDirectory() as tmp:
+        sys.exit(asyncio.run(main(os.path.join(tmp, "plan_check.db"))))
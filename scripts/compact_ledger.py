@@ -0,0 +1,36 @@
+# scripts/compact_ledger.py
+# 거래 원장(transactions) 정리: 유저별 잔액 체크포인트를 찍고, 오래된 거래를 gzip 세그먼트 파일로 옮깁니다.
+# (서버 틱 루프에서도 LEDGER_COMPACT_INTERVAL초마다 자동 실행됨)
+# 실행: python scripts/compact_ledger.py [DB 경로] [--days 30] [--min-rows 100]
+import os
+import sys
+import asyncio
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import database
+from ledger import ARCHIVE_AFTER_DAYS, CHECKPOINT_MIN_ROWS, LEDGER_ARCHIVE_DIR, compact_ledger
+from migrations import migrate
+
+
+async def main(path: str, days: int, min_rows: int, archive_dir: str):
+    db = await database.connect(path)
+    try:
+        await migrate(db)
+        result = await compact_ledger(db, min_rows, days, archive_dir)
+    finally:
+        await db.close()
+    print(f"✅ 체크포인트 {result['checkpoints']}개, 거래 {result['archived']:,}건 보관 "
+          f"(세그먼트 {result['segments']}개 -> {archive_dir})")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="거래 원장 체크포인트 + 오래된 거래 보관")
+    p.add_argument("path", nargs="?", default=os.path.join(BASE_DIR, "stock_game.db"))
+    p.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="이보다 오래된 거래를 보관")
+    p.add_argument("--min-rows", type=int, default=CHECKPOINT_MIN_ROWS, help="새 체크포인트를 찍을 최소 거래 수")
+    p.add_argument("--archive-dir", default=os.path.join(BASE_DIR, LEDGER_ARCHIVE_DIR))
+    args = p.parse_args()
+    asyncio.run(main(args.path, args.days, args.min_rows, args.archive_dir))
@@ -1,35 +1,12 @@
-import sqlite3
+# 스키마는 이제 migrations.py가 관리합니다. (이 스크립트의 테이블/컬럼은 마이그레이션으로 옮겨짐)
+# 예전처럼 실행해도 되도록 마이그레이션 실행기로 연결해 둡니다.
 import os
+import sys
+import asyncio
 
-# DB 파일이 있는 경로 (현재 폴더의 stock_game.db)
-db_path = "../stock_game.db"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+from migrate_db import BASE_DIR, main
 
-print("🔨 랭킹 스냅샷 테이블 생성을 시작합니다...")
-
-# 1. 기존 테이블이 있다면 삭제 (깨끗하게 다시 만들기 위해)
-cursor.execute("DROP TABLE IF EXISTS ranking_snapshot")
-
-# 2. 테이블 새로 만들기
-cursor.execute("""
-    CREATE TABLE ranking_snapshot (
-        rank INTEGER,
-        user_id INTEGER,
-        username TEXT,
-        total_asset REAL,
-        profit_rate REAL,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-""")
-
-# 3. 테스트용 데이터 하나 넣기 (서버 켜자마자 잘 나오나 보려고)
-cursor.execute("""
-    INSERT INTO ranking_snapshot (rank, user_id, username, total_asset, profit_rate)
-    VALUES (1, 999, '테스트유저', 1500000, 50.0)
-""")
-
-conn.commit()
-conn.close()
-print("✅ 테이블 생성 완료! 이제 에러가 사라질 겁니다.")
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main(os.path.join(BASE_DIR, "stock_game.db")))
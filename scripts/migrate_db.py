@@ -0,0 +1,22 @@
+# scripts/migrate_db.py
+# DB 스키마를 최신 버전으로 올립니다. (서버 시작 시 init_db에서도 자동 실행됨)
+# 실행: python scripts/migrate_db.py [DB 경로, 기본값 stock_game.db]
+import os
+import sys
+import asyncio
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import aiosqlite
+from migrations import migrate
+
+
+async def main(path: str):
+    async with aiosqlite.connect(path) as db:
+        version = await migrate(db)
+    print(f"✅ 스키마 최신 버전: v{version} ({path})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(BASE_DIR, "stock_game.db")))
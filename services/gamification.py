@@ -1,9 +1,5 @@
 from datetime import datetime
-import aiosqlite
-import os
-
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "stock_game.db")
+from database import db_connection
 
 # 레벨업에 필요한 경험치 테이블 (예: 1->2 가는데 100 필요)
 LEVEL_TABLE = {
@@ -15,77 +11,97 @@ LEVEL_TABLE = {
 }
 
 #max_level 파라미터 추가
-async def gain_exp(user_id: int, amount: int, max_level: int = None):
+async def gain_exp(user_id: int, amount: int, max_level: int = None, db=None):
     """
     유저에게 경험치를 지급하고, 레벨업 조건을 체크합니다.
     max_level이 설정된 경우, 해당 레벨 이상이면 경험치를 지급하지 않습니다.
+    db: 호출한 쪽(라우터)이 이미 풀에서 빌린 연결. 주면 그 연결을 쓰고, 없을 때만 풀에서 새로 빌립니다.
+        (연결 하나를 쥔 채로 하나를 더 빌리면 풀이 바닥났을 때 서로 기다리다 멈춤)
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        # 1. 현재 정보 가져오기
-        cursor = await db.execute("SELECT level, exp FROM users WHERE id = ?", (user_id,))
-        row = await cursor.fetchone()
-        
-        if not row:
-            return # 유저 없으면 종료
-        
-        current_level, current_exp = row
+    if db is None:
+        async with db_connection() as db:
+            return await _gain_exp(db, user_id, amount, max_level)
+    return await _gain_exp(db, user_id, amount, max_level)
+
+
+async def _gain_exp(db, user_id: int, amount: int, max_level: int = None):
+    # 1. 현재 정보 가져오기
+    cursor = await db.execute("SELECT level, exp FROM users WHERE id = ?", (user_id,))
+    row = await cursor.fetchone()
+    
+    if not row:
+        return # 유저 없으면 종료
+    
+    current_level, current_exp = row
+
+    # (현재 레벨을 확인한 직후, 경험치를 더하기 전에 검사합니다)
+    if max_level is not None and current_level >= max_level:
+        print(f"🚫 레벨 {current_level}이라서 더 이상 이 행동으로 경험치를 얻을 수 없습니다. (제한: LV.{max_level})")
+        return
 
-        # (현재 레벨을 확인한 직후, 경험치를 더하기 전에 검사합니다)
-        if max_level is not None and current_level >= max_level:
-            print(f"🚫 레벨 {current_level}이라서 더 이상 이 행동으로 경험치를 얻을 수 없습니다. (제한: LV.{max_level})")
-            return
+    # 2. 경험치 지급
+    new_exp = current_exp + amount
+    new_level = current_level
+    
+    # 3. 레벨업 체크 (반복문으로 한 번에 여러 레벨업 가능하게)
+    while True:
+        required_exp = LEVEL_TABLE.get(new_level, 999999) # 만렙이면 무한대
+        if new_exp >= required_exp:
+            new_exp -= required_exp
+            new_level += 1
+            print(f"🎉 유저 {user_id}님이 레벨 {new_level}로 성장했습니다!")
+        else:
+            break
+    
+    # 4. DB 업데이트
+    await db.execute("UPDATE users SET level = ?, exp = ? WHERE id = ?", (new_level, new_exp, user_id))
+    await db.commit()
 
-        # 2. 경험치 지급
-        new_exp = current_exp + amount
-        new_level = current_level
-        
-        # 3. 레벨업 체크 (반복문으로 한 번에 여러 레벨업 가능하게)
-        while True:
-            required_exp = LEVEL_TABLE.get(new_level, 999999) # 만렙이면 무한대
-            if new_exp >= required_exp:
-                new_exp -= required_exp
-                new_level += 1
-                print(f"🎉 유저 {user_id}님이 레벨 {new_level}로 성장했습니다!")
-            else:
-                break
-        
-        # 4. DB 업데이트
-        await db.execute("UPDATE users SET level = ?, exp = ? WHERE id = ?", (new_level, new_exp, user_id))
-        await db.commit()
-        
-        return {"level": new_level, "exp": new_exp, "leveled_up": new_level > current_level}
+    # 레벨 잠금 확인은 메모리에서 하므로 같이 갱신
+    if new_level != current_level:
+        from main import accounts
+        accounts.set_level(user_id, new_level)
+    
+    return {"level": new_level, "exp": new_exp, "leveled_up": new_level > current_level}
 
 # check_quest 함수는 기존과 동일하게 유지
-async def check_quest(user_id: int, quest_id: str):
+async def check_quest(user_id: int, quest_id: str, db=None):
     """
     퀘스트 완료 처리 (단순 완료형)
+    db: gain_exp와 같음 (호출한 쪽의 연결을 그대로 씀)
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        # 이미 깼는지 확인
-        cursor = await db.execute("SELECT is_completed FROM user_quests WHERE user_id = ? AND quest_id = ?", (user_id, quest_id))
-        row = await cursor.fetchone()
-        
-        if row and row[0]: # 이미 깸
-            return False 
+    if db is None:
+        async with db_connection() as db:
+            return await _check_quest(db, user_id, quest_id)
+    return await _check_quest(db, user_id, quest_id)
+
+
+async def _check_quest(db, user_id: int, quest_id: str):
+    # 이미 깼는지 확인
+    cursor = await db.execute("SELECT is_completed FROM user_quests WHERE user_id = ? AND quest_id = ?", (user_id, quest_id))
+    row = await cursor.fetchone()
+    
+    if row and row[0]: # 이미 깸
+        return False 
+
+    # 퀘스트 정보 가져오기 (보상 확인)
+    cursor = await db.execute("SELECT reward_exp FROM quests WHERE quest_id = ?", (quest_id,))
+    quest_data = await cursor.fetchone()
+    if not quest_data:
+        return False
+
+    reward = quest_data[0]
+    
+    # 완료 처리
+    await db.execute("""
+        INSERT OR REPLACE INTO user_quests (user_id, quest_id, is_completed, completed_at)
+        VALUES (?, ?, 1, ?)
+    """, (user_id, quest_id, datetime.now()))
+    
+    await db.commit()
+    print(f"🏆 퀘스트 완료! [{quest_id}] 보상: {reward} EXP")
 
-        # 퀘스트 정보 가져오기 (보상 확인)
-        cursor = await db.execute("SELECT reward_exp FROM quests WHERE quest_id = ?", (quest_id,))
-        quest_data = await cursor.fetchone()
-        if not quest_data:
-            return False
+    # 보상 지급 (위에서 만든 함수 재사용, 같은 연결로)
+    await _gain_exp(db, user_id, reward)
 
-        reward = quest_data[0]
-        
-        # 완료 처리
-        await db.execute("""
-            INSERT OR REPLACE INTO user_quests (user_id, quest_id, is_completed, completed_at)
-            VALUES (?, ?, 1, ?)
-        """, (user_id, quest_id, datetime.now()))
-        
-        await db.commit()
-        print(f"🏆 퀘스트 완료! [{quest_id}] 보상: {reward} EXP")
-        
-        # 보상 지급 (위에서 만든 함수 재사용)
-        await gain_exp(user_id, reward)
-        
-        return True
\ No newline at end of file
+    return True
\ No newline at end of file
@@ -0,0 +1,399 @@
+import zlib
+import asyncio
+import itertools
+import threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Union
+from domain_models import Company, Order, OrderSide, OrderType, get_initial_companies
+from market_engine import FillEvent, MarketEngine, OrderKey
+from order_book import EngineOrder
+
+
+class ShardError(Exception):
+    """샤드 워커가 요청을 처리하다 예외가 남 (워커는 계속 돌고, 이 요청만 실패)"""
+
+
+def _pack_order(order: Union[Order, EngineOrder]) -> tuple:
+    """IPC로 보낼 주문 (객체 대신 가벼운 튜플)"""
+    return (order.order_id, order.agent_id, order.ticker, order.side.value,
+            order.order_type.value, order.quantity, order.price)
+
+
+def _unpack_order(data: tuple) -> EngineOrder:
+    order_id, agent_id, ticker, side, order_type, quantity, price = data
+    return EngineOrder(agent_id, ticker, OrderSide(side), quantity, price,
+                       OrderType(order_type), order_id)
+
+
+def _handle_op(engine: MarketEngine, op: str, payload):
+    """요청 하나를 엔진에 실행하고 (결과, 바뀐 현재가)를 돌려줍니다."""
+    if op == "place":
+        order = _unpack_order(payload)
+        result = engine.place_order(order)
+        return result, ({order.ticker: engine.companies[order.ticker].current_price} if order.ticker in engine.companies else {})
+    elif op == "place_batch":
+        orders = [_unpack_order(p) for p in payload]
+        result = engine.place_orders(orders)
+        return result, {o.ticker: engine.companies[o.ticker].current_price for o in orders if o.ticker in engine.companies}
+    elif op == "get":
+        return engine.get_order(payload), {}
+    elif op == "load":
+        return engine.load_orders([_unpack_order(p) for p in payload]), {}
+    elif op == "cancel":
+        return engine.cancel_order(payload), {}
+    elif op == "amend":
+        order_id, quantity, price = payload
+        return engine.amend_order(order_id, quantity=quantity, price=price), {}
+    elif op == "add_company":
+        engine.add_company(Company(**payload))
+        return None, {}
+    elif op == "status":
+        return engine.get_market_status(), {}
+    elif op == "quote":
+        ticker, side, quantity = payload
+        return engine.quote_market(ticker, OrderSide(side), quantity), {}
+    elif op == "depth":
+        ticker, levels = payload
+        return engine.get_depth(ticker, levels), {}
+    return {"status": "ERROR", "msg": f"알 수 없는 요청: {op}"}, {}
+
+
+def _error_reply(op: str, payload, msg: str):
+    """
+    처리 중 예외가 난 요청의 응답
+    주문 결과 dict를 돌려주는 요청(place/amend/quote/place_batch)은 ERROR 결과로,
+    나머지는 ShardError로 보내서 라우터가 호출한 쪽에 예외로 다시 던집니다.
+    """
+    if op in ("place", "amend", "quote"):
+        return {"status": "ERROR", "msg": msg}
+    if op == "place_batch":
+        return {"results": [{"status": "ERROR", "msg": msg} for _ in payload], "trades": []}
+    return ShardError(msg)
+
+
+def _shard_worker(conn, shard_id: int):
+    """
+    샤드 워커 프로세스
+    자기 몫의 종목을 가진 MarketEngine 하나를 돌리면서, 라우터가 보낸 요청을 처리합니다.
+    응답에는 결과와 함께 이번 요청으로 생긴 체결 이벤트/현재가를 실어 보냅니다.
+    """
+    engine = MarketEngine()
+    fills: List[FillEvent] = []
+    engine.subscribe(fills.append)
+
+    while True:
+        op, payload = conn.recv()
+        if op == "stop":
+            engine.close()
+            conn.send((None, [], {}))
+            break
+        try:
+            result, prices = _handle_op(engine, op, payload)
+        except Exception as e:
+            # 요청 하나가 잘못돼도 샤드는 계속 돎 (죽으면 이 샤드 종목의 주문이 전부 막힘)
+            result, prices = _error_reply(op, payload, f"샤드 {shard_id} 처리 실패 ({op}): {e!r}"), {}
+        try:
+            conn.send((result, fills[:], prices))
+        except (EOFError, OSError):
+            raise
+        except Exception as e:
+            # 결과를 보낼 수 없음 (피클 불가 등, 직렬화가 먼저라 파이프에는 아무것도 안 나감)
+            conn.send((_error_reply(op, payload, f"샤드 {shard_id} 응답 실패 ({op}): {e!r}"), fills[:], prices))
+        fills.clear()
+
+
+class ShardedMarketEngine:
+    """
+    종목을 여러 워커 프로세스(샤드)에 나눠서 매칭하는 엔진 라우터
+    - MarketEngine과 같은 인터페이스 (place_order, place_orders, cancel_order, get_depth ...)
+    - 종목 -> 샤드는 crc32(ticker) % 샤드 수로 고정 배정
+    - 샤드와는 Pipe로 튜플만 주고받고, 체결 이벤트/현재가는 응답에 실려 돌아옵니다.
+    - 응답은 샤드마다 수신 스레드가 받아서 future에 채우므로, 이벤트 루프에서는 *_async 메서드로 기다리면
+      샤드가 매칭하는 동안 루프가 멈추지 않습니다. (동기 메서드는 스크립트/벤치용, 그 자리에서 기다림)
+    - 체결 구독 콜백과 현재가 반영은 수신 스레드가 아니라 응답을 기다린 쪽(이벤트 루프)에서 실행합니다.
+    - 라우터는 companies(현재가)를 복제해서 들고 있으므로 가격 조회에는 IPC가 필요 없습니다.
+    """
+
+    def __init__(self, num_shards: int = 2):
+        self.num_shards = num_shards
+        self.companies: Dict[str, Company] = {c.ticker: c for c in get_initial_companies()}
+        self._fill_subscribers: List[Callable[[FillEvent], None]] = []
+        self._order_shards: Dict[OrderKey, int] = {}
+        # ID 없는 주문은 라우터가 정수 ID를 매겨서 보냄 (샤드끼리 ID가 겹치지 않게)
+        self._next_order_id = itertools.count(1)
+
+        # fork는 aiosqlite 스레드까지 복제하므로 spawn으로 띄웁니다.
+        ctx = mp.get_context("spawn")
+        self._conns = []
+        self._procs = []
+        # 샤드별 응답 대기 future (보낸 순서대로, 샤드는 요청을 순서대로 처리하므로 응답도 같은 순서)
+        self._pending: List[deque] = []
+        self._send_locks: List[threading.Lock] = []
+        self._alive: List[bool] = []
+        self._readers: List[threading.Thread] = []
+        for shard_id in range(num_shards):
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(target=_shard_worker, args=(child_conn, shard_id), daemon=True)
+            proc.start()
+            # 자식 쪽 끝은 닫아야 워커가 끝났을 때 수신 스레드가 EOF를 받음
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+            self._pending.append(deque())
+            self._send_locks.append(threading.Lock())
+            self._alive.append(True)
+        for shard_id in range(num_shards):
+            reader = threading.Thread(target=self._reader, args=(shard_id,),
+                                      name=f"shard-reader-{shard_id}", daemon=True)
+            reader.start()
+            self._readers.append(reader)
+        print(f"⚙️ 샤드 엔진 가동: 워커 {num_shards}개")
+
+    def shard_of(self, ticker: str) -> int:
+        return zlib.crc32(ticker.encode("utf-8")) % self.num_shards
+
+    # ---------- IPC ----------
+    def _reader(self, shard_id: int):
+        """샤드 응답 수신 스레드: 응답이 오는 대로 가장 먼저 보낸 요청의 future에 채움"""
+        conn = self._conns[shard_id]
+        pending = self._pending[shard_id]
+        while True:
+            try:
+                reply = conn.recv()
+            except (EOFError, OSError):
+                break
+            pending.popleft().set_result(reply)
+        # 샤드가 끝났거나 죽음: 기다리던 요청은 전부 실패로 돌려보냄
+        with self._send_locks[shard_id]:
+            self._alive[shard_id] = False
+            while pending:
+                pending.popleft().set_exception(EOFError(f"샤드 {shard_id} 연결이 끊겼습니다."))
+
+    def _send(self, shard_id: int, op: str, payload=None) -> Future:
+        """요청을 보내고 응답을 받을 future를 돌려줍니다. (기다리지 않음)"""
+        future = Future()
+        # 기다리는 쪽이 취소돼도 future는 취소되지 않게 (응답에 실린 체결은 버리면 안 됨)
+        future.set_running_or_notify_cancel()
+        with self._send_locks[shard_id]:
+            if not self._alive[shard_id]:
+                raise EOFError(f"샤드 {shard_id} 연결이 끊겼습니다.")
+            # 응답이 보낸 순서대로 오므로 보내기 전에 줄을 세워 둠
+            self._pending[shard_id].append(future)
+            self._conns[shard_id].send((op, payload))
+        return future
+
+    def _call(self, shard_id: int, op: str, payload=None):
+        return self._handle_reply(self._send(shard_id, op, payload).result())
+
+    async def _call_async(self, shard_id: int, op: str, payload=None):
+        replies = await self._wait_all([self._send(shard_id, op, payload)])
+        return self._handle_reply(replies[0])
+
+    async def _wait_all(self, futures: List[Future]) -> List[tuple]:
+        """샤드 응답들을 이벤트 루프를 막지 않고 기다립니다."""
+        waiter = asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # 기다리던 쪽이 취소돼도 응답이 오면 체결/현재가는 반영
+            waiter.add_done_callback(self._late_replies)
+            raise
+
+    def _late_replies(self, waiter: asyncio.Future):
+        if waiter.cancelled() or waiter.exception() is not None:
+            return
+        for reply in waiter.result():
+            self._handle_reply(reply)
+
+    def _handle_reply(self, reply):
+        result, fills, prices = reply
+        for ticker, price in prices.items():
+            if ticker in self.companies:
+                self.companies[ticker].current_price = price
+        for fill in fills:
+            if fill.remaining == 0:
+                self._order_shards.pop(fill.order_id, None)
+            for callback in self._fill_subscribers:
+                callback(fill)
+        # 처리 도중 실패했어도 그 전에 난 체결은 위에서 반영함
+        if isinstance(result, ShardError):
+            raise result
+        return result
+
+    # ---------- MarketEngine 인터페이스 ----------
+    def subscribe(self, callback: Callable[[FillEvent], None]):
+        self._fill_subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[FillEvent], None]):
+        if callback in self._fill_subscribers:
+            self._fill_subscribers.remove(callback)
+
+    def _assign_id(self, order: Union[Order, EngineOrder]):
+        if order.order_id is None:
+            order.order_id = next(self._next_order_id)
+
+    def _route(self, order: Union[Order, EngineOrder]) -> int:
+        """ID를 매기고 주문이 들어갈 샤드를 기록해 둠"""
+        self._assign_id(order)
+        shard_id = self.shard_of(order.ticker)
+        self._order_shards[order.order_id] = shard_id
+        return shard_id
+
+    def _placed(self, order: Union[Order, EngineOrder], result: Dict) -> Dict:
+        # 시장가 주문은 장부에 남지 않음
+        if result.get("status") != "SUCCESS" or order.order_type == OrderType.MARKET:
+            self._order_shards.pop(order.order_id, None)
+        return result
+
+    def place_order(self, order: Union[Order, EngineOrder]) -> Dict:
+        if order.ticker not in self.companies:
+            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {order.ticker}"}
+        shard_id = self._route(order)
+        return self._placed(order, self._call(shard_id, "place", _pack_order(order)))
+
+    async def place_order_async(self, order: Union[Order, EngineOrder]) -> Dict:
+        if order.ticker not in self.companies:
+            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {order.ticker}"}
+        shard_id = self._route(order)
+        return self._placed(order, await self._call_async(shard_id, "place", _pack_order(order)))
+
+    def _send_batches(self, orders: List[Union[Order, EngineOrder]]) -> tuple:
+        """샤드별로 묶어서 먼저 전부 보냄 (그래야 샤드들이 병렬로 매칭합니다)"""
+        groups: Dict[int, List[int]] = {}
+        for i, order in enumerate(orders):
+            groups.setdefault(self._route(order), []).append(i)
+        futures = [self._send(shard_id, "place_batch", [_pack_order(orders[i]) for i in idxs])
+                   for shard_id, idxs in groups.items()]
+        return list(groups.values()), futures
+
+    def _merge_batches(self, orders: List[Union[Order, EngineOrder]], groups: List[List[int]],
+                       replies: List[tuple]) -> Dict:
+        results: List[Optional[Dict]] = [None] * len(orders)
+        trades = []
+        for idxs, reply in zip(groups, replies):
+            batch = self._handle_reply(reply)
+            for i, result in zip(idxs, batch["results"]):
+                results[i] = self._placed(orders[i], result)
+            trades.extend(batch["trades"])
+        return {"results": results, "trades": trades}
+
+    def place_orders(self, orders: List[Union[Order, EngineOrder]]) -> Dict:
+        """샤드별로 묶어서 동시에 보내고, 응답을 모아서 입력 순서대로 돌려줍니다."""
+        groups, futures = self._send_batches(orders)
+        return self._merge_batches(orders, groups, [f.result() for f in futures])
+
+    async def place_orders_async(self, orders: List[Union[Order, EngineOrder]]) -> Dict:
+        groups, futures = self._send_batches(orders)
+        return self._merge_batches(orders, groups, await self._wait_all(futures))
+
+    def get_order(self, order_id: OrderKey) -> Optional[Order]:
+        shard_id = self._order_shards.get(order_id)
+        if shard_id is None:
+            return None
+        return self._call(shard_id, "get", order_id)
+
+    async def get_order_async(self, order_id: OrderKey) -> Optional[Order]:
+        shard_id = self._order_shards.get(order_id)
+        if shard_id is None:
+            return None
+        return await self._call_async(shard_id, "get", order_id)
+
+    def _send_loads(self, orders: List[EngineOrder]) -> List[Future]:
+        groups: Dict[int, List[EngineOrder]] = {}
+        for order in orders:
+            if order.ticker not in self.companies:
+                continue
+            groups.setdefault(self._route(order), []).append(order)
+        return [self._send(shard_id, "load", [_pack_order(o) for o in group])
+                for shard_id, group in groups.items()]
+
+    def load_orders(self, orders: List[EngineOrder]) -> int:
+        """[재시작 복구] 샤드별로 묶어서 동시에 적재 (매칭 없음)"""
+        return sum(self._handle_reply(f.result()) for f in self._send_loads(orders))
+
+    async def load_orders_async(self, orders: List[EngineOrder]) -> int:
+        replies = await self._wait_all(self._send_loads(orders))
+        return sum(self._handle_reply(reply) for reply in replies)
+
+    def cancel_order(self, order_id: OrderKey) -> bool:
+        shard_id = self._order_shards.pop(order_id, None)
+        if shard_id is None:
+            return False
+        return self._call(shard_id, "cancel", order_id)
+
+    async def cancel_order_async(self, order_id: OrderKey) -> bool:
+        shard_id = self._order_shards.pop(order_id, None)
+        if shard_id is None:
+            return False
+        return await self._call_async(shard_id, "cancel", order_id)
+
+    def amend_order(self, order_id: OrderKey, quantity: Optional[int] = None, price: Optional[float] = None) -> Dict:
+        shard_id = self._order_shards.get(order_id)
+        if shard_id is None:
+            return {"status": "ERROR", "msg": f"대기 중인 주문이 아닙니다: {order_id}"}
+        return self._call(shard_id, "amend", (order_id, quantity, price))
+
+    async def amend_order_async(self, order_id: OrderKey, quantity: Optional[int] = None,
+                                price: Optional[float] = None) -> Dict:
+        shard_id = self._order_shards.get(order_id)
+        if shard_id is None:
+            return {"status": "ERROR", "msg": f"대기 중인 주문이 아닙니다: {order_id}"}
+        return await self._call_async(shard_id, "amend", (order_id, quantity, price))
+
+    def add_company(self, company: Company):
+        if company.ticker in self.companies:
+            return
+        self.companies[company.ticker] = company
+        self._call(self.shard_of(company.ticker), "add_company", company.model_dump())
+
+    async def add_company_async(self, company: Company):
+        if company.ticker in self.companies:
+            return
+        self.companies[company.ticker] = company
+        await self._call_async(self.shard_of(company.ticker), "add_company", company.model_dump())
+
+    def _merge_status(self, replies: List[tuple]) -> Dict:
+        status = {}
+        for shard_id, reply in enumerate(replies):
+            for ticker, info in self._handle_reply(reply).items():
+                if self.shard_of(ticker) == shard_id and ticker in self.companies:
+                    status[ticker] = info
+        return status
+
+    def get_market_status(self):
+        futures = [self._send(shard_id, "status") for shard_id in range(self.num_shards)]
+        return self._merge_status([f.result() for f in futures])
+
+    async def get_market_status_async(self):
+        futures = [self._send(shard_id, "status") for shard_id in range(self.num_shards)]
+        return self._merge_status(await self._wait_all(futures))
+
+    def quote_market(self, ticker: str, side: OrderSide, quantity: int) -> Dict:
+        if ticker not in self.companies:
+            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {ticker}"}
+        return self._call(self.shard_of(ticker), "quote", (ticker, side.value, quantity))
+
+    async def quote_market_async(self, ticker: str, side: OrderSide, quantity: int) -> Dict:
+        if ticker not in self.companies:
+            return {"status": "ERROR", "msg": f"존재하지 않는 종목입니다: {ticker}"}
+        return await self._call_async(self.shard_of(ticker), "quote", (ticker, side.value, quantity))
+
+    def get_depth(self, ticker: str, levels: int = 5) -> Dict[str, List[Dict]]:
+        return self._call(self.shard_of(ticker), "depth", (ticker, levels))
+
+    async def get_depth_async(self, ticker: str, levels: int = 5) -> Dict[str, List[Dict]]:
+        return await self._call_async(self.shard_of(ticker), "depth", (ticker, levels))
+
+    def close(self):
+        for shard_id, proc in enumerate(self._procs):
+            if proc.is_alive():
+                try:
+                    self._call(shard_id, "stop")
+                except (EOFError, OSError):
+                    pass
+            proc.join(timeout=5)
+        # 워커가 끝나면 파이프가 닫혀서 수신 스레드도 빠져나옴
+        for reader in self._readers:
+            reader.join(timeout=5)
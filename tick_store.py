@@ -0,0 +1,238 @@
+import os
+import mmap
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    import numpy as np
+except ImportError:     # numpy가 없으면 array.array로 돌려줌
+    np = None
+
+# 틱 저장소 (종목별 체결 틱을 디스크에 컬럼형으로 쌓아둠)
+# - 종목 폴더 안에 세그먼트마다 컬럼 파일 3개: <첫 틱 시각ns>.ts (int64), .px (float64), .qty (int64)
+#   한 칸이 8바이트 고정이라 i번째 틱의 위치는 i * 8, 세그먼트 길이는 파일 크기 / 8 입니다.
+# - 쓰기는 append만 하고 (틱 루프가 틱마다 flush), 읽기는 파일을 mmap해서 복사 없이 봅니다.
+# - 시간 색인: 세그먼트별 (첫 시각, 마지막 시각)을 메모리에 들고 있다가 구간 조회 시 세그먼트를 고르고,
+#   세그먼트 안에서는 시각 컬럼(정렬되어 있음)을 이진 탐색합니다.
+
+TICK_STORE_DIR = os.getenv("TICK_STORE_DIR", "tick_store")
+SEGMENT_TICKS = 1 << 20        # 세그먼트 하나에 담을 틱 수 (컬럼당 8MB)
+COLUMNS = (("ts", "q"), ("px", "d"), ("qty", "q"))
+WIDTH = 8
+
+
+class TickColumns(NamedTuple):
+    """조회 결과 (시간순, numpy가 있으면 np.ndarray, 없으면 array.array)"""
+    timestamp: object   # ns (int64)
+    price: object       # float64
+    quantity: object    # int64
+
+
+class Segment:
+    """세그먼트 하나 (컬럼 파일 3개)"""
+    __slots__ = ("base", "length", "first_ts", "last_ts", "_maps")
+
+    def __init__(self, base: str, length: int = 0, first_ts: int = 0, last_ts: int = 0):
+        self.base = base            # 확장자 뺀 경로
+        self.length = length
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def path(self, column: str) -> str:
+        return f"{self.base}.{column}"
+
+    def view(self, column: str, typecode: str) -> memoryview:
+        """컬럼 전체를 mmap으로 (파일이 자랐으면 다시 매핑)"""
+        mm = self._maps.get(column)
+        if mm is None or len(mm) < self.length * WIDTH:
+            if mm is not None:
+                try:
+                    mm.close()
+                except BufferError:
+                    pass    # 이전 조회 결과가 아직 보고 있으면 GC가 정리
+            with open(self.path(column), "rb") as f:
+                mm = mmap.mmap(f.fileno(), self.length * WIDTH, access=mmap.ACCESS_READ)
+            self._maps[column] = mm
+        return memoryview(mm)[:self.length * WIDTH].cast(typecode)
+
+    def close(self):
+        for mm in self._maps.values():
+            try:
+                mm.close()
+            except BufferError:
+                pass        # 조회 결과가 아직 mmap을 보고 있음 (GC가 정리)
+        self._maps.clear()
+
+
+class TickSeries:
+    """한 종목의 틱 (세그먼트 목록 + 아직 파일에 안 쓴 버퍼)"""
+
+    def __init__(self, directory: str, segment_ticks: int = SEGMENT_TICKS):
+        self.directory = directory
+        self.segment_ticks = segment_ticks
+        self.segments: List[Segment] = []
+        self._buf = {name: array(code) for name, code in COLUMNS}
+        self._last_ts = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        """기존 세그먼트를 찾아 색인을 만듭니다. 컬럼 길이가 다르면(쓰다가 죽음) 짧은 쪽에 맞춰 자름"""
+        bases = sorted({os.path.join(self.directory, name.rsplit(".", 1)[0])
+                        for name in os.listdir(self.directory) if name.endswith(".ts")},
+                       key=lambda base: int(os.path.basename(base)))
+        for base in bases:
+            sizes = [os.path.getsize(f"{base}.{name}") if os.path.exists(f"{base}.{name}") else 0
+                     for name, _ in COLUMNS]
+            length = min(sizes) // WIDTH
+            if length == 0:
+                continue
+            for (name, _), size in zip(COLUMNS, sizes):
+                if size != length * WIDTH:
+                    with open(f"{base}.{name}", "r+b") as f:
+                        f.truncate(length * WIDTH)
+            segment = Segment(base, length)
+            ts = segment.view("ts", "q")
+            segment.first_ts, segment.last_ts = ts[0], ts[-1]
+            del ts
+            self.segments.append(segment)
+        if self.segments:
+            self._last_ts = self.segments[-1].last_ts
+
+    def append(self, ts_ns: int, price: float, quantity: int):
+        # 시계가 뒤로 가더라도 시간순 정렬(이진 탐색)이 깨지지 않게 보정
+        if ts_ns < self._last_ts:
+            ts_ns = self._last_ts
+        self._last_ts = ts_ns
+        self._buf["ts"].append(ts_ns)
+        self._buf["px"].append(price)
+        self._buf["qty"].append(quantity)
+
+    @property
+    def pending(self) -> int:
+        return len(self._buf["ts"])
+
+    def __len__(self):
+        return sum(segment.length for segment in self.segments) + self.pending
+
+    def flush(self) -> int:
+        """버퍼를 세그먼트 파일 끝에 붙입니다. (꽉 차면 새 세그먼트) 쓴 틱 수를 돌려줍니다."""
+        n = self.pending
+        pos = 0
+        while pos < n:
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment.length >= self.segment_ticks:
+                segment = Segment(os.path.join(self.directory, str(self._buf["ts"][pos])), 0, self._buf["ts"][pos])
+                self.segments.append(segment)
+            take = min(n - pos, self.segment_ticks - segment.length)
+            # 중간에 죽어서 컬럼 길이가 어긋나면 다음 open에서 짧은 쪽에 맞춰 잘림
+            for name, _ in COLUMNS:
+                with open(segment.path(name), "ab") as f:
+                    self._buf[name][pos:pos + take].tofile(f)
+            segment.length += take
+            segment.last_ts = self._buf["ts"][pos + take - 1]
+            pos += take
+        for column in self._buf.values():
+            del column[:]
+        return n
+
+    def read(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> TickColumns:
+        """[start_ns, end_ns) 구간의 틱 (파일에 쓴 것만, 세그먼트 하나에 들어가면 복사 없이 mmap 그대로)"""
+        lo_seg = 0 if start_ns is None else max(0, bisect_right([s.first_ts for s in self.segments], start_ns) - 1)
+        parts = []
+        for segment in self.segments[lo_seg:]:
+            if end_ns is not None and segment.first_ts >= end_ns:
+                break
+            if start_ns is not None and segment.last_ts < start_ns:
+                continue
+            ts = segment.view("ts", "q")
+            lo = 0 if start_ns is None else bisect_left(ts, start_ns)
+            hi = segment.length if end_ns is None else bisect_left(ts, end_ns)
+            if hi > lo:
+                parts.append((segment, lo, hi))
+        return _columns(parts)
+
+
+def _columns(parts) -> TickColumns:
+    if np is not None:
+        cols = [[np.frombuffer(segment.view(name, code), dtype=np.int64 if code == "q" else np.float64)[lo:hi]
+                 for segment, lo, hi in parts] for name, code in COLUMNS]
+        if len(parts) == 1:
+            return TickColumns(*(c[0] for c in cols))
+        empty = (np.empty(0, np.int64), np.empty(0, np.float64), np.empty(0, np.int64))
+        return TickColumns(*(np.concatenate(c) if c else e for c, e in zip(cols, empty)))
+    out = TickColumns(array("q"), array("d"), array("q"))
+    for segment, lo, hi in parts:
+        for (name, code), column in zip(COLUMNS, out):
+            column.frombytes(segment.view(name, code)[lo:hi].cast("B"))
+    return out
+
+
+class TickStore:
+    """
+    종목별 틱 저장소
+    - 엔진 체결 구독자로 붙여서 거래마다 (시각, 가격, 수량)을 버퍼에 쌓고, 틱 루프가 flush()로 파일에 붙입니다.
+      (체결 이벤트는 매수/매도 주문마다 하나씩 오므로 매수 쪽만 기록)
+    - read()는 SQLite를 거치지 않고 mmap한 컬럼을 그대로 배열로 돌려주므로 수백만 틱도 바로 읽습니다.
+    """
+
+    def __init__(self, directory: str = TICK_STORE_DIR, segment_ticks: int = SEGMENT_TICKS):
+        self.directory = directory
+        self.segment_ticks = segment_ticks
+        self._series: Dict[str, TickSeries] = {}
+        self.flushed = 0
+
+    def open(self):
+        """디스크에 있는 종목들을 불러옵니다."""
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if os.path.isdir(os.path.join(self.directory, name)):
+                self.series(name)
+        return self
+
+    def series(self, ticker: str) -> TickSeries:
+        series = self._series.get(ticker)
+        if series is None:
+            series = TickSeries(os.path.join(self.directory, ticker), self.segment_ticks)
+            self._series[ticker] = series
+        return series
+
+    def on_fill(self, fill, ts_ns: Optional[int] = None):
+        """엔진 체결 구독 콜백"""
+        if fill.side == "BUY":
+            self.append(fill.ticker, ts_ns or time.time_ns(), fill.price, fill.quantity)
+
+    def append(self, ticker: str, ts_ns: int, price: float, quantity: int):
+        self.series(ticker).append(ts_ns, price, quantity)
+
+    def flush(self) -> int:
+        written = sum(series.flush() for series in self._series.values())
+        self.flushed += written
+        return written
+
+    def read(self, ticker: str, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> TickColumns:
+        series = self._series.get(ticker)
+        if series is None:
+            return _columns([])
+        return series.read(start_ns, end_ns)
+
+    def tickers(self) -> List[str]:
+        return list(self._series)
+
+    def close(self):
+        self.flush()
+        for series in self._series.values():
+            for segment in series.segments:
+                segment.close()
+
+    def stats(self) -> Dict:
+        return {
+            "tickers": {ticker: len(series) for ticker, series in self._series.items()},
+            "segments": sum(len(series.segments) for series in self._series.values()),
+            "pending": sum(series.pending for series in self._series.values()),
+            "flushed": self.flushed,
+            "numpy": np is not None,
+        }
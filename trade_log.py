@@ -0,0 +1,174 @@
+import os
+import time
+import struct
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# 스필 파일 레코드: 시각(ns), 가격, 수량, 종목ID, 매수자ID, 매도자ID
+SPILL_RECORD = struct.Struct("<qdqiii")
+
+
+class TradeColumns(NamedTuple):
+    """조회 결과 (컬럼별 배열, 시간순)"""
+    timestamp: array   # ns
+    price: array
+    quantity: array
+    ticker: array      # 인터닝된 ID -> TradeLog.name(id)로 문자열 변환
+    buyer: array
+    seller: array
+
+
+class TradeLog:
+    """
+    체결 내역 저장소 (고정 크기 링 버퍼 + 컬럼형 배열)
+    - 체결 1건마다 dict를 만들지 않고 컬럼 배열의 한 칸에 기록합니다.
+    - capacity를 넘으면 가장 오래된 체결부터 덮어씁니다.
+    - spill_path를 주면 덮어써지는 체결을 append-only 파일로 내보냅니다.
+    - 종목/매수자/매도자 문자열은 정수 ID로 인터닝해서 저장합니다.
+    """
+
+    def __init__(self, capacity: int = 100_000, spill_path: Optional[str] = None):
+        if capacity <= 0:
+            raise ValueError("capacity는 1 이상이어야 합니다.")
+        self.capacity = capacity
+        self.timestamps = array("q", bytes(8 * capacity))
+        self.prices = array("d", bytes(8 * capacity))
+        self.quantities = array("q", bytes(8 * capacity))
+        self.tickers = array("i", bytes(4 * capacity))
+        self.buyers = array("i", bytes(4 * capacity))
+        self.sellers = array("i", bytes(4 * capacity))
+        self.total = 0  # 지금까지 기록된 전체 체결 수 (덮어쓴 것 포함)
+
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self._last_ts = 0
+
+        self.spill_path = spill_path
+        self._spill = None
+        self._spill_names = None
+        if spill_path:
+            # 이전 실행에서 쓴 이름표를 이어받아야 파일 안의 ID가 섞이지 않음
+            if os.path.exists(spill_path + ".names"):
+                with open(spill_path + ".names", encoding="utf-8") as f:
+                    for name in f.read().split("\n")[:-1]:
+                        self._name_ids[name] = len(self._names)
+                        self._names.append(name)
+            self._spill = open(spill_path, "ab")
+            self._spill_names = open(spill_path + ".names", "a", encoding="utf-8")
+
+    # ---------- 인터닝 ----------
+    def intern(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(name)
+            self._name_ids[name] = name_id
+            if self._spill_names:
+                self._spill_names.write(name + "\n")
+                self._spill_names.flush()
+        return name_id
+
+    def name(self, name_id: int) -> str:
+        return self._names[name_id]
+
+    # ---------- 기록 ----------
+    def append(self, ticker: str, price: float, quantity: int, buyer_id: str, seller_id: str,
+               ts_ns: Optional[int] = None):
+        if ts_ns is None:
+            ts_ns = time.time_ns()
+        # 시계가 뒤로 가더라도 시간순 정렬(이진 탐색)이 깨지지 않게 보정
+        if ts_ns < self._last_ts:
+            ts_ns = self._last_ts
+        self._last_ts = ts_ns
+
+        slot = self.total % self.capacity
+        if self._spill and self.total >= self.capacity:
+            self._spill.write(SPILL_RECORD.pack(
+                self.timestamps[slot], self.prices[slot], self.quantities[slot],
+                self.tickers[slot], self.buyers[slot], self.sellers[slot]))
+
+        self.timestamps[slot] = ts_ns
+        self.prices[slot] = price
+        self.quantities[slot] = quantity
+        self.tickers[slot] = self.intern(ticker)
+        self.buyers[slot] = self.intern(buyer_id)
+        self.sellers[slot] = self.intern(seller_id)
+        self.total += 1
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    # ---------- 조회 ----------
+    def _slot(self, i: int) -> int:
+        """i번째로 오래된 체결이 들어있는 칸"""
+        start = self.total - len(self)
+        return (start + i) % self.capacity
+
+    def _bisect(self, ts_ns: int) -> int:
+        """시각이 ts_ns 이상인 첫 체결의 순번 (링 칸을 직접 이진 탐색, bisect의 key=는 3.10+라 안 씀)"""
+        ts, slot = self.timestamps, self._slot
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[slot(mid)] < ts_ns:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, ticker: Optional[str] = None, start_ns: Optional[int] = None,
+              end_ns: Optional[int] = None) -> TradeColumns:
+        """
+        [start_ns, end_ns) 구간의 체결을 컬럼 배열로 돌려줍니다. (ticker를 주면 해당 종목만)
+        시간 구간은 이진 탐색으로 찾으므로 전체를 훑지 않습니다.
+        """
+        lo = self._bisect(start_ns) if start_ns is not None else 0
+        hi = self._bisect(end_ns) if end_ns is not None else len(self)
+
+        ticker_id = None
+        if ticker is not None:
+            ticker_id = self._name_ids.get(ticker)
+            if ticker_id is None:
+                lo = hi = 0
+
+        out = TradeColumns(array("q"), array("d"), array("q"), array("i"), array("i"), array("i"))
+        for i in range(lo, hi):
+            s = self._slot(i)
+            if ticker_id is not None and self.tickers[s] != ticker_id:
+                continue
+            out.timestamp.append(self.timestamps[s])
+            out.price.append(self.prices[s])
+            out.quantity.append(self.quantities[s])
+            out.ticker.append(self.tickers[s])
+            out.buyer.append(self.buyers[s])
+            out.seller.append(self.sellers[s])
+        return out
+
+    # ---------- 스필 파일 ----------
+    def flush(self):
+        if self._spill:
+            self._spill.flush()
+
+    def close(self):
+        """링에 남아있는 체결(아직 덮어써지지 않아 스필 안 된 것)을 오래된 순으로 내보내고 파일을 닫습니다."""
+        if self._spill:
+            for i in range(len(self)):
+                s = self._slot(i)
+                self._spill.write(SPILL_RECORD.pack(
+                    self.timestamps[s], self.prices[s], self.quantities[s],
+                    self.tickers[s], self.buyers[s], self.sellers[s]))
+            self._spill.close()
+            self._spill_names.close()
+            self._spill = self._spill_names = None
+
+    @staticmethod
+    def read_spill(path: str) -> Iterator[Tuple[int, float, int, str, str, str]]:
+        """스필 파일을 (시각ns, 가격, 수량, 종목, 매수자, 매도자) 튜플로 읽습니다."""
+        if not os.path.exists(path):
+            return
+        with open(path + ".names", encoding="utf-8") as f:
+            names = f.read().split("\n")
+        with open(path, "rb") as f:
+            data = f.read()
+        for ts, price, qty, t, b, s in SPILL_RECORD.iter_unpack(data[:len(data) - len(data) % SPILL_RECORD.size]):
+            yield ts, price, qty, names[t], names[b], names[s]